@@ -0,0 +1,83 @@
+"""add_character_tags
+
+Revision ID: 7b426f69a0ce
+Revises: a26b0f79886d
+Create Date: 2026-10-18 11:48:05.630917
+
+"""
+import uuid
+from collections import Counter
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from app.models.types import GUID, JSONType
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b426f69a0ce'
+down_revision: Union[str, None] = 'a26b0f79886d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('character_tags',
+    sa.Column('character_id', GUID(), nullable=False),
+    sa.Column('tag_id', GUID(), nullable=False),
+    sa.Column('listed', sa.Boolean(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['character_id'], ['characters.id'], ),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ),
+    sa.PrimaryKeyConstraint('character_id', 'tag_id')
+    )
+    op.create_index('ix_character_tags_tag_id_character_id', 'character_tags', ['tag_id', 'character_id'], unique=False)
+    with op.batch_alter_table('tags', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('character_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.create_index(batch_op.f('ix_tags_character_count'), ['character_count'], unique=False)
+
+    _backfill()
+
+
+def _backfill() -> None:
+    """Index the tags already stored in characters.tags (mirrors tag_service.normalize_tags)."""
+    bind = op.get_bind()
+    characters = sa.table('characters',
+        sa.column('id', GUID()), sa.column('tags', JSONType()),
+        sa.column('status', sa.String()), sa.column('is_public', sa.Boolean()))
+    tags = sa.table('tags',
+        sa.column('id', GUID()), sa.column('name', sa.String()), sa.column('character_count', sa.Integer()))
+    character_tags = sa.table('character_tags',
+        sa.column('character_id', GUID()), sa.column('tag_id', GUID()), sa.column('listed', sa.Boolean()))
+
+    tag_ids = {name: tag_id for tag_id, name in bind.execute(sa.select(tags.c.id, tags.c.name))}
+    links = []
+    counts: Counter = Counter()
+    for character_id, raw_tags, status, is_public in bind.execute(
+        sa.select(characters.c.id, characters.c.tags, characters.c.status, characters.c.is_public)
+    ):
+        listed = status == 'published' and bool(is_public)
+        names = []
+        for tag in raw_tags or []:
+            name = (tag or '').strip()[:50]
+            if name and name not in names:
+                names.append(name)
+        for name in names:
+            if name not in tag_ids:
+                tag_ids[name] = uuid.uuid4()
+                bind.execute(tags.insert().values(id=tag_ids[name], name=name))
+            links.append({'character_id': character_id, 'tag_id': tag_ids[name], 'listed': listed})
+            if listed:
+                counts[tag_ids[name]] += 1
+
+    if links:
+        bind.execute(character_tags.insert(), links)
+    for tag_id, count in counts.items():
+        bind.execute(tags.update().where(tags.c.id == tag_id).values(character_count=count))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('tags', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_tags_character_count'))
+        batch_op.drop_column('character_count')
+    op.drop_index('ix_character_tags_tag_id_character_id', table_name='character_tags')
+    op.drop_table('character_tags')
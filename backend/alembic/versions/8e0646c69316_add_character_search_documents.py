@@ -0,0 +1,104 @@
+"""add_character_search_documents
+
+Revision ID: 8e0646c69316
+Revises: 7b426f69a0ce
+Create Date: 2026-10-18 12:31:44.108263
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from app.models.types import GUID, JSONType
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e0646c69316'
+down_revision: Union[str, None] = '7b426f69a0ce'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE character_search_fts USING fts5("
+    "name_terms, body_terms, content='character_search_documents', content_rowid='id')",
+    "CREATE TRIGGER character_search_documents_ai AFTER INSERT ON character_search_documents BEGIN "
+    "INSERT INTO character_search_fts(rowid, name_terms, body_terms) VALUES (new.id, new.name_terms, new.body_terms); END",
+    "CREATE TRIGGER character_search_documents_ad AFTER DELETE ON character_search_documents BEGIN "
+    "INSERT INTO character_search_fts(character_search_fts, rowid, name_terms, body_terms) "
+    "VALUES ('delete', old.id, old.name_terms, old.body_terms); END",
+    "CREATE TRIGGER character_search_documents_au AFTER UPDATE ON character_search_documents BEGIN "
+    "INSERT INTO character_search_fts(character_search_fts, rowid, name_terms, body_terms) "
+    "VALUES ('delete', old.id, old.name_terms, old.body_terms); "
+    "INSERT INTO character_search_fts(rowid, name_terms, body_terms) VALUES (new.id, new.name_terms, new.body_terms); END",
+]
+# The tokenizer of app.services.search_service as of this revision, frozen so
+# that later changes to it do not change what this migration writes.
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TERM_RE = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+
+
+def _index_terms(value):
+    terms = []
+    for run in _TERM_RE.findall(value or ''):
+        if not _CJK_RE.match(run):
+            terms.append(run.lower())
+            continue
+        terms.extend(run)
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return ' '.join(terms)
+
+
+POSTGRES_DDL = [
+    "CREATE INDEX ix_character_search_documents_vector ON character_search_documents USING gin (("
+    "setweight(to_tsvector('simple', name_terms), 'A') || setweight(to_tsvector('simple', body_terms), 'B')))",
+]
+
+
+def upgrade() -> None:
+    op.create_table('character_search_documents',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('character_id', GUID(), nullable=False),
+    sa.Column('name_terms', sa.Text(), server_default='', nullable=False),
+    sa.Column('body_terms', sa.Text(), server_default='', nullable=False),
+    sa.ForeignKeyConstraint(['character_id'], ['characters.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('character_id')
+    )
+
+    dialect = op.get_bind().dialect.name
+    for statement in {'sqlite': SQLITE_DDL, 'postgresql': POSTGRES_DDL}.get(dialect, []):
+        op.execute(statement)
+
+    _backfill()
+
+
+def _backfill() -> None:
+    bind = op.get_bind()
+    characters = sa.table('characters',
+        sa.column('id', GUID()), sa.column('name', sa.String()),
+        sa.column('description', sa.Text()), sa.column('tags', JSONType()))
+    documents = sa.table('character_search_documents',
+        sa.column('character_id', GUID()), sa.column('name_terms', sa.Text()), sa.column('body_terms', sa.Text()))
+
+    batch = []
+    for character_id, name, description, tags in bind.execute(
+        sa.select(characters.c.id, characters.c.name, characters.c.description, characters.c.tags)
+    ):
+        batch.append({
+            'character_id': character_id,
+            'name_terms': _index_terms(name),
+            'body_terms': _index_terms(' '.join([description or '', *(tags or [])])),
+        })
+        if len(batch) >= 1000:
+            bind.execute(documents.insert(), batch)
+            batch = []
+    if batch:
+        bind.execute(documents.insert(), batch)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS character_search_fts')
+    op.drop_table('character_search_documents')
@@ -0,0 +1,50 @@
+"""add_character_popularity_scores
+
+Revision ID: a26b0f79886d
+Revises: e2d25c3540f7
+Create Date: 2026-10-18 11:02:17.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a26b0f79886d'
+down_revision: Union[str, None] = 'e2d25c3540f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('characters', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('popularity_score', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('trending_score', sa.Float(), nullable=False, server_default='0'))
+
+    # Backfill from the existing counters; trending_score is filled by the
+    # first run of app.services.popularity_service.
+    op.execute(
+        "UPDATE characters SET popularity_score = COALESCE(like_count, 0) + COALESCE(chat_count, 0)"
+    )
+
+    with op.batch_alter_table('characters', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_characters_explore_popular',
+            ['status', 'is_public', sa.text('popularity_score DESC'), sa.text('created_at DESC'), sa.text('id DESC')],
+            unique=False,
+        )
+        batch_op.create_index(
+            'ix_characters_explore_trending',
+            ['status', 'is_public', sa.text('trending_score DESC')],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('characters', schema=None) as batch_op:
+        batch_op.drop_index('ix_characters_explore_trending')
+        batch_op.drop_index('ix_characters_explore_popular')
+        batch_op.drop_column('trending_score')
+        batch_op.drop_column('popularity_score')
@@ -0,0 +1,28 @@
+"""add_documents_knowledge_base_index
+
+Revision ID: b8e2d4f6a9c1
+Revises: f3b9c2d8e4a1
+Create Date: 2026-10-18 18:04:51.730412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2d4f6a9c1'
+down_revision: Union[str, None] = 'f3b9c2d8e4a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.create_index('ix_documents_knowledge_base_id', ['knowledge_base_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.drop_index('ix_documents_knowledge_base_id')
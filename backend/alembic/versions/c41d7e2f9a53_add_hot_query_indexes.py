@@ -0,0 +1,99 @@
+"""add_hot_query_indexes
+
+Revision ID: c41d7e2f9a53
+Revises: 8e0646c69316
+Create Date: 2026-10-18 13:20:51.733082
+
+"""
+from collections import Counter
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from app.models.types import GUID
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e2f9a53'
+down_revision: Union[str, None] = '8e0646c69316'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    _dedupe_favorites()
+
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        batch_op.create_index('uq_favorites_user_id_character_id', ['user_id', 'character_id'], unique=True)
+        batch_op.create_index('ix_favorites_created_at', ['created_at'], unique=False)
+
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_messages_conversation_id_created_at_id', ['conversation_id', 'created_at', 'id'], unique=False
+        )
+
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.create_index('ix_conversations_user_id_updated_at_id', ['user_id', 'updated_at', 'id'], unique=False)
+        batch_op.create_index('ix_conversations_created_at', ['created_at'], unique=False)
+
+    with op.batch_alter_table('characters', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_characters_status_is_public_created_at_id', ['status', 'is_public', 'created_at', 'id'], unique=False
+        )
+        batch_op.create_index('ix_characters_creator_id_updated_at_id', ['creator_id', 'updated_at', 'id'], unique=False)
+
+
+def _dedupe_favorites() -> None:
+    """Drop duplicate likes (keeping the earliest) and take them back out of the counters."""
+    bind = op.get_bind()
+    favorites = sa.table('favorites',
+        sa.column('id', GUID()), sa.column('user_id', GUID()),
+        sa.column('character_id', GUID()), sa.column('created_at', sa.DateTime()))
+    characters = sa.table('characters',
+        sa.column('id', GUID()), sa.column('like_count', sa.Integer()), sa.column('popularity_score', sa.Float()),
+        sa.column('updated_at', sa.DateTime()))
+
+    seen = set()
+    duplicates = []
+    removed = Counter()
+    for favorite_id, user_id, character_id in bind.execute(
+        sa.select(favorites.c.id, favorites.c.user_id, favorites.c.character_id)
+        .order_by(favorites.c.created_at, favorites.c.id)
+    ):
+        if (user_id, character_id) in seen:
+            duplicates.append(favorite_id)
+            removed[character_id] += 1
+        else:
+            seen.add((user_id, character_id))
+    if not duplicates:
+        return
+
+    for start in range(0, len(duplicates), 500):
+        bind.execute(favorites.delete().where(favorites.c.id.in_(duplicates[start:start + 500])))
+    bind.execute(
+        characters.update()
+        .where(characters.c.id == sa.bindparam('b_id'))
+        .values(
+            like_count=characters.c.like_count - sa.bindparam('b_removed'),
+            popularity_score=characters.c.popularity_score - sa.bindparam('b_removed'),
+            updated_at=characters.c.updated_at,
+        ),
+        [{'b_id': character_id, 'b_removed': count} for character_id, count in removed.items()],
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('characters', schema=None) as batch_op:
+        batch_op.drop_index('ix_characters_creator_id_updated_at_id')
+        batch_op.drop_index('ix_characters_status_is_public_created_at_id')
+
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversations_created_at')
+        batch_op.drop_index('ix_conversations_user_id_updated_at_id')
+
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_messages_conversation_id_created_at_id')
+
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorites_created_at')
+        batch_op.drop_index('uq_favorites_user_id_character_id')
@@ -0,0 +1,28 @@
+"""add_knowledge_base_generation
+
+Revision ID: c6f1a3e5d7b2
+Revises: b8e2d4f6a9c1
+Create Date: 2026-10-18 20:12:36.508114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6f1a3e5d7b2'
+down_revision: Union[str, None] = 'b8e2d4f6a9c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('knowledge_bases', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('generation', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('knowledge_bases', schema=None) as batch_op:
+        batch_op.drop_column('generation')
@@ -0,0 +1,28 @@
+"""add_user_avatar_thumbnail_url
+
+Revision ID: d5a8f3b1c7e2
+Revises: c41d7e2f9a53
+Create Date: 2026-10-18 14:05:12.418930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a8f3b1c7e2'
+down_revision: Union[str, None] = 'c41d7e2f9a53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('avatar_thumbnail_url', sa.String(length=500), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('avatar_thumbnail_url')
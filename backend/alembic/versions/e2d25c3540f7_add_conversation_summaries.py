@@ -0,0 +1,37 @@
+"""add_conversation_summaries
+
+Revision ID: e2d25c3540f7
+Revises: 3ed1373d3eb3
+Create Date: 2026-10-18 10:20:41.512311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from app.models.types import GUID
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2d25c3540f7'
+down_revision: Union[str, None] = '3ed1373d3eb3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('conversation_summaries',
+    sa.Column('conversation_id', GUID(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('token_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('summarized_message_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('summarized_until_created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('summarized_until_id', GUID(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id'], ),
+    sa.PrimaryKeyConstraint('conversation_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('conversation_summaries')
@@ -0,0 +1,45 @@
+"""add_document_chunks
+
+Revision ID: f3b9c2d8e4a1
+Revises: d5a8f3b1c7e2
+Create Date: 2026-10-18 15:32:07.261584
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from app.models.types import GUID
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9c2d8e4a1'
+down_revision: Union[str, None] = 'd5a8f3b1c7e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('document_chunks',
+    sa.Column('id', GUID(), nullable=False),
+    sa.Column('document_id', GUID(), nullable=False),
+    sa.Column('knowledge_base_id', GUID(), nullable=False),
+    sa.Column('chunk_index', sa.Integer(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('page', sa.Integer(), nullable=True),
+    sa.Column('embedding', sa.LargeBinary(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ),
+    sa.ForeignKeyConstraint(['knowledge_base_id'], ['knowledge_bases.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('document_id', 'chunk_index', name='uq_document_chunks_document_id_chunk_index')
+    )
+    with op.batch_alter_table('document_chunks', schema=None) as batch_op:
+        batch_op.create_index('ix_document_chunks_knowledge_base_id', ['knowledge_base_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('document_chunks', schema=None) as batch_op:
+        batch_op.drop_index('ix_document_chunks_knowledge_base_id')
+
+    op.drop_table('document_chunks')
@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.models.user import User
 from app.schemas.auth import (
     AuthResponse,
+    Principal,
     PasswordChange,
     TokenRefresh,
     TokenResponse,
@@ -16,40 +19,48 @@ from app.schemas.auth import (
 from app.security import (
     create_tokens,
     decode_token,
+    get_current_principal_async,
     get_current_user,
-    hash_password,
-    verify_password,
 )
+from app.services.password_service import hash_password_async, verify_password_async
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 
 @router.post("/register", response_model=AuthResponse, status_code=status.HTTP_201_CREATED)
-def register(body: UserRegister, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.username == body.username).first():
+async def register(body: UserRegister, db: AsyncSession = Depends(get_async_db)):
+    if await db.scalar(select(User.id).where(User.username == body.username)):
         raise HTTPException(status_code=400, detail="用户名已存在")
-    if db.query(User).filter(User.email == body.email).first():
+    if await db.scalar(select(User.id).where(User.email == body.email)):
         raise HTTPException(status_code=400, detail="邮箱已被注册")
 
     user = User(
         username=body.username,
         email=body.email,
-        password_hash=hash_password(body.password),
+        password_hash=await hash_password_async(body.password),
         nickname=body.nickname or body.username,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     tokens = create_tokens(str(user.id))
     return AuthResponse(user=UserResponse.model_validate(user), tokens=tokens)
 
 
 @router.post("/login", response_model=AuthResponse)
-def login(body: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == body.username).first()
-    if not user or not verify_password(body.password, user.password_hash):
+async def login(body: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.username == body.username))
+    if not user:
+        raise HTTPException(status_code=401, detail="用户名或密码错误")
+    valid, new_hash = await verify_password_async(body.password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=401, detail="用户名或密码错误")
+    if new_hash:
+        # Stored with an outdated cost; upgrade while we have the plaintext.
+        user.password_hash = new_hash
+        await db.commit()
+        await db.refresh(user)
 
     tokens = create_tokens(str(user.id))
     return AuthResponse(user=UserResponse.model_validate(user), tokens=tokens)
@@ -82,13 +93,15 @@ def update_me(
 
 
 @router.put("/me/password")
-def change_password(
+async def change_password(
     body: PasswordChange,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    if not verify_password(body.old_password, current_user.password_hash):
+    user = await db.get(User, current_user.id)
+    valid, _ = await verify_password_async(body.old_password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=400, detail="旧密码错误")
-    current_user.password_hash = hash_password(body.new_password)
-    db.commit()
+    user.password_hash = await hash_password_async(body.new_password)
+    await db.commit()
     return {"message": "密码修改成功"}
@@ -1,13 +1,12 @@
-import math
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import func, or_
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.character import Character, Favorite
-from app.models.user import User
+from app.schemas.auth import Principal
 from app.schemas.character import (
     CharacterCreate,
     CharacterListResponse,
@@ -15,7 +14,12 @@ from app.schemas.character import (
     CharacterUpdate,
     PersonalityTemplate,
 )
-from app.security import get_current_user
+from app.security import get_current_principal
+from app.services import counter_service, deletion_service
+from app.services.prompt_service import invalidate_character_prompt
+from app.services.search_service import index_character, search_characters
+from app.services.tag_service import sync_character_tags
+from app.utils.pagination import page_count, paginate
 
 router = APIRouter(prefix="/api/characters", tags=["characters"])
 
@@ -102,6 +106,16 @@ PERSONALITY_TEMPLATES = [
 ]
 
 
+def _character_response(character: Character) -> CharacterResponse:
+    return counter_service.merge_pending([CharacterResponse.model_validate(character)])[0]
+
+
+LIST_KEYS = [
+    (Character.updated_at, lambda c: c.updated_at),
+    (Character.id, lambda c: c.id),
+]
+
+
 @router.get("/personality-templates", response_model=list[PersonalityTemplate])
 def get_personality_templates():
     return PERSONALITY_TEMPLATES
@@ -110,7 +124,7 @@ def get_personality_templates():
 @router.post("", response_model=CharacterResponse, status_code=status.HTTP_201_CREATED)
 def create_character(
     body: CharacterCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     if body.tags and len(body.tags) > 5:
@@ -145,6 +159,8 @@ def create_character(
         character.voice_profile_id = uuid.UUID(body.voice_profile_id)
 
     db.add(character)
+    sync_character_tags(db, character)
+    index_character(db, character)
     db.commit()
     db.refresh(character)
     return CharacterResponse.model_validate(character)
@@ -155,41 +171,42 @@ def list_characters(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=50),
     search: str | None = None,
-    current_user: User = Depends(get_current_user),
+    cursor: str | None = Query(None, description="上一页返回的 next_cursor"),
+    include_total: bool = Query(True),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    query = db.query(Character).filter(Character.creator_id == current_user.id)
-
     if search:
-        query = query.filter(
-            or_(
-                Character.name.ilike(f"%{search}%"),
-                Character.description.ilike(f"%{search}%"),
-            )
+        result = search_characters(
+            db,
+            search,
+            [Character.creator_id == current_user.id],
+            f"characters:{search}",
+            page_size,
+            cursor=cursor,
+            page=page,
         )
-
-    total = query.count()
-    pages = math.ceil(total / page_size) if total > 0 else 1
-    items = (
-        query.order_by(Character.updated_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
-    )
+        items, next_cursor = result.items, result.next_cursor
+        total = result.total if include_total else None
+    else:
+        query = db.query(Character).filter(Character.creator_id == current_user.id)
+        items, next_cursor = paginate(query, LIST_KEYS, "characters:", page_size, cursor=cursor, page=page)
+        total = query.count() if include_total else None
 
     return CharacterListResponse(
-        items=[CharacterResponse.model_validate(c) for c in items],
+        items=counter_service.merge_pending([CharacterResponse.model_validate(c) for c in items]),
         total=total,
         page=page,
         page_size=page_size,
-        pages=pages,
+        pages=page_count(total, page_size),
+        next_cursor=next_cursor,
     )
 
 
 @router.get("/{character_id}", response_model=CharacterResponse)
 def get_character(
     character_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     character = db.query(Character).filter(Character.id == character_id).first()
@@ -199,14 +216,14 @@ def get_character(
     if character.creator_id != current_user.id and not character.is_public:
         raise HTTPException(status_code=403, detail="无权访问此角色")
 
-    return CharacterResponse.model_validate(character)
+    return _character_response(character)
 
 
 @router.put("/{character_id}", response_model=CharacterResponse)
 def update_character(
     character_id: str,
     body: CharacterUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     character = db.query(Character).filter(Character.id == character_id).first()
@@ -231,31 +248,52 @@ def update_character(
         if update_data["relationship_type"] not in valid_types:
             raise HTTPException(status_code=400, detail=f"关系类型必须是 {valid_types} 之一")
 
+    invalidate_character_prompt(character)
     for key, value in update_data.items():
         if key == "voice_profile_id" and value:
             setattr(character, key, uuid.UUID(value))
         else:
             setattr(character, key, value)
+    if "tags" in update_data:
+        sync_character_tags(db, character)
+    if update_data.keys() & {"name", "description", "tags"}:
+        index_character(db, character)
 
     db.commit()
     db.refresh(character)
-    return CharacterResponse.model_validate(character)
+    return _character_response(character)
 
 
 @router.delete("/{character_id}")
 def delete_character(
     character_id: str,
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
-    character = db.query(Character).filter(Character.id == character_id).first()
+    character = (
+        db.query(Character.id, Character.creator_id, Character.updated_at)
+        .filter(Character.id == character_id)
+        .first()
+    )
     if not character:
         raise HTTPException(status_code=404, detail="角色不存在")
 
     if character.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="无权删除此角色")
 
-    db.delete(character)
+    invalidate_character_prompt(character)
+    message_count = deletion_service.character_message_count(db, character.id)
+    if deletion_service.needs_background(message_count):
+        deletion_service.hide_character(db, character.id)
+        db.commit()
+        task_id = deletion_service.run_deletion.submit(
+            "character", str(character.id), message_count, owner_id=current_user.id
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "角色删除中", "task_id": task_id}
+
+    deletion_service.delete_character(db, character.id)
     db.commit()
     return {"message": "角色已删除"}
 
@@ -263,7 +301,7 @@ def delete_character(
 @router.post("/{character_id}/publish", response_model=CharacterResponse)
 def toggle_publish(
     character_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     character = db.query(Character).filter(Character.id == character_id).first()
@@ -273,22 +311,24 @@ def toggle_publish(
     if character.creator_id != current_user.id:
         raise HTTPException(status_code=403, detail="无权操作此角色")
 
+    invalidate_character_prompt(character)
     if character.status == "published":
         character.status = "draft"
         character.is_public = False
     else:
         character.status = "published"
         character.is_public = True
+    sync_character_tags(db, character)
 
     db.commit()
     db.refresh(character)
-    return CharacterResponse.model_validate(character)
+    return _character_response(character)
 
 
 @router.post("/{character_id}/clone", response_model=CharacterResponse, status_code=status.HTTP_201_CREATED)
 def clone_character(
     character_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     original = db.query(Character).filter(Character.id == character_id).first()
@@ -316,6 +356,8 @@ def clone_character(
         status="draft",
     )
     db.add(clone)
+    sync_character_tags(db, clone)
+    index_character(db, clone)
     db.commit()
     db.refresh(clone)
     return CharacterResponse.model_validate(clone)
@@ -324,25 +366,23 @@ def clone_character(
 @router.get("/{character_id}/stats")
 def get_character_stats(
     character_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_read_db),
 ):
     character = db.query(Character).filter(Character.id == character_id).first()
     if not character:
         raise HTTPException(status_code=404, detail="角色不存在")
 
-    return {
-        "like_count": character.like_count,
-        "chat_count": character.chat_count,
-        "share_count": character.share_count,
-        "conversation_count": character.conversation_count,
-    }
+    stats = {field: getattr(character, field) or 0 for field in counter_service.FIELDS}
+    for field, delta in counter_service.pending([character.id]).get(character.id, {}).items():
+        stats[field] = max(stats[field] + delta, 0)
+    return stats
 
 
 @router.post("/{character_id}/like")
 def like_character(
     character_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     character = db.query(Character).filter(Character.id == character_id).first()
@@ -359,15 +399,20 @@ def like_character(
 
     fav = Favorite(user_id=current_user.id, character_id=character.id)
     db.add(fav)
-    character.like_count = (character.like_count or 0) + 1
-    db.commit()
+    counter_service.increment(db, character.id, "like_count")
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent like from the same user won the unique (user_id, character_id) index.
+        db.rollback()
+        return {"message": "已经点赞过了", "liked": True}
     return {"message": "点赞成功", "liked": True}
 
 
 @router.delete("/{character_id}/like")
 def unlike_character(
     character_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: Session = Depends(get_db),
 ):
     character = db.query(Character).filter(Character.id == character_id).first()
@@ -383,6 +428,24 @@ def unlike_character(
         return {"message": "尚未点赞", "liked": False}
 
     db.delete(existing)
-    character.like_count = max((character.like_count or 0) - 1, 0)
+    counter_service.increment(db, character.id, "like_count", -1)
     db.commit()
     return {"message": "已取消点赞", "liked": False}
+
+
+@router.post("/{character_id}/share")
+def share_character(
+    character_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    character = db.query(Character.id, Character.is_public, Character.creator_id).filter(Character.id == character_id).first()
+    if not character:
+        raise HTTPException(status_code=404, detail="角色不存在")
+
+    if not character.is_public and character.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权分享此角色")
+
+    counter_service.increment(db, character.id, "share_count")
+    db.commit()
+    return {"message": "分享成功"}
@@ -1,18 +1,37 @@
+import asyncio
+import json
+import logging
 import uuid
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from starlette.background import BackgroundTask
 
-from app.database import get_db
+from app.database import SessionLocal, get_async_db, get_async_read_db
 from app.models.character import Character
-from app.models.conversation import Conversation
+from app.models.conversation import Conversation, ConversationSummary
 from app.models.message import Message
-from app.models.user import User
-from app.security import get_current_user
+from app.schemas.auth import Principal
+from app.security import get_current_principal_async
+from app.services import counter_service, deletion_service, retrieval_service
+from app.services.context_service import (
+    MESSAGE_KEYS,
+    ChatContext,
+    build_chat_context,
+    refresh_conversation_summary,
+)
+from app.services.llm_service import LLMError, LLMOverloadedError, get_llm_backend
+from app.services.prompt_service import get_system_prompt
+from app.utils.pagination import apaginate, decode_cursor, encode_cursor, keyset_after
+from app.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
 
 
 # ---------------------------------------------------------------------------
@@ -59,32 +78,106 @@ class MessageSend(BaseModel):
 class MessageListResponse(BaseModel):
     items: list[MessageResponse]
     has_more: bool
+    has_newer: bool = False
+    before_cursor: Optional[str] = None
+    after_cursor: Optional[str] = None
 
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-def _build_conversation_response(conv: Conversation) -> ConversationResponse:
-    char_name = conv.character.name if conv.character else ""
+# Relationship collections are never loaded implicitly (lazy="raise_on_sql"),
+# so each endpoint states exactly what it needs. Conversation responses only
+# ever read the character's name.
+CONVERSATION_LOAD_OPTIONS = (
+    joinedload(Conversation.character).load_only(Character.id, Character.name),
+)
+
+
+CONVERSATION_LIST_KEYS = [
+    (Conversation.updated_at, lambda c: c.updated_at),
+    (Conversation.id, lambda c: c.id),
+]
+
+
+MESSAGE_CURSOR_SCOPE = "messages"
+
+
+def _message_cursor(message: Message) -> str:
+    return encode_cursor(MESSAGE_CURSOR_SCOPE, [key(message) for _, key in MESSAGE_KEYS])
+
+
+def _message_key(value: str, conversation_id: uuid.UUID) -> list:
+    """The (created_at, id) key named by a message cursor.
+
+    A bare message id is accepted too (older clients sent one as ``before``);
+    its timestamp is then read by a scalar subquery in the page query itself
+    rather than by a separate lookup.
+    """
+    try:
+        message_id = uuid.UUID(value)
+    except ValueError:
+        return decode_cursor(value, MESSAGE_CURSOR_SCOPE, len(MESSAGE_KEYS))
+    created_at = (
+        select(Message.created_at)
+        .where(Message.id == message_id, Message.conversation_id == conversation_id)
+        .scalar_subquery()
+    )
+    return [created_at, message_id]
+
+
+async def _check_message_anchor(db: AsyncSession, value: str, conversation_id: uuid.UUID) -> None:
+    """404 for a bare message id that names no message of the conversation.
+
+    Such an id matches nothing in ``_message_key``'s subquery, so the page is
+    empty; only then is it worth a lookup to tell it from "no more messages".
+    """
+    try:
+        message_id = uuid.UUID(value)
+    except ValueError:
+        return
+    found = await db.scalar(
+        select(Message.id).where(Message.id == message_id, Message.conversation_id == conversation_id)
+    )
+    if found is None:
+        raise HTTPException(status_code=404, detail="消息不存在")
+
+
+async def _message_page(db: AsyncSession, stmt, limit: int, newest_first: bool) -> tuple[list[Message], bool]:
+    """Up to ``limit`` rows of ``stmt`` walking away from the cursor, plus whether more follow."""
+    if limit <= 0:
+        return [], bool(await db.scalar(stmt.with_only_columns(Message.id).limit(1)))
+    order = [expr.desc() if newest_first else expr.asc() for expr, _ in MESSAGE_KEYS]
+    rows = list((await db.scalars(stmt.order_by(*order).limit(limit + 1))).all())
+    return rows[:limit], len(rows) > limit
+
+
+def _build_conversation_response(conv: Conversation, character_name: str | None = None) -> ConversationResponse:
+    if character_name is None:
+        character_name = conv.character.name if conv.character else ""
     return ConversationResponse(
         id=conv.id,
         title=conv.title,
         user_id=conv.user_id,
         character_id=conv.character_id,
-        character_name=char_name,
+        character_name=character_name,
         message_count=conv.message_count,
         created_at=conv.created_at,
         updated_at=conv.updated_at,
     )
 
 
-def _get_own_conversation(
+async def _get_own_conversation(
     conversation_id: str,
-    current_user: User,
-    db: Session,
+    current_user: Principal,
+    db: AsyncSession,
 ) -> Conversation:
-    conv = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    conv = await db.scalar(
+        select(Conversation)
+        .options(*CONVERSATION_LOAD_OPTIONS)
+        .where(Conversation.id == conversation_id)
+    )
     if not conv:
         raise HTTPException(status_code=404, detail="对话不存在")
     if conv.user_id != current_user.id:
@@ -92,6 +185,118 @@ def _get_own_conversation(
     return conv
 
 
+def _generation_kwargs(character: Character | None) -> dict:
+    if character is None:
+        return {}
+    return {"temperature": character.temperature, "max_tokens": character.max_tokens}
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _stream_reply(
+    conversation_id: uuid.UUID,
+    user_message: MessageResponse,
+    deltas: AsyncIterator[str],
+    context: ChatContext,
+) -> StreamingResponse:
+    """Stream an assistant reply as SSE and persist it once the stream closes.
+
+    Events, in order:
+
+    - ``start``: ``{"user_message": MessageResponse, "message_id": str}``
+    - ``token``: ``{"content": str}``, one per text delta
+    - ``done``: the final assistant ``MessageResponse``
+    - ``error``: ``{"detail": str}``, replaces ``done`` if generation fails
+
+    The reply is written to the database by a background task that runs after
+    the response finishes, including when the client disconnects mid-stream;
+    partial replies are kept with their ``finish_reason`` in ``metadata_json``.
+    """
+    reply_id = uuid.uuid4()
+    parts: list[str] = []
+    state = {"finish_reason": "interrupted", "created_at": None}
+
+    async def event_stream():
+        yield _sse("start", {
+            "user_message": user_message.model_dump(mode="json"),
+            "message_id": str(reply_id),
+        })
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                yield _sse("token", {"content": delta})
+        except LLMOverloadedError:
+            state["finish_reason"] = "error"
+            yield _sse("error", {"detail": "请求过于频繁，请稍后再试"})
+            return
+        except Exception:
+            logger.exception("LLM stream failed for conversation %s", conversation_id)
+            state["finish_reason"] = "error"
+            yield _sse("error", {"detail": "回复生成失败，请稍后重试"})
+            return
+
+        state["finish_reason"] = "stop"
+        state["created_at"] = datetime.now(timezone.utc)
+        done = MessageResponse(
+            id=reply_id,
+            conversation_id=conversation_id,
+            role="assistant",
+            content="".join(parts),
+            created_at=state["created_at"],
+        )
+        yield _sse("done", done.model_dump(mode="json"))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(_persist_streamed_reply, conversation_id, reply_id, parts, state, context),
+    )
+
+
+def _persist_streamed_reply(
+    conversation_id: uuid.UUID,
+    reply_id: uuid.UUID,
+    parts: list[str],
+    state: dict,
+    context: ChatContext,
+) -> None:
+    if not parts:
+        return
+
+    finish_reason = state["finish_reason"]
+    content = "".join(parts)
+    db = SessionLocal()
+    try:
+        db.add(Message(
+            id=reply_id,
+            conversation_id=conversation_id,
+            role="assistant",
+            content=content,
+            token_count=count_tokens(content),
+            metadata_json=None if finish_reason == "stop" else {"finish_reason": finish_reason},
+            created_at=state["created_at"] or datetime.now(timezone.utc),
+        ))
+        db.query(Conversation).filter(Conversation.id == conversation_id).update(
+            {
+                Conversation.message_count: Conversation.message_count + 1,
+                Conversation.updated_at: func.now(),
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to persist streamed reply for conversation %s", conversation_id)
+        return
+    finally:
+        db.close()
+
+    refresh_conversation_summary(conversation_id, context.overflow_until)
+
+
 # ---------------------------------------------------------------------------
 # Router
 # ---------------------------------------------------------------------------
@@ -100,12 +305,12 @@ router = APIRouter(prefix="/api/conversations", tags=["conversations"])
 
 
 @router.post("", response_model=ConversationResponse, status_code=status.HTTP_201_CREATED)
-def create_conversation(
+async def create_conversation(
     body: ConversationCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    character = db.query(Character).filter(Character.id == body.character_id).first()
+    character = await db.scalar(select(Character).where(Character.id == body.character_id))
     if not character:
         raise HTTPException(status_code=404, detail="角色不存在")
 
@@ -119,76 +324,106 @@ def create_conversation(
         message_count=0,
     )
     db.add(conv)
-    db.flush()
+    await db.flush()
 
     if character.greeting_message:
         greeting = Message(
             conversation_id=conv.id,
             role="assistant",
             content=character.greeting_message,
+            token_count=count_tokens(character.greeting_message),
         )
         db.add(greeting)
         conv.message_count = 1
 
-    character.chat_count = (character.chat_count or 0) + 1
-    character.conversation_count = (character.conversation_count or 0) + 1
+    await db.run_sync(counter_service.increment, character.id, "chat_count")
+    await db.run_sync(counter_service.increment, character.id, "conversation_count")
 
-    db.commit()
-    db.refresh(conv)
-    return _build_conversation_response(conv)
+    await db.commit()
+    await db.refresh(conv, ["created_at", "updated_at"])
+    return _build_conversation_response(conv, character_name=character.name)
 
 
 @router.get("", response_model=list[ConversationResponse])
-def list_conversations(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+async def list_conversations(
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    include_total: bool = Query(False, description="在响应头 X-Total-Count 中返回会话总数"),
+    current_user: Principal = Depends(get_current_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    convs = (
-        db.query(Conversation)
-        .filter(Conversation.user_id == current_user.id)
-        .order_by(Conversation.updated_at.desc())
-        .all()
+    stmt = (
+        select(Conversation)
+        .options(*CONVERSATION_LOAD_OPTIONS)
+        .where(Conversation.user_id == current_user.id)
     )
+    convs, next_cursor = await apaginate(db, stmt, CONVERSATION_LIST_KEYS, "conversations", limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if include_total:
+        total = await db.scalar(
+            select(func.count()).select_from(Conversation).where(Conversation.user_id == current_user.id)
+        )
+        response.headers["X-Total-Count"] = str(total)
     return [_build_conversation_response(c) for c in convs]
 
 
 @router.get("/{conversation_id}", response_model=ConversationResponse)
-def get_conversation(
+async def get_conversation(
     conversation_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    conv = _get_own_conversation(conversation_id, current_user, db)
+    conv = await _get_own_conversation(conversation_id, current_user, db)
     return _build_conversation_response(conv)
 
 
 @router.put("/{conversation_id}", response_model=ConversationResponse)
-def update_conversation(
+async def update_conversation(
     conversation_id: str,
     body: ConversationUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    conv = _get_own_conversation(conversation_id, current_user, db)
+    conv = await _get_own_conversation(conversation_id, current_user, db)
 
     if body.title is not None:
         conv.title = body.title
 
-    db.commit()
-    db.refresh(conv)
+    await db.commit()
+    await db.refresh(conv, ["title", "message_count", "updated_at"])
     return _build_conversation_response(conv)
 
 
 @router.delete("/{conversation_id}")
-def delete_conversation(
+async def delete_conversation(
     conversation_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    response: Response,
+    current_user: Principal = Depends(get_current_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    conv = _get_own_conversation(conversation_id, current_user, db)
-    db.query(Message).filter(Message.conversation_id == conv.id).delete()
-    db.delete(conv)
-    db.commit()
+    # Only the owner and size are needed; nothing is loaded into the session.
+    row = (
+        await db.execute(
+            select(Conversation.id, Conversation.user_id, Conversation.message_count)
+            .where(Conversation.id == conversation_id)
+        )
+    ).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="对话不存在")
+    if row.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权访问此对话")
+
+    if deletion_service.needs_background(row.message_count or 0):
+        task_id = deletion_service.run_deletion.submit(
+            "conversation", str(row.id), row.message_count, owner_id=current_user.id
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "对话删除中", "task_id": task_id}
+
+    await db.run_sync(deletion_service.delete_conversations, Conversation.id == row.id)
+    await db.commit()
     return {"message": "对话已删除"}
 
 
@@ -197,102 +432,171 @@ def delete_conversation(
 # ---------------------------------------------------------------------------
 
 @router.get("/{conversation_id}/messages", response_model=MessageListResponse)
-def list_messages(
+async def list_messages(
     conversation_id: str,
     limit: int = Query(20, ge=1, le=100),
-    before: str | None = Query(None, description="cursor: message id"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    before: str | None = Query(None, description="before_cursor（或消息 id）：加载更早的消息"),
+    after: str | None = Query(None, description="after_cursor（或消息 id）：加载更新的消息"),
+    around: str | None = Query(None, description="消息 id：跳转到该消息，返回其前后的消息"),
+    current_user: Principal = Depends(get_current_principal_async),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    conv = _get_own_conversation(conversation_id, current_user, db)
-
-    query = db.query(Message).filter(Message.conversation_id == conv.id)
-
-    if before:
-        cursor_msg = db.query(Message).filter(Message.id == before).first()
-        if cursor_msg:
-            query = query.filter(Message.created_at < cursor_msg.created_at)
-
-    messages = (
-        query.order_by(Message.created_at.desc())
-        .limit(limit + 1)
-        .all()
-    )
-
-    has_more = len(messages) > limit
-    messages = messages[:limit]
-    messages.reverse()
-
+    """A window of messages, oldest first, paged on the (created_at, id) key.
+
+    Without a cursor the newest ``limit`` messages are returned. Pass
+    ``before_cursor`` back as ``before`` to load older messages and
+    ``after_cursor`` as ``after`` to load newer ones; ``around`` centres the
+    window on one message.
+    """
+    if sum(value is not None for value in (before, after, around)) > 1:
+        raise HTTPException(status_code=400, detail="before、after 和 around 只能指定一个")
+    conv = await _get_own_conversation(conversation_id, current_user, db)
+    dialect = db.bind.dialect.name
+    base = select(Message).where(Message.conversation_id == conv.id)
+    older: list[Message] = []
+    newer: list[Message] = []
+
+    if after:
+        newer, has_newer = await _message_page(
+            db, base.where(keyset_after(MESSAGE_KEYS, _message_key(after, conv.id), dialect, descending=False)),
+            limit, newest_first=False,
+        )
+        if not newer:
+            await _check_message_anchor(db, after, conv.id)
+        has_more = True
+    elif around:
+        try:
+            anchor_id = uuid.UUID(around)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="消息不存在")
+        older_than_anchor = keyset_after(MESSAGE_KEYS, _message_key(around, conv.id), dialect)
+        older, has_more = await _message_page(db, base.where(older_than_anchor), limit // 2, newest_first=True)
+        newer, has_newer = await _message_page(
+            db, base.where(~older_than_anchor), limit - limit // 2, newest_first=False
+        )
+        if not newer or newer[0].id != anchor_id:
+            raise HTTPException(status_code=404, detail="消息不存在")
+    else:
+        if before:
+            base = base.where(keyset_after(MESSAGE_KEYS, _message_key(before, conv.id), dialect))
+        older, has_more = await _message_page(db, base, limit, newest_first=True)
+        if before and not older:
+            await _check_message_anchor(db, before, conv.id)
+        has_newer = before is not None
+
+    messages = older[::-1] + newer
     return MessageListResponse(
         items=[MessageResponse.model_validate(m) for m in messages],
         has_more=has_more,
+        has_newer=has_newer,
+        before_cursor=_message_cursor(messages[0]) if messages else None,
+        after_cursor=_message_cursor(messages[-1]) if messages else None,
     )
 
 
 @router.post("/{conversation_id}/messages", response_model=MessageResponse)
-def send_message(
+async def send_message(
     conversation_id: str,
     body: MessageSend,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    stream: bool = Query(False, description="以 SSE 流式返回回复"),
+    current_user: Principal = Depends(get_current_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    conv = _get_own_conversation(conversation_id, current_user, db)
-    character = db.query(Character).filter(Character.id == conv.character_id).first()
+    conv = await _get_own_conversation(conversation_id, current_user, db)
+    # The conversation loader only fetched the character's name; load the rest.
+    character = await db.get(Character, conv.character_id, populate_existing=True)
+
+    system_prompt = get_system_prompt(character)
+    knowledge = None
+    if character is not None and character.knowledge_base_id is not None:
+        knowledge = await asyncio.to_thread(retrieval_service.retrieve_for_chat, character.knowledge_base_id, body.content)
+    context = await db.run_sync(
+        build_chat_context, conv.id, character, system_prompt.text, body.content,
+        system_prompt_tokens=system_prompt.token_count, knowledge=knowledge,
+    )
+    gen_kwargs = _generation_kwargs(character)
+    gen_kwargs["user"] = str(current_user.id)
+    llm = get_llm_backend()
 
     user_msg = Message(
         conversation_id=conv.id,
         role="user",
         content=body.content,
+        token_count=count_tokens(body.content),
+        # Stamped now, before the reply is generated, so the user message
+        # always sorts ahead of the reply inserted in the same transaction.
+        created_at=datetime.now(timezone.utc),
     )
     db.add(user_msg)
 
-    char_name = character.name if character else "AI"
+    if stream:
+        conv.message_count = (conv.message_count or 0) + 1
+        conv.updated_at = func.now()
+        await db.commit()
+        await db.refresh(user_msg)
+        return _stream_reply(
+            conv.id,
+            MessageResponse.model_validate(user_msg),
+            llm.stream_chat(context.messages, **gen_kwargs),
+            context,
+        )
+
+    try:
+        reply = await llm.complete_chat(context.messages, **gen_kwargs)
+    except LLMOverloadedError:
+        raise HTTPException(status_code=429, detail="请求过于频繁，请稍后再试")
+    except LLMError:
+        logger.exception("LLM completion failed for conversation %s", conv.id)
+        raise HTTPException(status_code=502, detail="回复生成失败，请稍后重试")
+
     ai_reply = Message(
         conversation_id=conv.id,
         role="assistant",
-        content=f"我是{char_name}，你说的是：{body.content}",
+        content=reply,
+        token_count=count_tokens(reply),
     )
     db.add(ai_reply)
 
     conv.message_count = (conv.message_count or 0) + 2
     conv.updated_at = func.now()
 
-    db.commit()
-    db.refresh(ai_reply)
+    await db.commit()
+    await db.refresh(ai_reply)
+    background_tasks.add_task(refresh_conversation_summary, conv.id, context.overflow_until)
     return MessageResponse.model_validate(ai_reply)
 
 
 @router.delete("/{conversation_id}/messages/{message_id}")
-def delete_message(
+async def delete_message(
     conversation_id: str,
     message_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    conv = _get_own_conversation(conversation_id, current_user, db)
+    conv = await _get_own_conversation(conversation_id, current_user, db)
 
-    msg = (
-        db.query(Message)
-        .filter(Message.id == message_id, Message.conversation_id == conv.id)
-        .first()
+    msg = await db.scalar(
+        select(Message).where(Message.id == message_id, Message.conversation_id == conv.id)
     )
     if not msg:
         raise HTTPException(status_code=404, detail="消息不存在")
 
-    db.delete(msg)
+    await db.delete(msg)
     conv.message_count = max((conv.message_count or 0) - 1, 0)
-    db.commit()
+    await db.commit()
     return {"message": "消息已删除"}
 
 
 @router.post("/{conversation_id}/clear")
-def clear_messages(
+async def clear_messages(
     conversation_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    conv = _get_own_conversation(conversation_id, current_user, db)
-    deleted = db.query(Message).filter(Message.conversation_id == conv.id).delete()
+    conv = await _get_own_conversation(conversation_id, current_user, db)
+    result = await db.execute(delete(Message).where(Message.conversation_id == conv.id))
+    await db.execute(delete(ConversationSummary).where(ConversationSummary.conversation_id == conv.id))
     conv.message_count = 0
-    db.commit()
-    return {"message": f"已清除{deleted}条消息"}
+    await db.commit()
+    return {"message": f"已清除{result.rowcount}条消息"}
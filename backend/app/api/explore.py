@@ -1,162 +1,145 @@
-import math
-from collections import Counter
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
-
-from app.database import get_db
-from app.models.character import Character
-from app.models.user import User
+from app.database import get_async_read_db
+from app.models.character import Character, CharacterTag, Tag
 from app.schemas.character import CharacterListResponse, CharacterResponse
-from app.security import get_current_user
+from app.services import counter_service
+from app.services.search_service import search_characters as run_search
+from app.services.tag_service import normalize_tag
+from app.utils.pagination import acached_count, apaginate, page_count
 
 router = APIRouter(prefix="/api/explore", tags=["explore"])
 
 PUBLISHED = "published"
 
 
-def _published_base(db: Session):
-    return db.query(Character).filter(
-        Character.status == PUBLISHED,
-        Character.is_public.is_(True),
-    )
+PUBLISHED_CRITERIA = (Character.status == PUBLISHED, Character.is_public.is_(True))
 
 
-@router.get("", response_model=CharacterListResponse)
-def explore_characters(
-    page: int = Query(1, ge=1),
-    page_size: int = Query(12, ge=1, le=50),
-    sort: str = Query("popular", regex="^(popular|newest)$"),
-    db: Session = Depends(get_db),
-):
-    query = _published_base(db)
+def _published_base():
+    return select(Character).where(*PUBLISHED_CRITERIA)
 
-    if sort == "newest":
-        query = query.order_by(Character.created_at.desc())
-    else:
-        query = query.order_by(
-            (Character.like_count + Character.chat_count).desc(),
-            Character.created_at.desc(),
-        )
 
-    total = query.count()
-    pages = math.ceil(total / page_size) if total > 0 else 1
-    items = query.offset((page - 1) * page_size).limit(page_size).all()
+POPULAR_KEYS = [
+    (Character.popularity_score, lambda c: c.popularity_score or 0.0),
+    (Character.created_at, lambda c: c.created_at),
+    (Character.id, lambda c: c.id),
+]
+NEWEST_KEYS = [
+    (Character.created_at, lambda c: c.created_at),
+    (Character.id, lambda c: c.id),
+]
 
+
+def _list_response(items, total, page, page_size, next_cursor) -> CharacterListResponse:
     return CharacterListResponse(
-        items=[CharacterResponse.model_validate(c) for c in items],
+        items=counter_service.merge_pending([CharacterResponse.model_validate(c) for c in items]),
         total=total,
         page=page,
         page_size=page_size,
-        pages=pages,
+        pages=page_count(total, page_size),
+        next_cursor=next_cursor,
     )
 
 
+@router.get("", response_model=CharacterListResponse)
+async def explore_characters(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(12, ge=1, le=50),
+    sort: str = Query("popular", regex="^(popular|newest)$"),
+    cursor: str | None = Query(None, description="上一页返回的 next_cursor"),
+    include_total: bool = Query(True, description="返回总数（缓存值，可能略有延迟）"),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    stmt = _published_base()
+    keys = NEWEST_KEYS if sort == "newest" else POPULAR_KEYS
+
+    items, next_cursor = await apaginate(db, stmt, keys, f"explore:{sort}", page_size, cursor=cursor, page=page)
+    total = await acached_count(db, "explore", stmt) if include_total else None
+    return _list_response(items, total, page, page_size, next_cursor)
+
+
 @router.get("/trending", response_model=list[CharacterResponse])
-def trending_characters(db: Session = Depends(get_db)):
-    items = (
-        _published_base(db)
-        .order_by((Character.like_count + Character.chat_count).desc())
+async def trending_characters(db: AsyncSession = Depends(get_async_read_db)):
+    items = await db.scalars(
+        _published_base()
+        .order_by(Character.trending_score.desc(), Character.popularity_score.desc())
         .limit(10)
-        .all()
     )
-    return [CharacterResponse.model_validate(c) for c in items]
+    return counter_service.merge_pending([CharacterResponse.model_validate(c) for c in items])
 
 
 @router.get("/newest", response_model=list[CharacterResponse])
-def newest_characters(db: Session = Depends(get_db)):
-    items = (
-        _published_base(db)
-        .order_by(Character.created_at.desc())
-        .limit(10)
-        .all()
-    )
-    return [CharacterResponse.model_validate(c) for c in items]
+async def newest_characters(db: AsyncSession = Depends(get_async_read_db)):
+    items = await db.scalars(_published_base().order_by(Character.created_at.desc()).limit(10))
+    return counter_service.merge_pending([CharacterResponse.model_validate(c) for c in items])
 
 
 @router.get("/tags")
-def get_tags(db: Session = Depends(get_db)):
-    characters = _published_base(db).all()
-    counter: Counter[str] = Counter()
-    for c in characters:
-        if c.tags:
-            for tag in c.tags:
-                counter[tag] += 1
-
-    top_tags = counter.most_common(20)
+async def get_tags(db: AsyncSession = Depends(get_async_read_db)):
+    top_tags = await db.execute(
+        select(Tag.name, Tag.character_count)
+        .where(Tag.character_count > 0)
+        .order_by(Tag.character_count.desc(), Tag.name)
+        .limit(20)
+    )
     return [{"tag": tag, "count": count} for tag, count in top_tags]
 
 
 @router.get("/tags/{tag}", response_model=CharacterListResponse)
-def characters_by_tag(
+async def characters_by_tag(
     tag: str,
     page: int = Query(1, ge=1),
     page_size: int = Query(12, ge=1, le=50),
-    db: Session = Depends(get_db),
+    cursor: str | None = Query(None, description="上一页返回的 next_cursor"),
+    include_total: bool = Query(True, description="返回总数（缓存值，可能略有延迟）"),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    all_published = _published_base(db).all()
-    matched = [c for c in all_published if c.tags and tag in c.tags]
-
-    total = len(matched)
-    pages = math.ceil(total / page_size) if total > 0 else 1
-    start = (page - 1) * page_size
-    items = matched[start : start + page_size]
-
-    return CharacterListResponse(
-        items=[CharacterResponse.model_validate(c) for c in items],
-        total=total,
-        page=page,
-        page_size=page_size,
-        pages=pages,
+    tag_row = (
+        await db.execute(select(Tag.id, Tag.character_count).where(Tag.name == normalize_tag(tag)))
+    ).first()
+    if tag_row is None:
+        return _list_response([], 0 if include_total else None, page, page_size, None)
+
+    stmt = (
+        _published_base()
+        .join(CharacterTag, CharacterTag.character_id == Character.id)
+        .where(CharacterTag.tag_id == tag_row.id)
+    )
+    items, next_cursor = await apaginate(
+        db, stmt, NEWEST_KEYS, f"explore:tag:{tag}", page_size, cursor=cursor, page=page
     )
+    total = tag_row.character_count if include_total else None
+    return _list_response(items, total, page, page_size, next_cursor)
 
 
 @router.get("/search", response_model=CharacterListResponse)
-def search_characters(
+async def search_characters(
     q: str = Query(..., min_length=1, max_length=100),
     page: int = Query(1, ge=1),
     page_size: int = Query(12, ge=1, le=50),
-    db: Session = Depends(get_db),
+    cursor: str | None = Query(None, description="上一页返回的 next_cursor"),
+    include_total: bool = Query(True, description="返回总数（缓存值，可能略有延迟）"),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    query = _published_base(db).filter(
-        or_(
-            Character.name.ilike(f"%{q}%"),
-            Character.description.ilike(f"%{q}%"),
-        )
-    )
-
-    total = query.count()
-    pages = math.ceil(total / page_size) if total > 0 else 1
-    items = (
-        query.order_by(Character.like_count.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
-    )
-
-    return CharacterListResponse(
-        items=[CharacterResponse.model_validate(c) for c in items],
-        total=total,
-        page=page,
-        page_size=page_size,
-        pages=pages,
+    # The search backends are written against the sync Session API.
+    result = await db.run_sync(
+        run_search, q, list(PUBLISHED_CRITERIA), f"explore:search:{q}", page_size, cursor=cursor, page=page
     )
+    total = result.total if include_total else None
+    return _list_response(result.items, total, page, page_size, result.next_cursor)
 
 
 @router.get("/users/{user_id}/characters", response_model=list[CharacterResponse])
-def user_public_characters(
+async def user_public_characters(
     user_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    items = (
-        db.query(Character)
-        .filter(
-            Character.creator_id == user_id,
-            Character.status == PUBLISHED,
-            Character.is_public.is_(True),
-        )
+    items = await db.scalars(
+        _published_base()
+        .where(Character.creator_id == user_id)
         .order_by(Character.created_at.desc())
-        .all()
     )
-    return [CharacterResponse.model_validate(c) for c in items]
+    return counter_service.merge_pending([CharacterResponse.model_validate(c) for c in items])
@@ -1,3 +1,358 @@
-from fastapi import APIRouter
+import uuid
+from pathlib import PurePosixPath
+
+from fastapi import APIRouter, Depends, File, HTTPException, Response, UploadFile, status
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import get_db
+from app.models.character import Character
+from app.models.knowledge_base import Document, KnowledgeBase
+from app.schemas.auth import Principal
+from app.schemas.knowledge import (
+    DocumentImport,
+    DocumentResponse,
+    KnowledgeBaseCreate,
+    KnowledgeBaseResponse,
+    KnowledgeBaseUpdate,
+    RetrievalOptions,
+)
+from app.security import get_current_principal
+from app.services import deletion_service, rag_service
+from app.services.storage_service import INCOMING_PREFIX, get_storage, store_content
+from app.utils.document_reader import file_type_for
 
 router = APIRouter(prefix="/api/knowledge", tags=["knowledge"])
+
+DOCUMENT_KEY_PREFIX = "documents"
+UNSUPPORTED_TYPE_DETAIL = "只支持 PDF、TXT、Markdown 和 DOCX 文档"
+
+
+def _document_response(document: Document, task_id: str | None = None) -> DocumentResponse:
+    response = DocumentResponse.model_validate(document, from_attributes=True)
+    response.error = (document.metadata_json or {}).get("error")
+    response.task_id = task_id
+    return response
+
+
+def _knowledge_base_response(knowledge_base: KnowledgeBase) -> KnowledgeBaseResponse:
+    response = KnowledgeBaseResponse.model_validate(knowledge_base, from_attributes=True)
+    retrieval = (knowledge_base.metadata_json or {}).get("retrieval")
+    response.retrieval = RetrievalOptions.model_validate(retrieval) if retrieval else None
+    return response
+
+
+def _own_knowledge_base(db: Session, knowledge_base_id: str, user_id: uuid.UUID) -> KnowledgeBase:
+    knowledge_base = db.query(KnowledgeBase).filter(KnowledgeBase.id == knowledge_base_id).first()
+    if not knowledge_base:
+        raise HTTPException(status_code=404, detail="知识库不存在")
+    if knowledge_base.creator_id != user_id:
+        raise HTTPException(status_code=403, detail="无权访问此知识库")
+    return knowledge_base
+
+
+def _own_document(db: Session, knowledge_base_id: str, document_id: str, user_id: uuid.UUID) -> Document:
+    knowledge_base = _own_knowledge_base(db, knowledge_base_id, user_id)
+    document = (
+        db.query(Document)
+        .filter(Document.id == document_id, Document.knowledge_base_id == knowledge_base.id)
+        .first()
+    )
+    if not document or document.status == "deleting":
+        raise HTTPException(status_code=404, detail="文档不存在")
+    return document
+
+
+def _add_document(
+    db: Session,
+    knowledge_base: KnowledgeBase,
+    filename: str,
+    file_type: str,
+    file_size: int,
+    file_url: str,
+    owner_id: uuid.UUID,
+) -> DocumentResponse:
+    document = Document(
+        knowledge_base_id=knowledge_base.id,
+        filename=filename,
+        file_type=file_type,
+        file_size=file_size,
+        file_url=file_url,
+        status="pending",
+        chunk_count=0,
+    )
+    db.add(document)
+    knowledge_base.document_count = KnowledgeBase.document_count + 1
+    db.commit()
+    db.refresh(document)
+    task_id = rag_service.ingest_document.submit(str(document.id), owner_id=owner_id)
+    return _document_response(document, task_id)
+
+
+@router.post("", response_model=KnowledgeBaseResponse, status_code=status.HTTP_201_CREATED)
+def create_knowledge_base(
+    data: KnowledgeBaseCreate,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    character = None
+    if data.character_id:
+        character = db.query(Character).filter(Character.id == data.character_id).first()
+        if not character:
+            raise HTTPException(status_code=404, detail="角色不存在")
+        if character.creator_id != current_user.id:
+            raise HTTPException(status_code=403, detail="无权修改此角色")
+
+    knowledge_base = KnowledgeBase(
+        **data.model_dump(exclude={"character_id", "retrieval"}), creator_id=current_user.id, document_count=0
+    )
+    if data.retrieval is not None:
+        knowledge_base.metadata_json = {"retrieval": data.retrieval.model_dump(exclude_none=True)}
+    db.add(knowledge_base)
+    if character is not None:
+        db.flush()
+        character.knowledge_base_id = knowledge_base.id
+    db.commit()
+    db.refresh(knowledge_base)
+    return _knowledge_base_response(knowledge_base)
+
+
+@router.get("", response_model=list[KnowledgeBaseResponse])
+def list_knowledge_bases(
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    knowledge_bases = (
+        db.query(KnowledgeBase)
+        .filter(KnowledgeBase.creator_id == current_user.id)
+        .order_by(KnowledgeBase.created_at.desc())
+        .all()
+    )
+    return [_knowledge_base_response(knowledge_base) for knowledge_base in knowledge_bases]
+
+
+@router.get("/character/{character_id}", response_model=list[KnowledgeBaseResponse])
+def list_character_knowledge_bases(
+    character_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    knowledge_bases = (
+        db.query(KnowledgeBase)
+        .join(Character, Character.knowledge_base_id == KnowledgeBase.id)
+        .filter(Character.id == character_id, KnowledgeBase.creator_id == current_user.id)
+        .all()
+    )
+    return [_knowledge_base_response(knowledge_base) for knowledge_base in knowledge_bases]
+
+
+@router.get("/{knowledge_base_id}", response_model=KnowledgeBaseResponse)
+def get_knowledge_base(
+    knowledge_base_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    return _knowledge_base_response(_own_knowledge_base(db, knowledge_base_id, current_user.id))
+
+
+@router.put("/{knowledge_base_id}", response_model=KnowledgeBaseResponse)
+def update_knowledge_base(
+    knowledge_base_id: str,
+    data: KnowledgeBaseUpdate,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    knowledge_base = _own_knowledge_base(db, knowledge_base_id, current_user.id)
+    update_data = data.model_dump(exclude_unset=True)
+    chunk_size = update_data.get("chunk_size", knowledge_base.chunk_size)
+    chunk_overlap = update_data.get("chunk_overlap", knowledge_base.chunk_overlap)
+    if chunk_overlap * 2 > chunk_size:
+        raise HTTPException(status_code=400, detail="chunk_overlap 不能超过 chunk_size 的一半")
+
+    rechunk = (chunk_size, chunk_overlap) != (knowledge_base.chunk_size, knowledge_base.chunk_overlap)
+    if "retrieval" in update_data:
+        retrieval = data.retrieval.model_dump(exclude_none=True) if data.retrieval is not None else None
+        metadata = {key: value for key, value in (knowledge_base.metadata_json or {}).items() if key != "retrieval"}
+        if retrieval:
+            metadata["retrieval"] = retrieval
+        knowledge_base.metadata_json = metadata or None
+        # Cached results were retrieved with the old options.
+        rag_service.bump_generation(db, [knowledge_base.id])
+        update_data.pop("retrieval")
+    for key, value in update_data.items():
+        setattr(knowledge_base, key, value)
+    document_ids = []
+    if rechunk:
+        document_ids = rag_service.reset_documents(
+            db, (Document.knowledge_base_id == knowledge_base.id) & (Document.status != "deleting")
+        )
+    db.commit()
+    db.refresh(knowledge_base)
+    for document_id in document_ids:
+        rag_service.ingest_document.submit(str(document_id), owner_id=current_user.id)
+    return _knowledge_base_response(knowledge_base)
+
+
+@router.delete("/{knowledge_base_id}")
+def delete_knowledge_base(
+    knowledge_base_id: str,
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    knowledge_base = _own_knowledge_base(db, knowledge_base_id, current_user.id)
+    kb_id = knowledge_base.id
+    chunk_count = deletion_service.document_chunk_count(db, Document.knowledge_base_id == kb_id)
+    if deletion_service.needs_background(chunk_count):
+        deletion_service.detach_knowledge_base(db, kb_id)
+        db.query(Document).filter(Document.knowledge_base_id == kb_id).update(
+            {Document.status: "deleting"}, synchronize_session=False
+        )
+        rag_service.bump_generation(db, [kb_id])
+        db.commit()
+        task_id = deletion_service.run_deletion.submit(
+            "knowledge_base", str(kb_id), chunk_count, owner_id=current_user.id
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "知识库删除中", "task_id": task_id}
+
+    removed = deletion_service.delete_knowledge_base(db, kb_id)
+    db.commit()
+    rag_service.cleanup_deleted_documents(db, removed, kb_id)
+    return {"message": "知识库已删除"}
+
+
+@router.get("/{knowledge_base_id}/documents", response_model=list[DocumentResponse])
+def list_documents(
+    knowledge_base_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    knowledge_base = _own_knowledge_base(db, knowledge_base_id, current_user.id)
+    documents = (
+        db.query(Document)
+        .filter(Document.knowledge_base_id == knowledge_base.id, Document.status != "deleting")
+        .order_by(Document.created_at.desc())
+        .all()
+    )
+    return [_document_response(document) for document in documents]
+
+
+@router.post("/{knowledge_base_id}/documents", response_model=DocumentResponse, status_code=status.HTTP_202_ACCEPTED)
+def upload_document(
+    knowledge_base_id: str,
+    file: UploadFile = File(...),
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    knowledge_base = _own_knowledge_base(db, knowledge_base_id, current_user.id)
+    filename = PurePosixPath(file.filename or "").name
+    file_type = file_type_for(filename)
+    if file_type is None:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_TYPE_DETAIL)
+
+    stored = store_content(
+        file.file,
+        DOCUMENT_KEY_PREFIX,
+        f".{file_type}",
+        file.content_type,
+        settings.STORAGE_MAX_UPLOAD_BYTES,
+    )
+    return _add_document(
+        db, knowledge_base, filename, file_type, stored.size, get_storage().public_url(stored.key), current_user.id
+    )
+
+
+@router.post(
+    "/{knowledge_base_id}/documents/import",
+    response_model=DocumentResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def import_document(
+    knowledge_base_id: str,
+    data: DocumentImport,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    """Add a document from a file the client already uploaded with a presigned URL."""
+    knowledge_base = _own_knowledge_base(db, knowledge_base_id, current_user.id)
+    filename = PurePosixPath(data.filename).name
+    file_type = file_type_for(filename)
+    if file_type is None:
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_TYPE_DETAIL)
+    if not data.key.startswith(f"{INCOMING_PREFIX}/{current_user.id}/"):
+        raise HTTPException(status_code=404, detail="文件不存在")
+
+    storage = get_storage()
+    try:
+        size = storage.size(data.key)
+    except ValueError:
+        size = None
+    if size is None:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    if size > settings.STORAGE_MAX_UPLOAD_BYTES:
+        # A MinIO presigned PUT does not bind the declared size, so the limit
+        # checked when the upload was presigned is enforced here instead.
+        storage.delete(data.key)
+        raise HTTPException(
+            status_code=413,
+            detail=f"文件大小不能超过{settings.STORAGE_MAX_UPLOAD_BYTES // (1024 * 1024)}MB",
+        )
+    return _add_document(
+        db, knowledge_base, filename, file_type, size, storage.public_url(data.key), current_user.id
+    )
+
+
+@router.get("/{knowledge_base_id}/documents/{document_id}", response_model=DocumentResponse)
+def get_document(
+    knowledge_base_id: str,
+    document_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    return _document_response(_own_document(db, knowledge_base_id, document_id, current_user.id))
+
+
+@router.post(
+    "/{knowledge_base_id}/documents/{document_id}/reindex",
+    response_model=DocumentResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def reindex_document(
+    knowledge_base_id: str,
+    document_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    document = _own_document(db, knowledge_base_id, document_id, current_user.id)
+    rag_service.reset_documents(db, Document.id == document.id)
+    db.commit()
+    db.refresh(document)
+    task_id = rag_service.ingest_document.submit(str(document.id), owner_id=current_user.id)
+    return _document_response(document, task_id)
+
+
+@router.delete("/{knowledge_base_id}/documents/{document_id}")
+def delete_document(
+    knowledge_base_id: str,
+    document_id: str,
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db),
+):
+    document = _own_document(db, knowledge_base_id, document_id, current_user.id)
+    document.knowledge_base.document_count = KnowledgeBase.document_count - 1
+    if deletion_service.needs_background(document.chunk_count):
+        document.status = "deleting"
+        rag_service.bump_generation(db, [document.knowledge_base_id])
+        db.commit()
+        task_id = deletion_service.run_deletion.submit(
+            "document", str(document.id), document.chunk_count, owner_id=current_user.id
+        )
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "文档删除中", "task_id": task_id}
+
+    removed = deletion_service.delete_documents(db, Document.id == document.id)
+    db.commit()
+    rag_service.cleanup_deleted_documents(db, removed)
+    return {"message": "文档已删除"}
@@ -3,8 +3,8 @@ from typing import Any, Optional
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel, Field
 
-from app.models.user import User
-from app.security import get_current_user
+from app.schemas.auth import Principal
+from app.security import get_current_principal
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
 
@@ -97,14 +97,14 @@ AVAILABLE_MODELS: list[dict[str, Any]] = [
 
 
 @router.get("")
-def get_settings(current_user: User = Depends(get_current_user)):
+def get_settings(current_user: Principal = Depends(get_current_principal)):
     return {**DEFAULT_SETTINGS}
 
 
 @router.put("")
 def update_settings(
     body: UserSettings,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     updated = body.model_dump()
     return updated
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import re
+import tempfile
+import uuid
+from contextlib import suppress
+from pathlib import Path, PurePosixPath
+from typing import Optional
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse
+from pydantic import BaseModel, Field
+
+from app.config import settings
+from app.schemas.auth import Principal
+from app.security import get_current_principal
+from app.services import storage_service
+
+router = APIRouter(prefix="/api/storage", tags=["storage"])
+
+INCOMING_PREFIX = storage_service.INCOMING_PREFIX
+_EXTENSION = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+
+class UploadRequest(BaseModel):
+    filename: str = Field(..., max_length=255)
+    content_type: Optional[str] = None
+    size: int = Field(..., ge=0)
+
+
+class UploadResponse(BaseModel):
+    key: str
+    upload_url: str
+    method: str = "PUT"
+    expires_in: int
+
+
+class DownloadResponse(BaseModel):
+    key: str
+    url: str
+    expires_in: int
+
+
+def _owned_key(key: str, user_id: uuid.UUID) -> str:
+    try:
+        storage_service.validate_key(key)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的文件路径")
+    if not key.startswith(f"{INCOMING_PREFIX}/{user_id}/"):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return key
+
+
+@router.post("/uploads", response_model=UploadResponse)
+def create_upload(
+    data: UploadRequest,
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Presign a direct upload; the client then ``PUT``s the file body to ``upload_url``."""
+    if data.size > settings.STORAGE_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"文件大小不能超过{settings.STORAGE_MAX_UPLOAD_BYTES // (1024 * 1024)}MB",
+        )
+    ext = PurePosixPath(data.filename).suffix.lower()
+    key = f"{INCOMING_PREFIX}/{current_user.id}/{uuid.uuid4().hex}{ext if _EXTENSION.match(ext) else ''}"
+    upload_url = storage_service.get_storage().presigned_put_url(key, data.content_type)
+    return UploadResponse(key=key, upload_url=upload_url, expires_in=settings.STORAGE_PRESIGN_EXPIRE_SECONDS)
+
+
+@router.get("/downloads", response_model=DownloadResponse)
+def create_download(
+    key: str = Query(...),
+    current_user: Principal = Depends(get_current_principal),
+):
+    key = _owned_key(key, current_user.id)
+    storage = storage_service.get_storage()
+    if not storage.exists(key):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return DownloadResponse(
+        key=key,
+        url=storage.presigned_get_url(key),
+        expires_in=settings.STORAGE_PRESIGN_EXPIRE_SECONDS,
+    )
+
+
+def _check_local_url(method: str, key: str, expires: int, signature: str) -> None:
+    if settings.STORAGE_BACKEND != "local":
+        raise HTTPException(status_code=404, detail="Not Found")
+    try:
+        storage_service.validate_key(key)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的文件路径")
+    if not storage_service.verify_local(method, key, expires, signature):
+        raise HTTPException(status_code=403, detail="链接无效或已过期")
+
+
+@router.get("/objects/{key:path}")
+def send_object(key: str, expires: int = Query(...), signature: str = Query(...)):
+    """Target of local presigned download URLs for objects outside the ``/uploads`` mount."""
+    _check_local_url("GET", key, expires, signature)
+    path = storage_service.get_storage().file_path(key)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return FileResponse(path)
+
+
+@router.put("/objects/{key:path}", status_code=201)
+async def receive_upload(key: str, request: Request, expires: int = Query(...), signature: str = Query(...)):
+    """Target of local presigned upload URLs; MinIO URLs go to the bucket directly."""
+    _check_local_url("PUT", key, expires, signature)
+
+    fd, tmp_path = tempfile.mkstemp(prefix="upload-", suffix=".part")
+    try:
+        size = 0
+        # File writes run in a worker thread so a large upload does not block the event loop.
+        async with await anyio.open_file(fd, "wb") as out:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > settings.STORAGE_MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail="文件过大")
+                await out.write(chunk)
+        await asyncio.to_thread(
+            storage_service.get_storage().put_path, key, Path(tmp_path), request.headers.get("content-type")
+        )
+    finally:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+    return {"key": key, "size": size}
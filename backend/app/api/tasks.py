@@ -0,0 +1,31 @@
+from typing import Any, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+
+from app.schemas.auth import Principal
+from app.security import get_current_principal
+from app.services import task_service
+
+router = APIRouter(prefix="/api/tasks", tags=["tasks"])
+
+
+class TaskStatusResponse(BaseModel):
+    id: str
+    name: str
+    status: str
+    attempts: int
+    progress: dict[str, Any] = {}
+    result: Any = None
+    error: Optional[str] = None
+
+
+@router.get("/{task_id}", response_model=TaskStatusResponse)
+def get_task_status(
+    task_id: str,
+    current_user: Principal = Depends(get_current_principal),
+):
+    state = task_service.get_status(task_id)
+    if state is None or state["owner_id"] != str(current_user.id):
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return TaskStatusResponse(**state)
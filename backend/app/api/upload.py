@@ -1,18 +1,16 @@
-import uuid
-from pathlib import Path
-
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from sqlalchemy.orm import Session
 
+from app.database import get_db
 from app.models.user import User
 from app.security import get_current_user
-from app.database import get_db
-from sqlalchemy.orm import Session
+from app.services import avatar_service
 
 router = APIRouter(prefix="/api/auth", tags=["upload"])
 
-UPLOAD_DIR = Path(__file__).resolve().parent.parent.parent / "uploads" / "avatars"
-ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 MB
+AVATAR_PATH = "/api/auth/me/avatar"
+# Room for the multipart boundary and part headers around the file itself.
+MAX_AVATAR_REQUEST_SIZE = avatar_service.MAX_FILE_SIZE + 64 * 1024
 
 
 @router.post("/me/avatar")
@@ -24,26 +22,16 @@ def upload_avatar(
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="只允许上传图片文件")
 
-    ext = Path(file.filename or "avatar.png").suffix.lower()
-    if ext not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=400,
-            detail=f"不支持的图片格式，允许: {', '.join(ALLOWED_EXTENSIONS)}",
-        )
-
-    data = file.file.read()
-    if len(data) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="文件大小不能超过5MB")
-
-    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
-    filename = f"{current_user.id}_{uuid.uuid4().hex[:8]}{ext}"
-    filepath = UPLOAD_DIR / filename
-    filepath.write_bytes(data)
+    key = avatar_service.save_upload(file.file, current_user.id)
 
-    avatar_url = f"/uploads/avatars/{filename}"
+    previous = [current_user.avatar_url, current_user.avatar_thumbnail_url]
+    avatar_url = avatar_service.url_for(key)
     current_user.avatar_url = avatar_url
+    current_user.avatar_thumbnail_url = None
     db.commit()
-    db.refresh(current_user)
 
-    return {"avatar_url": avatar_url, "message": "头像上传成功"}
+    # Resizing, WebP conversion and removal of the old files happen off the request.
+    task_id = avatar_service.process_avatar.submit(
+        str(current_user.id), key, previous, owner_id=current_user.id
+    )
+    return {"avatar_url": avatar_url, "task_id": task_id, "message": "头像上传成功"}
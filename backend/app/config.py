@@ -8,18 +8,105 @@ class Settings(BaseSettings):
     DEBUG: bool = False
 
     DATABASE_URL: str = "sqlite:///./soulmate.db"
+    # Defaults to DATABASE_URL with its async driver (aiosqlite / asyncpg).
+    ASYNC_DATABASE_URL: str = ""
+    # Read replica for read-only endpoints; empty routes reads to the primary.
+    DATABASE_REPLICA_URL: str = ""
+    ASYNC_DATABASE_REPLICA_URL: str = ""
+
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 268435456
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
 
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_SOCKET_TIMEOUT: float = 0.5
 
     JWT_SECRET_KEY: str = "change-me-in-production"
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Sent as X-Internal-Token to read /api/health/db and /api/health/caches;
+    # empty disables those endpoints.
+    INTERNAL_API_TOKEN: str = ""
+
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    PRINCIPAL_CACHE_ENABLED: bool = True
+    PRINCIPAL_CACHE_MAXSIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 300
+    PRINCIPAL_CACHE_LOCAL_TTL_SECONDS: int = 30
+    PRINCIPAL_CACHE_SHARED: bool = False
 
     OPENAI_API_KEY: str = ""
     OPENAI_BASE_URL: str = ""
     OPENAI_MODEL: str = "gpt-4o"
 
+    LLM_BACKEND: str = "auto"
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_MAX_CONCURRENCY_PER_MODEL: int = 64
+    LLM_MAX_CONCURRENCY_PER_USER: int = 2
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_READ_TIMEOUT_SECONDS: float = 60.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BACKOFF_SECONDS: float = 0.5
+    FAKE_LLM_FIRST_TOKEN_DELAY_MS: int = 0
+    FAKE_LLM_TOKEN_DELAY_MS: int = 0
+    FAKE_LLM_CHUNK_CHARS: int = 2
+    FAKE_LLM_ERROR_RATE: float = 0.0
+
+    CONTEXT_WINDOW_TOKENS: int = 8192
+    CONTEXT_DEFAULT_REPLY_TOKENS: int = 1024
+    CONTEXT_MAX_PROMPT_TOKENS: int = 4096
+    CONTEXT_MAX_HISTORY_MESSAGES: int = 40
+    CONTEXT_SUMMARY_TRIGGER_TOKENS: int = 1000
+    CONTEXT_SUMMARY_MAX_INPUT_TOKENS: int = 4000
+    CONTEXT_SUMMARY_MAX_TOKENS: int = 300
+
+    PROMPT_CACHE_MAXSIZE: int = 5000
+
+    PAGINATION_COUNT_CACHE_TTL_SECONDS: int = 60
+
+    TRENDING_WINDOW_DAYS: int = 7
+    TRENDING_HALF_LIFE_HOURS: float = 24.0
+    TRENDING_REFRESH_INTERVAL_SECONDS: int = 600
+
+    COUNTER_BUFFER: str = "local"
+    COUNTER_FLUSH_INTERVAL_SECONDS: float = 2.0
+
+    SEARCH_BACKEND: str = "auto"
+    SEARCH_MAX_RESULTS: int = 1000
+    SEARCH_POPULARITY_WEIGHT: float = 0.1
+
+    TASK_BACKEND: str = "local"
+    TASK_WORKERS: int = 2
+    TASK_STATE_TTL_SECONDS: int = 86400
+    TASK_STATE_SHARED: bool = False
+    CELERY_BROKER_URL: str = ""
+
+    DELETE_CHUNK_SIZE: int = 1000
+    DELETE_BACKGROUND_THRESHOLD: int = 5000
+
+    STORAGE_BACKEND: str = "local"
+    # Defaults to backend/uploads.
+    STORAGE_LOCAL_ROOT: str = ""
+    # Not served by /uploads; defaults to STORAGE_LOCAL_ROOT with "-private" appended.
+    STORAGE_LOCAL_PRIVATE_ROOT: str = ""
+    STORAGE_PUBLIC_URL: str = ""
+    STORAGE_PRESIGN_EXPIRE_SECONDS: int = 900
+    STORAGE_MAX_UPLOAD_BYTES: int = 100 * 1024 * 1024
+    STORAGE_PART_SIZE: int = 16 * 1024 * 1024
+
     MINIO_ENDPOINT: str = "localhost:9000"
     MINIO_ACCESS_KEY: str = "minioadmin"
     MINIO_SECRET_KEY: str = "minioadmin"
@@ -31,8 +118,41 @@ class Settings(BaseSettings):
     STT_API_URL: str = ""
     STT_API_KEY: str = ""
 
+    EMBEDDING_BACKEND: str = "auto"
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_TIMEOUT_SECONDS: float = 30.0
+    EMBEDDING_LOCAL_DIMENSION: int = 256
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAXSIZE: int = 10000
+    # Defaults to backend/cache/embeddings.sqlite3.
+    EMBEDDING_CACHE_PATH: str = ""
+    EMBEDDING_CACHE_MAX_ROWS: int = 1_000_000
+    RAG_INGEST_BATCH_SIZE: int = 256
+    RAG_TOP_K: int = 4
+    RAG_MAX_CONTEXT_TOKENS: int = 1000
+    RAG_RETRIEVAL_MODE: str = "hybrid"
+    RAG_FUSION_CANDIDATES: int = 20
+    RAG_RRF_K: int = 60
+    RAG_RERANK_ENABLED: bool = False
+    RAG_RERANK_MODEL: str = "BAAI/bge-reranker-base"
+    RAG_RERANK_DEVICE: str = ""
+    RAG_RERANK_CANDIDATES: int = 20
+    RAG_RERANK_BUDGET_MS: int = 300
+    RETRIEVAL_CACHE_ENABLED: bool = True
+    RETRIEVAL_CACHE_MAXSIZE: int = 5000
+    RETRIEVAL_CACHE_TTL_SECONDS: int = 3600
+    RETRIEVAL_CACHE_SHARED: bool = False
+
+    VECTOR_BACKEND: str = "embedded"
+    VECTOR_HNSW_THRESHOLD: int = 20000
+    VECTOR_HNSW_M: int = 16
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 200
+    VECTOR_HNSW_EF_SEARCH: int = 64
+    VECTOR_INDEX_MAX_KNOWLEDGE_BASES: int = 32
+
     CHROMA_HOST: str = "localhost"
     CHROMA_PORT: int = 8100
+    CHROMA_COLLECTION_PREFIX: str = "kb_"
 
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:5173"
 
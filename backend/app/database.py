@@ -1,27 +1,93 @@
 from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.config import settings
 
-connect_args = {}
-if settings.DATABASE_URL.startswith("sqlite"):
-    connect_args["check_same_thread"] = False
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-    connect_args=connect_args,
-)
 
-if settings.DATABASE_URL.startswith("sqlite"):
+def async_database_url(url: str) -> str:
+    """The async-driver equivalent of ``url`` (``sqlite`` -> ``aiosqlite``, ``postgresql`` -> ``asyncpg``)."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
 
-    @event.listens_for(engine, "connect")
-    def _set_sqlite_pragma(dbapi_conn, connection_record):
-        cursor = dbapi_conn.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
-        cursor.close()
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _engine_kwargs(url: str) -> dict:
+    kwargs = {"echo": settings.DEBUG, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if _is_sqlite(url):
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if make_url(url).database in (None, "", ":memory:"):
+            # In-memory databases use a single shared connection; no pool sizing.
+            return kwargs
+    kwargs.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    )
+    return kwargs
+
+
+def _set_sqlite_pragma(dbapi_conn, connection_record):
+    # WAL lets explore reads proceed while a chat reply is being written;
+    # busy_timeout makes concurrent writers wait instead of failing at once.
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.close()
+
+
+def _create_engine(url: str):
+    created = create_engine(url, **_engine_kwargs(url))
+    if _is_sqlite(url):
+        event.listen(created, "connect", _set_sqlite_pragma)
+    return created
+
+
+def _create_async_engine(url: str):
+    kwargs = _engine_kwargs(url)
+    if _is_sqlite(url) and "pool_size" in kwargs:
+        # aiosqlite defaults to NullPool (a new connection per checkout).
+        kwargs["poolclass"] = AsyncAdaptedQueuePool
+    created = create_async_engine(url, **kwargs)
+    if _is_sqlite(url):
+        event.listen(created.sync_engine, "connect", _set_sqlite_pragma)
+    return created
+
+
+engine = _create_engine(settings.DATABASE_URL)
+# The async engine serves the request path of the ported routers; the sync
+# engine above remains for the other routers, background jobs and Alembic.
+async_engine = _create_async_engine(settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL))
+
+# Read-only endpoints (explore, message history, stats) use the replica when
+# one is configured. Replicas may lag the primary slightly, so anything that
+# must observe the caller's own just-committed writes stays on the primary.
+read_engine = _create_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else engine
+if settings.ASYNC_DATABASE_REPLICA_URL or settings.DATABASE_REPLICA_URL:
+    async_read_engine = _create_async_engine(
+        settings.ASYNC_DATABASE_REPLICA_URL or async_database_url(settings.DATABASE_REPLICA_URL)
+    )
+else:
+    async_read_engine = async_engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
 
 
 class Base(DeclarativeBase):
@@ -34,3 +100,42 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+def pool_stats() -> dict:
+    engines = {"primary": engine, "async_primary": async_engine.sync_engine}
+    if read_engine is not engine:
+        engines["replica"] = read_engine
+    if async_read_engine is not async_engine:
+        engines["async_replica"] = async_read_engine.sync_engine
+    stats = {}
+    for name, e in engines.items():
+        pool = e.pool
+        if hasattr(pool, "checkedout"):
+            stats[name] = {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            }
+        else:
+            stats[name] = {"pool": type(pool).__name__}
+    return stats
@@ -1,26 +1,71 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.config import settings
-from app.api import auth, characters, conversations, explore, upload
+from app.database import pool_stats
+from app.api import auth, characters, conversations, explore, knowledge, storage, upload
 from app.api import settings as settings_api
+from app.api import tasks as tasks_api
+from app.security import principal_cache, require_internal_token
+from app.services import counter_service, password_service, rag_service, retrieval_service, storage_service, task_service
+from app.services.embedding_cache import close_embedding_cache, get_embedding_cache
+from app.services.embedding_service import close_embedding_backend
+from app.services.llm_service import close_llm_backend
+from app.services.popularity_service import trending_refresh_loop
+from app.services.prompt_service import prompt_cache
+from app.utils.body_limit import BodySizeLimitMiddleware
 
-app = FastAPI(title=settings.APP_NAME, docs_url="/docs", redoc_url="/redoc")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = []
+    if settings.TRENDING_REFRESH_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(trending_refresh_loop()))
+    if settings.COUNTER_FLUSH_INTERVAL_SECONDS > 0:
+        # Cancelling the loop runs a final flush.
+        tasks.append(asyncio.create_task(counter_service.flush_loop()))
+    if settings.TASK_BACKEND == "local":
+        # Local queues do not survive a restart; Celery redelivers on its own.
+        await asyncio.to_thread(rag_service.resume_ingestion)
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await asyncio.to_thread(task_service.shutdown)
+    password_service.shutdown()
+    close_embedding_backend()
+    close_embedding_cache()
+    await close_llm_backend()
+
+
+app = FastAPI(title=settings.APP_NAME, docs_url="/docs", redoc_url="/redoc", lifespan=lifespan)
+
+# Added before CORS so that CORS headers also wrap its 413 responses.
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={upload.AVATAR_PATH: upload.MAX_AVATAR_REQUEST_SIZE},
+    detail="文件大小不能超过5MB",
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[o.strip() for o in settings.CORS_ORIGINS.split(",")],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
-uploads_dir = Path(__file__).resolve().parent.parent / "uploads"
-uploads_dir.mkdir(parents=True, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=str(uploads_dir)), name="uploads")
+if settings.STORAGE_BACKEND == "local":
+    # With minio clients fetch objects from the bucket (or its CDN) instead.
+    uploads_dir = Path(settings.STORAGE_LOCAL_ROOT or storage_service.DEFAULT_LOCAL_ROOT)
+    uploads_dir.mkdir(parents=True, exist_ok=True)
+    app.mount("/uploads", StaticFiles(directory=str(uploads_dir)), name="uploads")
 
 
 @app.get("/api/health", tags=["health"])
@@ -28,9 +73,28 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/api/health/db", tags=["health"], dependencies=[Depends(require_internal_token)])
+def db_pool_stats():
+    return pool_stats()
+
+
+@app.get("/api/health/caches", tags=["health"], dependencies=[Depends(require_internal_token)])
+def cache_stats():
+    embedding_cache = get_embedding_cache()
+    return {
+        "principal": principal_cache.stats(),
+        "system_prompt": prompt_cache.stats(),
+        "embedding": embedding_cache.stats() if embedding_cache is not None else None,
+        "retrieval": retrieval_service.retrieval_cache.stats(),
+    }
+
+
 app.include_router(auth.router)
 app.include_router(characters.router)
 app.include_router(conversations.router)
 app.include_router(explore.router)
+app.include_router(knowledge.router)
 app.include_router(settings_api.router)
+app.include_router(storage.router)
+app.include_router(tasks_api.router)
 app.include_router(upload.router)
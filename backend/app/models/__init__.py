@@ -1,9 +1,9 @@
 from app.models.user import User
-from app.models.character import Character, Favorite, Tag
-from app.models.conversation import Conversation
+from app.models.character import Character, CharacterSearchDocument, CharacterTag, Favorite, Tag
+from app.models.conversation import Conversation, ConversationSummary
 from app.models.message import Message, UserAction
 from app.models.voice_profile import VoiceProfile
-from app.models.knowledge_base import KnowledgeBase, Document
+from app.models.knowledge_base import KnowledgeBase, Document, DocumentChunk
 from app.models.tool import Tool
 
 __all__ = [
@@ -11,11 +11,15 @@ __all__ = [
     "Character",
     "Favorite",
     "Tag",
+    "CharacterTag",
+    "CharacterSearchDocument",
     "Conversation",
+    "ConversationSummary",
     "Message",
     "UserAction",
     "VoiceProfile",
     "KnowledgeBase",
     "Document",
+    "DocumentChunk",
     "Tool",
 ]
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, Boolean, DateTime, Text, Integer, Float, ForeignKey, func
+from sqlalchemy import DDL, String, Boolean, DateTime, Text, Integer, Float, ForeignKey, Index, event, func, inspect
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -28,6 +28,12 @@ class Character(Base):
     like_count: Mapped[int] = mapped_column(Integer, default=0)
     chat_count: Mapped[int] = mapped_column(Integer, default=0)
     share_count: Mapped[int] = mapped_column(Integer, default=0)
+    # like_count + chat_count, kept in sync with the counters so explore can
+    # sort on an indexed column instead of an expression.
+    popularity_score: Mapped[float] = mapped_column(Float, default=0.0, server_default="0")
+    # Exponentially decayed recent engagement, refreshed periodically by
+    # app.services.popularity_service.
+    trending_score: Mapped[float] = mapped_column(Float, default=0.0, server_default="0")
     temperature: Mapped[float] = mapped_column(Float, default=0.7)
     max_tokens: Mapped[int] = mapped_column(Integer, default=2048)
     model_config_json: Mapped[dict | None] = mapped_column(JSONType)
@@ -44,8 +50,46 @@ class Character(Base):
     creator = relationship("User", back_populates="characters")
     voice_profile = relationship("VoiceProfile", back_populates="characters")
     knowledge_base = relationship("KnowledgeBase", back_populates="characters")
-    conversations = relationship("Conversation", back_populates="character", lazy="selectin")
-    tools = relationship("Tool", back_populates="character", lazy="selectin")
+    conversations = relationship("Conversation", back_populates="character", lazy="raise_on_sql")
+    tools = relationship("Tool", back_populates="character", lazy="raise_on_sql")
+
+
+Index(
+    "ix_characters_explore_popular",
+    Character.status,
+    Character.is_public,
+    Character.popularity_score.desc(),
+    Character.created_at.desc(),
+    Character.id.desc(),
+)
+Index(
+    "ix_characters_explore_trending",
+    Character.status,
+    Character.is_public,
+    Character.trending_score.desc(),
+)
+Index(
+    "ix_characters_status_is_public_created_at_id",
+    Character.status,
+    Character.is_public,
+    Character.created_at,
+    Character.id,
+)
+Index("ix_characters_creator_id_updated_at_id", Character.creator_id, Character.updated_at, Character.id)
+
+
+@event.listens_for(Character, "before_insert")
+def _init_popularity_score(mapper, connection, target: Character) -> None:
+    target.popularity_score = float((target.like_count or 0) + (target.chat_count or 0))
+
+
+@event.listens_for(Character, "before_update")
+def _sync_popularity_score(mapper, connection, target: Character) -> None:
+    # Counters are normally bumped by app.services.counter_service, which keeps
+    # popularity_score in the same UPDATE; only direct ORM edits land here.
+    state = inspect(target)
+    if state.attrs.like_count.history.has_changes() or state.attrs.chat_count.history.has_changes():
+        target.popularity_score = float((target.like_count or 0) + (target.chat_count or 0))
 
 
 class Favorite(Base):
@@ -57,9 +101,83 @@ class Favorite(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
+# One like per user and character; concurrent duplicate likes fail on insert.
+Index("uq_favorites_user_id_character_id", Favorite.user_id, Favorite.character_id, unique=True)
+Index("ix_favorites_created_at", Favorite.created_at)
+
+
 class Tag(Base):
     __tablename__ = "tags"
 
     id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
     category: Mapped[str | None] = mapped_column(String(50))
+    # Number of published, public characters carrying this tag; maintained by
+    # app.services.tag_service alongside character_tags.
+    character_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", index=True)
+
+
+class CharacterTag(Base):
+    __tablename__ = "character_tags"
+
+    character_id: Mapped[uuid.UUID] = mapped_column(GUID(), ForeignKey("characters.id"), primary_key=True)
+    tag_id: Mapped[uuid.UUID] = mapped_column(GUID(), ForeignKey("tags.id"), primary_key=True)
+    # Whether the character counts towards Tag.character_count (published and public).
+    listed: Mapped[bool] = mapped_column(Boolean, default=False, server_default="0")
+
+
+Index("ix_character_tags_tag_id_character_id", CharacterTag.tag_id, CharacterTag.character_id)
+
+
+class CharacterSearchDocument(Base):
+    """Pre-tokenized search text for a character (see app.services.search_service).
+
+    ``name_terms`` and ``body_terms`` hold space-separated terms, with CJK text
+    already split into n-grams, so the database tokenizer only has to split on
+    whitespace. On SQLite the FTS5 table ``character_search_fts`` indexes this
+    table as external content; on PostgreSQL a GIN index covers the weighted
+    tsvector of both columns.
+    """
+
+    __tablename__ = "character_search_documents"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    character_id: Mapped[uuid.UUID] = mapped_column(GUID(), ForeignKey("characters.id"), unique=True, nullable=False)
+    name_terms: Mapped[str] = mapped_column(Text, default="", server_default="")
+    body_terms: Mapped[str] = mapped_column(Text, default="", server_default="")
+
+
+SEARCH_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS character_search_fts USING fts5("
+    "name_terms, body_terms, content='character_search_documents', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS character_search_documents_ai AFTER INSERT ON character_search_documents BEGIN "
+    "INSERT INTO character_search_fts(rowid, name_terms, body_terms) VALUES (new.id, new.name_terms, new.body_terms); END",
+    "CREATE TRIGGER IF NOT EXISTS character_search_documents_ad AFTER DELETE ON character_search_documents BEGIN "
+    "INSERT INTO character_search_fts(character_search_fts, rowid, name_terms, body_terms) "
+    "VALUES ('delete', old.id, old.name_terms, old.body_terms); END",
+    "CREATE TRIGGER IF NOT EXISTS character_search_documents_au AFTER UPDATE ON character_search_documents BEGIN "
+    "INSERT INTO character_search_fts(character_search_fts, rowid, name_terms, body_terms) "
+    "VALUES ('delete', old.id, old.name_terms, old.body_terms); "
+    "INSERT INTO character_search_fts(rowid, name_terms, body_terms) VALUES (new.id, new.name_terms, new.body_terms); END",
+]
+SEARCH_PG_VECTOR = (
+    "setweight(to_tsvector('simple', name_terms), 'A') || setweight(to_tsvector('simple', body_terms), 'B')"
+)
+SEARCH_PG_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_character_search_documents_vector "
+    f"ON character_search_documents USING gin (({SEARCH_PG_VECTOR}))",
+]
+
+for _statement in SEARCH_FTS_DDL:
+    event.listen(
+        CharacterSearchDocument.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite")
+    )
+for _statement in SEARCH_PG_DDL:
+    event.listen(
+        CharacterSearchDocument.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql")
+    )
+event.listen(
+    CharacterSearchDocument.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS character_search_fts").execute_if(dialect="sqlite"),
+)
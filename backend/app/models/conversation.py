@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, DateTime, Integer, ForeignKey, func
+from sqlalchemy import String, DateTime, Integer, Text, ForeignKey, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -21,4 +21,26 @@ class Conversation(Base):
 
     user = relationship("User", back_populates="conversations")
     character = relationship("Character", back_populates="conversations")
-    messages = relationship("Message", back_populates="conversation", order_by="Message.created_at", lazy="selectin")
+    messages = relationship("Message", back_populates="conversation", order_by="Message.created_at", lazy="raise_on_sql")
+
+
+Index("ix_conversations_user_id_updated_at_id", Conversation.user_id, Conversation.updated_at, Conversation.id)
+Index("ix_conversations_created_at", Conversation.created_at)
+
+
+class ConversationSummary(Base):
+    """Rolling summary of the turns that no longer fit in the prompt window.
+
+    ``summarized_until_*`` is the (created_at, id) key of the newest message
+    folded into ``content``; later refreshes only read messages after it.
+    """
+
+    __tablename__ = "conversation_summaries"
+
+    conversation_id: Mapped[uuid.UUID] = mapped_column(GUID(), ForeignKey("conversations.id"), primary_key=True)
+    content: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    token_count: Mapped[int] = mapped_column(Integer, default=0)
+    summarized_message_count: Mapped[int] = mapped_column(Integer, default=0)
+    summarized_until_created_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    summarized_until_id: Mapped[uuid.UUID | None] = mapped_column(GUID())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
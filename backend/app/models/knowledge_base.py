@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import String, DateTime, Text, Integer, ForeignKey, func
+from sqlalchemy import String, DateTime, Text, Integer, ForeignKey, Index, LargeBinary, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -19,16 +19,23 @@ class KnowledgeBase(Base):
     embedding_model: Mapped[str] = mapped_column(String(100), default="text-embedding-ada-002")
     chunk_size: Mapped[int] = mapped_column(Integer, default=500)
     chunk_overlap: Mapped[int] = mapped_column(Integer, default=50)
+    # Bumped whenever the searchable chunks change (chunks written, documents
+    # re-chunked or deleted); versions cached retrieval results.
+    generation: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
     metadata_json: Mapped[dict | None] = mapped_column(JSONType)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
-    characters = relationship("Character", back_populates="knowledge_base")
-    documents = relationship("Document", back_populates="knowledge_base", cascade="all, delete-orphan")
+    characters = relationship("Character", back_populates="knowledge_base", lazy="raise_on_sql")
+    documents = relationship("Document", back_populates="knowledge_base", cascade="all, delete-orphan", lazy="raise_on_sql")
 
 
 class Document(Base):
     __tablename__ = "documents"
+    __table_args__ = (
+        # Every chat turn with a knowledge base reads its documents (app.services.vector_store).
+        Index("ix_documents_knowledge_base_id", "knowledge_base_id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
     knowledge_base_id: Mapped[uuid.UUID] = mapped_column(GUID(), ForeignKey("knowledge_bases.id"), nullable=False)
@@ -42,3 +49,25 @@ class Document(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     knowledge_base = relationship("KnowledgeBase", back_populates="documents")
+
+
+class DocumentChunk(Base):
+    """A slice of a document's text with its embedding, written by app.services.rag_service."""
+
+    __tablename__ = "document_chunks"
+    __table_args__ = (
+        # Ingestion resumes from Document.chunk_count; the constraint keeps a
+        # retried batch from being stored twice.
+        UniqueConstraint("document_id", "chunk_index", name="uq_document_chunks_document_id_chunk_index"),
+        Index("ix_document_chunks_knowledge_base_id", "knowledge_base_id"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(GUID(), primary_key=True, default=uuid.uuid4)
+    document_id: Mapped[uuid.UUID] = mapped_column(GUID(), ForeignKey("documents.id"), nullable=False)
+    knowledge_base_id: Mapped[uuid.UUID] = mapped_column(GUID(), ForeignKey("knowledge_bases.id"), nullable=False)
+    chunk_index: Mapped[int] = mapped_column(Integer, nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    page: Mapped[int | None] = mapped_column(Integer)
+    # float32 vector, see app.services.embedding_service.pack_vector.
+    embedding: Mapped[bytes | None] = mapped_column(LargeBinary)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
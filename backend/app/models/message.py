@@ -1,7 +1,7 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 
-from sqlalchemy import String, DateTime, Text, Integer, ForeignKey, func
+from sqlalchemy import String, DateTime, Text, Integer, ForeignKey, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -18,11 +18,19 @@ class Message(Base):
     audio_url: Mapped[str | None] = mapped_column(String(500))
     token_count: Mapped[int | None] = mapped_column(Integer)
     metadata_json: Mapped[dict | None] = mapped_column(JSONType)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # Set in Python so messages written in one transaction get distinct,
+    # microsecond-precision timestamps instead of sharing CURRENT_TIMESTAMP.
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now()
+    )
 
     conversation = relationship("Conversation", back_populates="messages")
 
 
+# History paging and context building walk one conversation in (created_at, id) order.
+Index("ix_messages_conversation_id_created_at_id", Message.conversation_id, Message.created_at, Message.id)
+
+
 class UserAction(Base):
     __tablename__ = "user_actions"
 
@@ -17,10 +17,12 @@ class User(Base):
     password_hash: Mapped[str] = mapped_column(String(255), nullable=False)
     nickname: Mapped[str | None] = mapped_column(String(100))
     avatar_url: Mapped[str | None] = mapped_column(String(500))
+    # Small variant for chat bubbles and lists; set once the upload is processed.
+    avatar_thumbnail_url: Mapped[str | None] = mapped_column(String(500))
     bio: Mapped[str | None] = mapped_column(Text)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
-    characters = relationship("Character", back_populates="creator", lazy="selectin")
-    conversations = relationship("Conversation", back_populates="user", lazy="selectin")
+    characters = relationship("Character", back_populates="creator", lazy="raise_on_sql")
+    conversations = relationship("Conversation", back_populates="user", lazy="raise_on_sql")
@@ -25,4 +25,4 @@ class VoiceProfile(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
-    characters = relationship("Character", back_populates="voice_profile")
+    characters = relationship("Character", back_populates="voice_profile", lazy="raise_on_sql")
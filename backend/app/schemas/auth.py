@@ -37,6 +37,7 @@ class UserResponse(BaseModel):
     email: str
     nickname: str | None
     avatar_url: str | None
+    avatar_thumbnail_url: str | None = None
     bio: str | None
     is_active: bool
     created_at: datetime
@@ -45,6 +46,14 @@ class UserResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class Principal(BaseModel):
+    """Lightweight view of the authenticated user, loaded without the full row."""
+
+    id: uuid.UUID
+    username: str
+    is_active: bool
+
+
 class TokenResponse(BaseModel):
     access_token: str
     refresh_token: str
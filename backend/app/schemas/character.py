@@ -70,10 +70,11 @@ class CharacterResponse(BaseModel):
 
 class CharacterListResponse(BaseModel):
     items: list[CharacterResponse]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 
 class PersonalityTemplate(BaseModel):
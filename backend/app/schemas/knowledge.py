@@ -1 +1,83 @@
-pass
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+
+class RetrievalOptions(BaseModel):
+    """Per-knowledge-base retrieval settings, stored in ``metadata_json["retrieval"]``; unset fields use the server defaults."""
+
+    # hybrid: BM25 and vector search fused by reciprocal rank; vector / lexical: one of them.
+    mode: Optional[str] = Field(default=None, pattern="^(hybrid|vector|lexical)$")
+    top_k: Optional[int] = Field(default=None, ge=1, le=50)
+    # Results taken from each retriever before fusion.
+    candidates: Optional[int] = Field(default=None, ge=1, le=200)
+    rrf_k: Optional[int] = Field(default=None, ge=1, le=1000)
+    vector_weight: Optional[float] = Field(default=None, ge=0, le=10)
+    lexical_weight: Optional[float] = Field(default=None, ge=0, le=10)
+    rerank: Optional[bool] = None
+    rerank_candidates: Optional[int] = Field(default=None, ge=1, le=100)
+    rerank_budget_ms: Optional[int] = Field(default=None, ge=10, le=10000)
+
+
+class KnowledgeBaseCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    description: Optional[str] = Field(default=None, max_length=2000)
+    embedding_model: str = Field(default="text-embedding-ada-002", max_length=100)
+    chunk_size: int = Field(default=500, ge=100, le=4000)
+    chunk_overlap: int = Field(default=50, ge=0, le=1000)
+    retrieval: Optional[RetrievalOptions] = None
+    # Attach the new knowledge base to one of the caller's characters.
+    character_id: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_overlap(self):
+        if self.chunk_overlap * 2 > self.chunk_size:
+            raise ValueError("chunk_overlap 不能超过 chunk_size 的一半")
+        return self
+
+
+class KnowledgeBaseUpdate(BaseModel):
+    name: Optional[str] = Field(default=None, min_length=1, max_length=100)
+    description: Optional[str] = Field(default=None, max_length=2000)
+    chunk_size: Optional[int] = Field(default=None, ge=100, le=4000)
+    chunk_overlap: Optional[int] = Field(default=None, ge=0, le=1000)
+    retrieval: Optional[RetrievalOptions] = None
+
+
+class KnowledgeBaseResponse(BaseModel):
+    id: uuid.UUID
+    name: str
+    description: Optional[str]
+    creator_id: uuid.UUID
+    document_count: int
+    embedding_model: str
+    chunk_size: int
+    chunk_overlap: int
+    retrieval: Optional[RetrievalOptions] = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class DocumentImport(BaseModel):
+    """A file uploaded through a presigned URL from ``POST /api/storage/uploads``."""
+
+    key: str
+    filename: str = Field(..., min_length=1, max_length=255)
+
+
+class DocumentResponse(BaseModel):
+    id: uuid.UUID
+    knowledge_base_id: uuid.UUID
+    filename: str
+    file_type: str
+    file_size: int
+    chunk_count: int
+    status: str
+    error: Optional[str] = None
+    created_at: datetime
+    # Set when the request enqueued ingestion; poll GET /api/tasks/{task_id}.
+    task_id: Optional[str] = None
@@ -1,25 +1,33 @@
+import hmac
+import time
 from datetime import datetime, timedelta, timezone
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
 
 from app.config import settings
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.models.user import User
+from app.schemas.auth import Principal
+from app.services.cache_service import TieredCache
+from app.services.password_service import hash_password, verify_password  # noqa: F401
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security_scheme = HTTPBearer()
 
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
+principal_cache = TieredCache(
+    namespace="principal",
+    maxsize=settings.PRINCIPAL_CACHE_MAXSIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    local_ttl=settings.PRINCIPAL_CACHE_LOCAL_TTL_SECONDS,
+    shared=settings.PRINCIPAL_CACHE_SHARED,
+    broadcast=True,
+    dumps=lambda principal: principal.model_dump_json(),
+    loads=Principal.model_validate_json,
+)
 
 
 def create_access_token(user_id: str) -> str:
@@ -48,8 +56,8 @@ def create_tokens(user_id: str) -> dict:
     }
 
 
-def decode_token(token: str, expected_type: str = "access") -> str:
-    """Decode and validate a JWT. Returns the user_id (sub claim)."""
+def decode_token_payload(token: str, expected_type: str = "access") -> dict:
+    """Decode and validate a JWT. Returns the full claim set."""
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
     except JWTError:
@@ -58,18 +66,122 @@ def decode_token(token: str, expected_type: str = "access") -> str:
     if payload.get("type") != expected_type:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token type")
 
-    user_id: str | None = payload.get("sub")
-    if user_id is None:
+    if payload.get("sub") is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
-    return user_id
+    return payload
+
+
+def decode_token(token: str, expected_type: str = "access") -> str:
+    """Decode and validate a JWT. Returns the user_id (sub claim)."""
+    return decode_token_payload(token, expected_type)["sub"]
+
+
+def invalidate_principal(user_id) -> None:
+    """Drop the cached principal for ``user_id`` from every worker.
+
+    With ``PRINCIPAL_CACHE_SHARED`` the delete is broadcast over Redis so other
+    workers evict their local copies at once; without it each worker's copy
+    can outlive the change by up to ``PRINCIPAL_CACHE_LOCAL_TTL_SECONDS``.
+    """
+    principal_cache.delete(str(user_id))
+
+
+@event.listens_for(User, "after_update")
+def _queue_principal_invalidation(mapper, connection, target: User) -> None:
+    # Catches every ORM write to a user (including deactivation from scripts or
+    # admin tooling). Evicting now, before commit, would let a concurrent
+    # request re-cache the old row, so the eviction waits for the commit.
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("principal_invalidations", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_principals(session: Session) -> None:
+    for user_id in session.info.pop("principal_invalidations", ()):
+        invalidate_principal(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_principal_invalidations(session: Session) -> None:
+    session.info.pop("principal_invalidations", None)
+
+
+def _cached_principal(user_id: str) -> Principal | None:
+    if settings.PRINCIPAL_CACHE_ENABLED:
+        return principal_cache.get(user_id)
+    return None
+
+
+def _principal_from_row(row, payload: dict) -> Principal:
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    if not row.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is inactive")
+    principal = Principal(id=row.id, username=row.username, is_active=row.is_active)
+
+    if settings.PRINCIPAL_CACHE_ENABLED:
+        # Never keep a principal around longer than the token that produced it.
+        principal_cache.set(payload["sub"], principal, ttl=payload["exp"] - time.time())
+    return principal
+
+
+def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
+    db: Session = Depends(get_db),
+) -> Principal:
+    """Resolve the bearer token to a principal, selecting only the columns auth needs.
+
+    Most endpoints only need the caller's id, so they depend on this instead of
+    materializing a full ``User`` entity. Principals are cached by user id for
+    at most the remaining token lifetime; see ``invalidate_principal``.
+    """
+    payload = decode_token_payload(credentials.credentials, expected_type="access")
+    cached = _cached_principal(payload["sub"])
+    if cached is not None:
+        return cached
+
+    row = (
+        db.query(User.id, User.username, User.is_active)
+        .filter(User.id == payload["sub"])
+        .first()
+    )
+    return _principal_from_row(row, payload)
+
+
+async def get_current_principal_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
+    """``get_current_principal`` for async routes; cache hits never touch the database."""
+    payload = decode_token_payload(credentials.credentials, expected_type="access")
+    cached = _cached_principal(payload["sub"])
+    if cached is not None:
+        return cached
+
+    result = await db.execute(
+        select(User.id, User.username, User.is_active).where(User.id == payload["sub"])
+    )
+    return _principal_from_row(result.first(), payload)
+
+
+def require_internal_token(x_internal_token: str | None = Header(None)) -> None:
+    """Guard operator-only endpoints; they do not exist unless ``INTERNAL_API_TOKEN`` is set."""
+    if not settings.INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_internal_token is None or not hmac.compare_digest(x_internal_token, settings.INTERNAL_API_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid internal token")
 
 
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
     db: Session = Depends(get_db),
 ) -> User:
+    """Load the full ``User`` row for endpoints that read or modify the profile."""
     user_id = decode_token(credentials.credentials, expected_type="access")
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is inactive")
     return user
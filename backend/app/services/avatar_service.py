@@ -0,0 +1,209 @@
+"""User avatar storage, normalization and cleanup.
+
+Uploads are stored through app.services.storage_service under a key derived
+from their content, so the same image uploaded twice (or by two users) is
+stored once. ``process_avatar`` then runs on the task queue: it writes a
+``AVATAR_SIZE`` px WebP for profile pages and a ``THUMBNAIL_SIZE`` px one for
+chat bubbles, points the user at them, and deletes the original and the
+user's previous avatar unless another row still uses them.
+
+Pillow is optional; without it avatars are stored as uploaded. Objects left
+behind by crashed uploads or workers are removed by ``collect_orphans``::
+
+    python -m app.services.avatar_service
+"""
+
+import logging
+import os
+import tempfile
+import time
+import uuid
+from contextlib import suppress
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.character import Character
+from app.models.user import User
+from app.services.storage_service import get_storage, key_for_url, store_content
+from app.services.task_service import task
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "avatars"
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 MB
+CHUNK_SIZE = 64 * 1024
+AVATAR_SIZE = 256
+THUMBNAIL_SIZE = 96
+WEBP_QUALITY = 85
+ORPHAN_GRACE_SECONDS = 3600
+
+# Accepted formats, identified by their leading bytes rather than the client's
+# filename or Content-Type.
+_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+]
+_CONTENT_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".gif": "image/gif", ".webp": "image/webp"}
+
+users = User.__table__
+URL_COLUMNS = (User.avatar_url, User.avatar_thumbnail_url, Character.avatar_url, Character.cover_image_url)
+
+
+def sniff_extension(head: bytes) -> str | None:
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+def url_for(key: str) -> str:
+    return get_storage().public_url(key)
+
+
+def save_upload(source: BinaryIO, user_id: uuid.UUID) -> str:
+    """Store an uploaded image and return its storage key."""
+    head = source.read(CHUNK_SIZE)
+    ext = sniff_extension(head)
+    if ext is None:
+        raise HTTPException(status_code=400, detail="只允许上传 PNG、JPEG、GIF 或 WebP 图片")
+    stored = store_content(source, KEY_PREFIX, ext, _CONTENT_TYPES[ext], MAX_FILE_SIZE, head)
+    return stored.key
+
+
+def _variant_keys(key: str) -> list[str]:
+    # Named after the original's content hash, so identical uploads share their variants too.
+    path = PurePosixPath(key)
+    return [str(path.with_name(f"{path.stem}_{size}.webp")) for size in (AVATAR_SIZE, THUMBNAIL_SIZE)]
+
+
+def remove_unreferenced(db: Session, urls: list[str | None]) -> int:
+    """Delete the stored objects behind ``urls`` that no avatar or cover column still points at."""
+    urls = [url for url in set(urls) if key_for_url(url)]
+    if not urls:
+        return 0
+    referenced = set()
+    for column in URL_COLUMNS:
+        referenced.update(db.scalars(select(column).where(column.in_(urls))))
+    storage = get_storage()
+    removed = 0
+    for url in urls:
+        if url not in referenced:
+            storage.delete(key_for_url(url))
+            removed += 1
+    return removed
+
+
+def _write_variants(key: str) -> list[str] | None:
+    """Store the WebP variants of ``key``; returns their keys, or ``None`` without Pillow."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        logger.warning("Pillow not installed; avatars are stored as uploaded")
+        return None
+
+    storage = get_storage()
+    keys = _variant_keys(key)
+    if all(storage.exists(variant_key) for variant_key in keys):
+        return keys
+
+    fd, source = tempfile.mkstemp(prefix="avatar-", suffix=PurePosixPath(key).suffix)
+    os.close(fd)
+    try:
+        storage.download(key, Path(source))
+        with Image.open(source) as image:
+            # JPEG can decode straight at a reduced scale, which is far cheaper than
+            # decoding a full-size photo only to shrink it.
+            image.draft("RGB", (AVATAR_SIZE * 2, AVATAR_SIZE * 2))
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+            for size, variant_key in zip((AVATAR_SIZE, THUMBNAIL_SIZE), keys):
+                variant = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+                with tempfile.TemporaryFile() as out:
+                    variant.save(out, "WEBP", quality=WEBP_QUALITY, method=4)
+                    size_bytes = out.tell()
+                    out.seek(0)
+                    storage.put(variant_key, out, size_bytes, "image/webp")
+    finally:
+        with suppress(FileNotFoundError):
+            os.unlink(source)
+    return keys
+
+
+@task("avatar.process", max_retries=2, retry_backoff=2.0, priority=3)
+def process_avatar(user_id: str, key: str, previous: list[str | None]) -> dict:
+    """Replace a freshly uploaded avatar with its WebP variants and drop the previous avatar."""
+    storage = get_storage()
+    if not storage.exists(key):
+        # Another user's task may already have converted identical content.
+        if not all(storage.exists(variant_key) for variant_key in _variant_keys(key)):
+            return {"status": "missing"}
+
+    variants = _write_variants(key)
+    db = SessionLocal()
+    try:
+        if variants is not None:
+            # Only if the user has not uploaded yet another avatar meanwhile.
+            updated = db.execute(
+                update(users)
+                .where(users.c.id == uuid.UUID(user_id), users.c.avatar_url == url_for(key))
+                .values(avatar_url=url_for(variants[0]), avatar_thumbnail_url=url_for(variants[1]))
+            ).rowcount
+            db.commit()
+            if not updated:
+                remove_unreferenced(db, [url_for(k) for k in [key, *variants]])
+                return {"status": "superseded"}
+            remove_unreferenced(db, [url_for(key)])
+        remove_unreferenced(db, previous)
+    finally:
+        db.close()
+
+    if variants is None:
+        return {"status": "stored", "avatar_url": url_for(key)}
+    return {"status": "processed", "avatar_url": url_for(variants[0]), "avatar_thumbnail_url": url_for(variants[1])}
+
+
+def collect_orphans(db: Session, grace_seconds: float = ORPHAN_GRACE_SECONDS) -> int:
+    """Delete avatar objects that nothing references and are older than ``grace_seconds``."""
+    storage = get_storage()
+    prefix = url_for(KEY_PREFIX)
+    referenced: set[str] = set()
+    for column in URL_COLUMNS:
+        for (url,) in db.execute(select(column).where(column.like(f"{prefix}/%"))):
+            key = key_for_url(url)
+            if key is not None:
+                referenced.add(key)
+
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for key, modified in list(storage.list(KEY_PREFIX)):
+        if key not in referenced and modified < cutoff:
+            storage.delete(key)
+            removed += 1
+    return removed
+
+
+@task("avatar.collect_orphans", priority=9)
+def collect_orphans_task() -> dict:
+    db = SessionLocal()
+    try:
+        return {"removed": collect_orphans(db)}
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    session = SessionLocal()
+    try:
+        print(f"removed {collect_orphans(session)} orphaned avatar files")
+    finally:
+        session.close()
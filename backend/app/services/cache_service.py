@@ -0,0 +1,321 @@
+"""Caching primitives shared by the application.
+
+``LRUCache`` is a thread-safe, process-local LRU with per-entry TTLs.
+``TieredCache`` layers an optional Redis tier (``settings.REDIS_URL``) under a
+local ``LRUCache`` so several API workers can share entries, and can broadcast
+deletes so other workers drop their local copies too. Setting
+``REDIS_URL=memory://`` swaps Redis for ``InMemoryRedis``, a small in-process
+stand-in used for local development.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Any, tuple[float | None, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class InMemoryPubSub:
+    def __init__(self, redis: "InMemoryRedis"):
+        self.redis = redis
+
+    def subscribe(self, **handlers: Callable[[dict], None]) -> None:
+        with self.redis._lock:
+            for channel, handler in handlers.items():
+                self.redis._subscribers.setdefault(channel, []).append(handler)
+
+    def run_in_thread(self, sleep_time: float = 0.0, daemon: bool = False, exception_handler=None) -> None:
+        # Messages are delivered synchronously by ``publish``; there is nothing to run.
+        return None
+
+
+class InMemoryRedis:
+    """Minimal in-process stand-in for the subset of redis-py the app uses."""
+
+    def __init__(self):
+        self._data: dict[str, tuple[float | None, Any]] = {}
+        self._subscribers: dict[str, list[Callable[[dict], None]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, name: str):
+        entry = self._data.get(name)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[name]
+            return None
+        return value
+
+    def get(self, name: str):
+        with self._lock:
+            return self._live(name)
+
+    def set(self, name: str, value, ex: int | None = None, nx: bool = False):
+        expires_at = time.monotonic() + ex if ex else None
+        with self._lock:
+            if nx and self._live(name) is not None:
+                return None
+            self._data[name] = (expires_at, value if isinstance(value, bytes) else str(value).encode())
+        return True
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        with self._lock:
+            mapping = self._live(name)
+            if mapping is None:
+                mapping = {}
+                self._data[name] = (None, mapping)
+            field = key.encode()
+            mapping[field] = str(int(mapping.get(field, b"0")) + amount).encode()
+            return int(mapping[field])
+
+    def hmget(self, name: str, keys: list[str]) -> list:
+        with self._lock:
+            mapping = self._live(name) or {}
+            return [mapping.get(k.encode()) for k in keys]
+
+    def hgetall(self, name: str) -> dict:
+        with self._lock:
+            return dict(self._live(name) or {})
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            return sum(1 for n in names if self._data.pop(n, None) is not None)
+
+    def publish(self, channel: str, message) -> int:
+        with self._lock:
+            handlers = list(self._subscribers.get(channel, ()))
+        data = message if isinstance(message, bytes) else str(message).encode()
+        for handler in handlers:
+            handler({"type": "message", "channel": channel.encode(), "data": data})
+        return len(handlers)
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> InMemoryPubSub:
+        return InMemoryPubSub(self)
+
+    def ping(self) -> bool:
+        return True
+
+    def flushdb(self) -> bool:
+        with self._lock:
+            self._data.clear()
+        return True
+
+
+_redis_client = None
+_redis_lock = threading.Lock()
+
+
+def get_redis():
+    """Return the shared Redis client, or ``None`` if Redis is unavailable."""
+    global _redis_client
+    if _redis_client is not None:
+        return _redis_client
+    with _redis_lock:
+        if _redis_client is not None:
+            return _redis_client
+        if settings.REDIS_URL.startswith("memory://"):
+            _redis_client = InMemoryRedis()
+            return _redis_client
+        try:
+            import redis
+        except ImportError:
+            logger.warning("redis package not installed; shared cache tier disabled")
+            return None
+        _redis_client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+        return _redis_client
+
+
+class TieredCache:
+    """Local LRU in front of an optional shared Redis tier.
+
+    Values are stored locally as Python objects and in Redis via ``dumps``/
+    ``loads``. Redis failures are logged and treated as misses so a Redis
+    outage degrades to local-only caching instead of failing requests.
+    ``local_ttl=0`` skips the local tier, for values other processes update.
+
+    With ``broadcast`` (string keys only), ``delete`` also publishes the key on
+    Redis and every process subscribed to the namespace evicts its local copy,
+    so a delete takes effect everywhere at once rather than after
+    ``local_ttl``. While a subscriber is disconnected it may miss deletes; it
+    clears its local tier when that happens, and ``local_ttl`` bounds any
+    staleness left.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        maxsize: int,
+        ttl: float,
+        local_ttl: float | None = None,
+        shared: bool = False,
+        broadcast: bool = False,
+        dumps: Callable[[Any], str] = str,
+        loads: Callable[[str], Any] = lambda raw: raw,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_ttl = ttl if local_ttl is None else min(local_ttl, ttl)
+        self.local = LRUCache(maxsize=maxsize, ttl=self.local_ttl)
+        self.shared = shared
+        self.broadcast = broadcast
+        self.dumps = dumps
+        self.loads = loads
+        self._subscribed = False
+        self._subscribe_lock = threading.Lock()
+
+    def _key(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+    @property
+    def _channel(self) -> str:
+        return f"{self.namespace}:invalidate"
+
+    def _redis(self):
+        if not self.shared:
+            return None
+        client = get_redis()
+        if client is not None and self.broadcast and not self._subscribed:
+            self._subscribe(client)
+        return client
+
+    def _subscribe(self, client) -> None:
+        with self._subscribe_lock:
+            if self._subscribed:
+                return
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{self._channel: self._on_invalidate})
+                pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=self._on_subscriber_error)
+            except Exception:
+                logger.warning("cache invalidation subscribe failed for %s", self.namespace, exc_info=True)
+                return
+            self._subscribed = True
+
+    def _on_invalidate(self, message: dict) -> None:
+        data = message["data"]
+        self.local.delete(data.decode() if isinstance(data, bytes) else data)
+
+    def _on_subscriber_error(self, exc, pubsub, thread) -> None:
+        # Deletes published while disconnected are lost; drop everything that
+        # might have been invalidated in the meantime. The next read reconnects.
+        logger.warning("cache invalidation subscriber for %s lost its connection: %s", self.namespace, exc)
+        self.local.clear()
+        time.sleep(1.0)
+
+    def get(self, key):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            raw = client.get(self._key(key))
+        except Exception:
+            logger.warning("shared cache read failed for %s", self.namespace, exc_info=True)
+            return None
+        if raw is None:
+            return None
+        value = self.loads(raw.decode() if isinstance(raw, bytes) else raw)
+        if self.local_ttl > 0:
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        # Subscribes to broadcast deletes before anything is cached locally.
+        client = self._redis()
+        if self.local_ttl > 0:
+            self.local.set(key, value, ttl=min(ttl, self.local_ttl))
+        if client is None:
+            return
+        try:
+            client.set(self._key(key), self.dumps(value), ex=max(int(ttl), 1))
+        except Exception:
+            logger.warning("shared cache write failed for %s", self.namespace, exc_info=True)
+
+    def delete(self, key) -> None:
+        self.local.delete(key)
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.delete(self._key(key))
+            if self.broadcast:
+                client.publish(self._channel, str(key))
+        except Exception:
+            logger.warning("shared cache delete failed for %s", self.namespace, exc_info=True)
+
+    def clear_local(self) -> None:
+        self.local.clear()
+
+    def stats(self) -> dict:
+        return {"namespace": self.namespace, "shared": self.shared, **self.local.stats()}
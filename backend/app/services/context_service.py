@@ -0,0 +1,236 @@
+"""Token-budgeted prompt assembly for chat turns.
+
+``build_chat_context`` walks the conversation backwards from the newest
+message, adding turns until the prompt budget is spent. Knowledge-base
+passages retrieved for the turn go in first, best first, up to
+``RAG_MAX_CONTEXT_TOKENS``. The budget is the
+model's context window minus the reply reserve (``Character.max_tokens``),
+capped by ``CONTEXT_MAX_PROMPT_TOKENS``. Token counts come from
+``Message.token_count``, which is filled when a message is written, so history
+is never re-tokenized.
+
+Turns that fall out of the window are folded into a ``ConversationSummary``
+by ``refresh_conversation_summary``, which runs after a reply is stored and
+only reads messages newer than the last summarized one.
+"""
+
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+
+import anyio
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.character import Character
+from app.models.conversation import ConversationSummary
+from app.models.message import Message
+from app.services.llm_service import LLMError, get_llm_backend
+from app.utils.pagination import keyset_after
+from app.utils.tokens import MESSAGE_OVERHEAD_TOKENS, count_message_tokens, count_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "你负责为一段角色扮演聊天维护长期记忆摘要。"
+    "请把【已有摘要】和【新增对话】合并成一段新的摘要，保留人物关系、重要事实、"
+    "用户的喜好和承诺等后续聊天需要记住的信息，省略寒暄。"
+    "只输出摘要正文，不超过{max_chars}字。"
+)
+
+
+@dataclass
+class ChatContext:
+    messages: list[dict[str, str]]
+    prompt_tokens: int
+    history_message_count: int
+    # (created_at, id) of the newest history message that did not fit in the
+    # prompt; None when the whole (unsummarized) history was included.
+    overflow_until: tuple[datetime, uuid.UUID] | None = None
+    summary_tokens: int = 0
+    knowledge_count: int = 0
+
+
+KNOWLEDGE_HEADER = "以下是与用户问题相关的资料，回答时可以参考，资料未涉及的内容不要编造：\n"
+
+
+def prompt_budget(character: Character | None) -> int:
+    window = settings.CONTEXT_WINDOW_TOKENS
+    reply_reserve = settings.CONTEXT_DEFAULT_REPLY_TOKENS
+    if character is not None:
+        window = (character.model_config_json or {}).get("context_window", window)
+        reply_reserve = character.max_tokens or reply_reserve
+    return max(min(window - reply_reserve, settings.CONTEXT_MAX_PROMPT_TOKENS), 0)
+
+
+def _message_tokens(token_count: int | None, content: str) -> int:
+    if token_count is None:
+        return count_message_tokens(content)
+    return token_count + MESSAGE_OVERHEAD_TOKENS
+
+
+def build_chat_context(
+    db: Session,
+    conversation_id: uuid.UUID,
+    character: Character | None,
+    system_prompt: str,
+    user_content: str,
+    system_prompt_tokens: int | None = None,
+    knowledge: list[str] | None = None,
+) -> ChatContext:
+    budget = prompt_budget(character)
+    if system_prompt_tokens is None:
+        system_prompt_tokens = count_tokens(system_prompt)
+    used = system_prompt_tokens + MESSAGE_OVERHEAD_TOKENS + count_message_tokens(user_content)
+
+    summary = db.get(ConversationSummary, conversation_id)
+    summary_message = None
+    summary_tokens = 0
+    if summary is not None and summary.content:
+        summary_tokens = (summary.token_count or count_tokens(summary.content)) + MESSAGE_OVERHEAD_TOKENS
+        if used + summary_tokens <= budget:
+            summary_message = {"role": "system", "content": f"此前对话的摘要：\n{summary.content}"}
+            used += summary_tokens
+        else:
+            summary_tokens = 0
+
+    knowledge_message = None
+    passages: list[str] = []
+    if knowledge:
+        knowledge_budget = min(settings.RAG_MAX_CONTEXT_TOKENS, budget - used)
+        knowledge_tokens = count_message_tokens(KNOWLEDGE_HEADER)
+        for text in knowledge:
+            passage = f"[{len(passages) + 1}] {text}"
+            cost = count_tokens(passage) + 1
+            if knowledge_tokens + cost > knowledge_budget:
+                break
+            passages.append(passage)
+            knowledge_tokens += cost
+        if passages:
+            knowledge_message = {"role": "system", "content": KNOWLEDGE_HEADER + "\n".join(passages)}
+            used += knowledge_tokens
+
+    query = (
+        db.query(Message.id, Message.role, Message.content, Message.token_count, Message.created_at)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+    )
+    if summary_message is not None and summary.summarized_until_created_at is not None:
+        query = query.filter(_after_key(db, summary.summarized_until_created_at, summary.summarized_until_id))
+
+    history: list[dict[str, str]] = []
+    overflow_until = None
+    for row in query.limit(settings.CONTEXT_MAX_HISTORY_MESSAGES + 1).yield_per(100):
+        cost = _message_tokens(row.token_count, row.content)
+        if len(history) >= settings.CONTEXT_MAX_HISTORY_MESSAGES or used + cost > budget:
+            overflow_until = (row.created_at, row.id)
+            break
+        used += cost
+        history.append({"role": row.role, "content": row.content})
+    history.reverse()
+
+    messages = [{"role": "system", "content": system_prompt}]
+    if knowledge_message is not None:
+        messages.append(knowledge_message)
+    if summary_message is not None:
+        messages.append(summary_message)
+    messages.extend(history)
+    messages.append({"role": "user", "content": user_content})
+
+    return ChatContext(
+        messages=messages,
+        prompt_tokens=used,
+        history_message_count=len(history),
+        overflow_until=overflow_until,
+        summary_tokens=summary_tokens,
+        knowledge_count=len(passages),
+    )
+
+
+MESSAGE_KEYS = [
+    (Message.created_at, lambda m: m.created_at),
+    (Message.id, lambda m: m.id),
+]
+
+
+def _after_key(db: Session, created_at: datetime, message_id: uuid.UUID):
+    return keyset_after(MESSAGE_KEYS, [created_at, message_id], db.get_bind().dialect.name, descending=False)
+
+
+def _until_key(db: Session, created_at: datetime, message_id: uuid.UUID):
+    return ~_after_key(db, created_at, message_id)
+
+
+def refresh_conversation_summary(
+    conversation_id: uuid.UUID,
+    overflow_until: tuple[datetime, uuid.UUID] | None,
+) -> None:
+    """Fold messages older than the prompt window into the conversation summary.
+
+    Runs as a background task after a reply is stored. Does nothing until the
+    unsummarized overflow reaches ``CONTEXT_SUMMARY_TRIGGER_TOKENS``, so the
+    summary is rewritten in batches rather than on every turn.
+    """
+    if overflow_until is None:
+        return
+
+    db = SessionLocal()
+    try:
+        summary = db.get(ConversationSummary, conversation_id)
+        query = (
+            db.query(Message.id, Message.role, Message.content, Message.token_count, Message.created_at)
+            .filter(
+                Message.conversation_id == conversation_id,
+                _until_key(db, *overflow_until),
+            )
+            .order_by(Message.created_at.asc(), Message.id.asc())
+        )
+        if summary is not None and summary.summarized_until_created_at is not None:
+            query = query.filter(_after_key(db, summary.summarized_until_created_at, summary.summarized_until_id))
+
+        pending = []
+        pending_tokens = 0
+        for row in query.yield_per(200):
+            pending.append(row)
+            pending_tokens += _message_tokens(row.token_count, row.content)
+            if pending_tokens >= settings.CONTEXT_SUMMARY_MAX_INPUT_TOKENS:
+                break
+
+        if pending_tokens < settings.CONTEXT_SUMMARY_TRIGGER_TOKENS:
+            return
+
+        previous = summary.content if summary is not None else ""
+        transcript = "\n".join(
+            f"{'用户' if row.role == 'user' else '角色'}：{row.content}" for row in pending
+        )
+        prompt = [
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_chars=settings.CONTEXT_SUMMARY_MAX_TOKENS)},
+            {"role": "user", "content": f"【已有摘要】\n{previous or '（无）'}\n\n【新增对话】\n{transcript}"},
+        ]
+        try:
+            content = anyio.from_thread.run(
+                lambda: get_llm_backend().complete_chat(
+                    prompt, temperature=0.2, max_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS
+                )
+            )
+        except LLMError:
+            logger.warning("summary refresh failed for conversation %s", conversation_id, exc_info=True)
+            return
+
+        if summary is None:
+            summary = ConversationSummary(conversation_id=conversation_id, summarized_message_count=0)
+            db.add(summary)
+        last = pending[-1]
+        summary.content = content.strip()
+        summary.token_count = count_tokens(summary.content)
+        summary.summarized_message_count = (summary.summarized_message_count or 0) + len(pending)
+        summary.summarized_until_created_at = last.created_at
+        summary.summarized_until_id = last.id
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("summary refresh failed for conversation %s", conversation_id)
+    finally:
+        db.close()
@@ -0,0 +1,263 @@
+"""Write-behind engagement counters for characters.
+
+Likes, chats, shares and conversations used to be read-modify-write updates
+on the character row, which lost increments under concurrency and made every
+request for a popular character queue on the same row lock. ``increment``
+now only records a delta in a buffer; ``flush`` periodically folds the
+buffered deltas into the database with one batched
+``UPDATE characters SET x = x + n`` per touched character (see ``app.main``).
+
+Buffers:
+
+- ``local`` (default): a per-process dict;
+- ``redis``: a shared hash (``COUNTER_BUFFER=redis``). Each worker can then
+  flush everyone's deltas, and a short lock keeps flushes one at a time.
+  If Redis errors, increments fall back to the local buffer.
+
+Reads use the merged view: ``merge_pending`` adds unflushed deltas to counts
+loaded from the database. With ``COUNTER_FLUSH_INTERVAL_SECONDS=0`` nothing
+is buffered and ``increment`` issues the atomic UPDATE in the caller's
+transaction.
+"""
+
+import asyncio
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from typing import Iterable
+
+from sqlalchemy import bindparam, event, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.character import Character
+from app.services.cache_service import get_redis
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("like_count", "chat_count", "share_count", "conversation_count")
+# Counters that feed Character.popularity_score.
+POPULARITY_FIELDS = ("like_count", "chat_count")
+
+REDIS_PENDING_KEY = "counters:pending"
+REDIS_FLUSH_LOCK_KEY = "counters:flush-lock"
+
+characters = Character.__table__
+
+Deltas = dict[uuid.UUID, dict[str, int]]
+
+
+class LocalCounterBuffer:
+    def __init__(self):
+        self._pending: Deltas = defaultdict(lambda: defaultdict(int))
+        # Deltas taken by a flush that has not committed yet; still visible to reads.
+        self._inflight: Deltas = {}
+        self._lock = threading.Lock()
+
+    def add(self, character_id: uuid.UUID, field: str, delta: int) -> None:
+        with self._lock:
+            self._pending[character_id][field] += delta
+
+    def get(self, character_ids: Iterable[uuid.UUID]) -> Deltas:
+        result: Deltas = {}
+        with self._lock:
+            for character_id in character_ids:
+                merged: dict[str, int] = defaultdict(int)
+                for source in (self._pending, self._inflight):
+                    for field, delta in source.get(character_id, {}).items():
+                        merged[field] += delta
+                if merged:
+                    result[character_id] = dict(merged)
+        return result
+
+    def take(self) -> Deltas:
+        with self._lock:
+            self._inflight, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            return self._inflight
+
+    def done(self, applied: bool) -> None:
+        with self._lock:
+            if not applied:
+                for character_id, fields in self._inflight.items():
+                    for field, delta in fields.items():
+                        self._pending[character_id][field] += delta
+            self._inflight = {}
+
+
+class RedisCounterBuffer:
+    """Deltas in one Redis hash, keyed ``"<character hex>:<field>"``."""
+
+    def __init__(self, client):
+        self.client = client
+        self._taken: Deltas = {}
+
+    def add(self, character_id: uuid.UUID, field: str, delta: int) -> None:
+        self.client.hincrby(REDIS_PENDING_KEY, f"{character_id.hex}:{field}", delta)
+
+    def get(self, character_ids: Iterable[uuid.UUID]) -> Deltas:
+        ids = list(character_ids)
+        keys = [f"{character_id.hex}:{field}" for character_id in ids for field in FIELDS]
+        values = self.client.hmget(REDIS_PENDING_KEY, keys) if keys else []
+        result: Deltas = {}
+        for key, raw in zip(keys, values):
+            if raw is not None and int(raw):
+                hex_id, field = key.split(":")
+                result.setdefault(uuid.UUID(hex_id), {})[field] = int(raw)
+        return result
+
+    def take(self) -> Deltas | None:
+        if not self.client.set(REDIS_FLUSH_LOCK_KEY, "1", ex=30, nx=True):
+            return None
+        deltas: Deltas = {}
+        for key, raw in self.client.hgetall(REDIS_PENDING_KEY).items():
+            key = key.decode() if isinstance(key, bytes) else key
+            if int(raw):
+                hex_id, field = key.split(":")
+                deltas.setdefault(uuid.UUID(hex_id), {})[field] = int(raw)
+        self._taken = deltas
+        return deltas
+
+    def done(self, applied: bool) -> None:
+        try:
+            if applied:
+                # Subtract what was written rather than deleting the fields, so
+                # increments that arrived during the flush are kept.
+                for character_id, fields in self._taken.items():
+                    for field, delta in fields.items():
+                        self.client.hincrby(REDIS_PENDING_KEY, f"{character_id.hex}:{field}", -delta)
+        finally:
+            self._taken = {}
+            self.client.delete(REDIS_FLUSH_LOCK_KEY)
+
+
+_local = LocalCounterBuffer()
+
+
+def _redis_buffer() -> RedisCounterBuffer | None:
+    if settings.COUNTER_BUFFER != "redis":
+        return None
+    client = get_redis()
+    return RedisCounterBuffer(client) if client is not None else None
+
+
+def _buffers() -> list:
+    redis_buffer = _redis_buffer()
+    return [_local, redis_buffer] if redis_buffer is not None else [_local]
+
+
+def _write_through(db: Session, deltas: Deltas) -> None:
+    params = []
+    for character_id, fields in deltas.items():
+        row = {f"d_{field}": fields.get(field, 0) for field in FIELDS}
+        row["d_popularity"] = sum(fields.get(field, 0) for field in POPULARITY_FIELDS)
+        row["b_id"] = character_id
+        params.append(row)
+    if not params:
+        return
+    values = {field: getattr(characters.c, field) + bindparam(f"d_{field}") for field in FIELDS}
+    db.execute(
+        update(characters)
+        .where(characters.c.id == bindparam("b_id"))
+        .values(
+            **values,
+            popularity_score=characters.c.popularity_score + bindparam("d_popularity"),
+            updated_at=characters.c.updated_at,
+        ),
+        params,
+    )
+
+
+def increment(db: Session, character_id: uuid.UUID, field: str, delta: int = 1) -> None:
+    """Count ``delta`` towards ``field`` once ``db``'s transaction commits."""
+    if field not in FIELDS:
+        raise ValueError(f"unknown counter {field!r}")
+    if settings.COUNTER_FLUSH_INTERVAL_SECONDS <= 0:
+        _write_through(db, {character_id: {field: delta}})
+        return
+    db.info.setdefault("counter_deltas", []).append((character_id, field, delta))
+
+
+@event.listens_for(Session, "after_commit")
+def _buffer_committed(session: Session) -> None:
+    for character_id, field, delta in session.info.pop("counter_deltas", []):
+        _buffer_add(character_id, field, delta)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session) -> None:
+    session.info.pop("counter_deltas", None)
+
+
+def _buffer_add(character_id: uuid.UUID, field: str, delta: int) -> None:
+    redis_buffer = _redis_buffer()
+    if redis_buffer is not None:
+        try:
+            redis_buffer.add(character_id, field, delta)
+            return
+        except Exception:
+            logger.warning("redis counter buffer unavailable; buffering locally", exc_info=True)
+    _local.add(character_id, field, delta)
+
+
+def pending(character_ids: Iterable[uuid.UUID]) -> Deltas:
+    ids = list(character_ids)
+    merged: Deltas = {}
+    for buffer in _buffers():
+        try:
+            found = buffer.get(ids)
+        except Exception:
+            logger.warning("counter buffer read failed", exc_info=True)
+            continue
+        for character_id, fields in found.items():
+            target = merged.setdefault(character_id, {})
+            for field, delta in fields.items():
+                target[field] = target.get(field, 0) + delta
+    return merged
+
+
+def merge_pending(items: list) -> list:
+    """Add unflushed deltas to ``items`` (response models with counter fields), in place."""
+    deltas = pending(item.id for item in items)
+    for item in items:
+        for field, delta in deltas.get(item.id, {}).items():
+            setattr(item, field, max(getattr(item, field) + delta, 0))
+    return items
+
+
+def flush() -> int:
+    """Write buffered deltas to the database; returns the number of characters updated."""
+    updated = 0
+    for buffer in _buffers():
+        try:
+            deltas = buffer.take()
+        except Exception:
+            logger.warning("counter buffer unavailable for flush", exc_info=True)
+            continue
+        if deltas is None:
+            continue
+        applied = False
+        db = SessionLocal()
+        try:
+            _write_through(db, deltas)
+            db.commit()
+            applied = True
+            updated += len(deltas)
+        except Exception:
+            db.rollback()
+            logger.exception("counter flush failed; deltas kept for the next flush")
+        finally:
+            db.close()
+            buffer.done(applied)
+    return updated
+
+
+async def flush_loop() -> None:
+    interval = settings.COUNTER_FLUSH_INTERVAL_SECONDS
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(flush)
+    finally:
+        await asyncio.to_thread(flush)
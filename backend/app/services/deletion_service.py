@@ -0,0 +1,183 @@
+"""Set-based deletion of conversations and characters.
+
+Deleting through the ORM loads every dependent row before removing it, so
+a long conversation (or a character with thousands of conversations) was
+pulled into memory just to be thrown away. Here rows are removed with
+``DELETE ... WHERE id IN (SELECT id ... LIMIT n)`` chunks instead: memory
+stays flat however many rows there are, and each statement holds its write
+locks only briefly.
+
+Small deletions run inline in the caller's transaction. Once one touches
+more than ``DELETE_BACKGROUND_THRESHOLD`` messages the request only enqueues
+``run_deletion`` on the task queue (app.services.task_service), which
+deletes chunk by chunk, committing after each chunk and reporting progress.
+Deletion is idempotent, so a failed attempt is simply retried.
+
+Knowledge-base documents follow the same pattern, counted in chunks rather
+than messages. Their vectors and stored files are removed only after the
+rows are committed (app.services.rag_service.cleanup_deleted_documents).
+"""
+
+import uuid
+from typing import Callable
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.character import Character, Favorite
+from app.models.conversation import Conversation, ConversationSummary
+from app.models.knowledge_base import Document, DocumentChunk, KnowledgeBase
+from app.models.message import Message
+from app.models.tool import Tool
+from app.services.rag_service import bump_generation, cleanup_deleted_documents
+from app.services.search_service import remove_character
+from app.services.tag_service import remove_character_tags
+from app.services.task_service import report_progress, task
+
+characters = Character.__table__
+conversations = Conversation.__table__
+messages = Message.__table__
+summaries = ConversationSummary.__table__
+favorites = Favorite.__table__
+tools = Tool.__table__
+knowledge_bases = KnowledgeBase.__table__
+documents = Document.__table__
+chunks = DocumentChunk.__table__
+
+Progress = Callable[[int], None]
+
+
+def _delete_chunked(db: Session, table, criteria, progress: Progress | None = None) -> int:
+    """Delete rows of ``table`` matching ``criteria``, ``DELETE_CHUNK_SIZE`` at a time."""
+    pk = table.primary_key.columns.values()[0]
+    total = 0
+    while True:
+        chunk = select(pk).where(criteria).limit(settings.DELETE_CHUNK_SIZE)
+        deleted = db.execute(delete(table).where(pk.in_(chunk))).rowcount
+        total += deleted
+        if progress is not None and deleted:
+            progress(deleted)
+        if deleted < settings.DELETE_CHUNK_SIZE:
+            return total
+
+
+def delete_conversations(db: Session, criteria, progress: Progress | None = None) -> int:
+    """Delete the conversations matching ``criteria`` with their messages and summaries.
+
+    ``progress`` is called with the number of messages removed by each chunk.
+    Returns the number of messages deleted.
+    """
+    conversation_ids = select(conversations.c.id).where(criteria)
+    deleted = _delete_chunked(db, messages, messages.c.conversation_id.in_(conversation_ids), progress)
+    db.execute(delete(summaries).where(summaries.c.conversation_id.in_(conversation_ids)))
+    _delete_chunked(db, conversations, criteria)
+    return deleted
+
+
+def delete_character(db: Session, character_id: uuid.UUID, progress: Progress | None = None) -> int:
+    """Delete a character and everything that references it; returns the number of messages deleted."""
+    deleted = delete_conversations(db, conversations.c.character_id == character_id, progress)
+    _delete_chunked(db, favorites, favorites.c.character_id == character_id)
+    remove_character_tags(db, character_id)
+    remove_character(db, character_id)
+    db.execute(delete(tools).where(tools.c.character_id == character_id))
+    db.execute(delete(characters).where(characters.c.id == character_id))
+    return deleted
+
+
+def character_message_count(db: Session, character_id: uuid.UUID) -> int:
+    return db.scalar(
+        select(func.coalesce(func.sum(conversations.c.message_count), 0))
+        .where(conversations.c.character_id == character_id)
+    )
+
+
+def hide_character(db: Session, character_id: uuid.UUID) -> None:
+    """Take a character out of explore, tags and search while a job deletes it."""
+    db.execute(
+        update(characters)
+        .where(characters.c.id == character_id)
+        .values(status="deleting", is_public=False, updated_at=characters.c.updated_at)
+    )
+    remove_character_tags(db, character_id)
+    remove_character(db, character_id)
+
+
+def delete_documents(db: Session, criteria, progress: Progress | None = None) -> list:
+    """Delete the documents matching ``criteria`` with their chunks.
+
+    ``progress`` is called with the number of chunks removed by each chunk of
+    deletes. Returns the deleted ``(id, knowledge_base_id, file_url)`` rows,
+    to pass to ``cleanup_deleted_documents`` once the deletion is committed.
+    """
+    removed = db.execute(
+        select(documents.c.id, documents.c.knowledge_base_id, documents.c.file_url).where(criteria)
+    ).all()
+    document_ids = select(documents.c.id).where(criteria)
+    _delete_chunked(db, chunks, chunks.c.document_id.in_(document_ids), progress)
+    _delete_chunked(db, documents, criteria)
+    bump_generation(db, [row.knowledge_base_id for row in removed])
+    return removed
+
+
+def delete_knowledge_base(db: Session, knowledge_base_id: uuid.UUID, progress: Progress | None = None) -> list:
+    """Delete a knowledge base and its documents, detaching the characters that use it."""
+    removed = delete_documents(db, documents.c.knowledge_base_id == knowledge_base_id, progress)
+    detach_knowledge_base(db, knowledge_base_id)
+    db.execute(delete(knowledge_bases).where(knowledge_bases.c.id == knowledge_base_id))
+    return removed
+
+
+def detach_knowledge_base(db: Session, knowledge_base_id: uuid.UUID) -> None:
+    db.execute(
+        update(characters)
+        .where(characters.c.knowledge_base_id == knowledge_base_id)
+        .values(knowledge_base_id=None, updated_at=characters.c.updated_at)
+    )
+
+
+def document_chunk_count(db: Session, criteria) -> int:
+    return db.scalar(select(func.coalesce(func.sum(documents.c.chunk_count), 0)).where(criteria))
+
+
+def needs_background(message_count: int) -> bool:
+    return message_count > settings.DELETE_BACKGROUND_THRESHOLD
+
+
+@task("deletion.run", max_retries=3, retry_backoff=5.0, priority=7)
+def run_deletion(kind: str, target_id: str, total: int) -> dict:
+    """Delete a ``"conversation"``, ``"character"``, ``"document"`` or ``"knowledge_base"``.
+
+    Commits after every chunk of deletes.
+    """
+    db = SessionLocal()
+    done = 0
+
+    def progress(deleted: int) -> None:
+        nonlocal done
+        db.commit()
+        done += deleted
+        report_progress(deleted=done, total=total)
+
+    try:
+        removed, knowledge_base_id = [], None
+        if kind == "character":
+            delete_character(db, uuid.UUID(target_id), progress)
+        elif kind == "document":
+            removed = delete_documents(db, documents.c.id == uuid.UUID(target_id), progress)
+        elif kind == "knowledge_base":
+            knowledge_base_id = uuid.UUID(target_id)
+            removed = delete_knowledge_base(db, knowledge_base_id, progress)
+        else:
+            delete_conversations(db, conversations.c.id == uuid.UUID(target_id), progress)
+        db.commit()
+        if removed or knowledge_base_id is not None:
+            cleanup_deleted_documents(db, removed, knowledge_base_id)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return {"deleted": done}
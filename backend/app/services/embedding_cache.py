@@ -0,0 +1,236 @@
+"""Content-addressed cache of text embeddings.
+
+Every chat turn with a knowledge base embeds the user message, and
+re-ingesting a document (reindex, rechunk, a retried batch) embeds chunks
+that were embedded before. Both are paid API calls, so ``embed_texts``
+looks every text up here first, keyed by a hash of the backend, the model
+(``KnowledgeBase.embedding_model``) and the text:
+
+- a process-local ``LRUCache`` of ``EMBEDDING_CACHE_MAXSIZE`` vectors;
+- a SQLite file at ``EMBEDDING_CACHE_PATH`` shared by every process on the
+  host and kept across restarts, holding at most ``EMBEDDING_CACHE_MAX_ROWS``
+  vectors (oldest dropped first).
+
+Misses are single-flighted: a text already being embedded by another thread
+is waited for rather than sent again, so concurrent identical questions
+cost one call. Vectors are kept packed as float32.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable
+
+from app.config import settings
+from app.services.cache_service import LRUCache
+from app.services.embedding_service import EmbeddingError, pack_vector, unpack_vector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = Path(__file__).resolve().parent.parent.parent / "cache" / "embeddings.sqlite3"
+
+# Keys per SELECT ... IN, below SQLite's default variable limit.
+LOOKUP_BATCH_SIZE = 500
+# Check the row cap once per this many inserted rows rather than on every write.
+PRUNE_INTERVAL = 10_000
+
+
+def cache_key(namespace: str, model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{namespace}\0{model}\0{text}".encode()).digest()
+
+
+class PersistentTier:
+    """Vectors by key in a SQLite file; failures are logged and treated as misses."""
+
+    def __init__(self, path: Path, max_rows: int):
+        self.path = path
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._inserted = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, keys: list[bytes]) -> dict[bytes, bytes]:
+        found: dict[bytes, bytes] = {}
+        try:
+            with self._lock:
+                conn = self._connection()
+                for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                    batch = keys[start:start + LOOKUP_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    found.update(conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch))
+        except sqlite3.Error:
+            logger.warning("embedding cache read failed", exc_info=True)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items: dict[bytes, bytes]) -> None:
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    conn.execute("BEGIN")
+                    conn.executemany("INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)", items.items())
+                self._inserted += len(items)
+                if self._inserted >= PRUNE_INTERVAL:
+                    self._inserted = 0
+                    self._prune(conn)
+        except sqlite3.Error:
+            logger.warning("embedding cache write failed", exc_info=True)
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        # Rows are never replaced, so rowid order is insertion order.
+        last = conn.execute("SELECT max(rowid) FROM embeddings").fetchone()[0] or 0
+        conn.execute("DELETE FROM embeddings WHERE rowid <= ?", (last - self.max_rows,))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class EmbeddingCache:
+    def __init__(self, maxsize: int, persistent: PersistentTier | None = None):
+        self.memory = LRUCache(maxsize=maxsize)
+        self.persistent = persistent
+        self._inflight: dict[bytes, Future] = {}
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.joined = 0
+
+    def embed(
+        self,
+        namespace: str,
+        model: str,
+        texts: list[str],
+        compute: Callable[[list[str]], list[list[float]]],
+    ) -> list[list[float]]:
+        """Vectors for ``texts``, calling ``compute`` only for texts nobody has embedded."""
+        keys = [cache_key(namespace, model, text) for text in texts]
+        packed: dict[bytes, bytes] = {}
+        for key in set(keys):
+            vector = self.memory.get(key)
+            if vector is not None:
+                packed[key] = vector
+
+        missing = [key for key in dict.fromkeys(keys) if key not in packed]
+        if missing and self.persistent is not None:
+            for key, vector in self.persistent.get_many(missing).items():
+                packed[key] = vector
+                self.memory.set(key, vector)
+            missing = [key for key in missing if key not in packed]
+
+        if missing:
+            packed.update(self._compute(missing, dict(zip(keys, texts)), compute))
+        return [unpack_vector(packed[key]) for key in keys]
+
+    def _compute(self, keys: list[bytes], texts: dict[bytes, str], compute) -> dict[bytes, bytes]:
+        owned: list[bytes] = []
+        waiting: dict[bytes, Future] = {}
+        packed: dict[bytes, bytes] = {}
+        with self._lock:
+            for key in keys:
+                future = self._inflight.get(key)
+                if future is None:
+                    self._inflight[key] = Future()
+                    owned.append(key)
+                else:
+                    waiting[key] = future
+        self.joined += len(waiting)
+
+        if owned:
+            try:
+                vectors = compute([texts[key] for key in owned])
+                if len(vectors) != len(owned):
+                    raise EmbeddingError(f"backend returned {len(vectors)} vectors for {len(owned)} texts")
+            except BaseException as exc:
+                self._finish(owned, error=exc)
+                raise
+            computed = {key: pack_vector(vector) for key, vector in zip(owned, vectors)}
+            self.computed += len(owned)
+            # Into memory before leaving the in-flight table, so a concurrent
+            # caller finds the vector in one place or the other.
+            for key, vector in computed.items():
+                self.memory.set(key, vector)
+            self._finish(owned, results=computed)
+            if self.persistent is not None:
+                self.persistent.set_many(computed)
+            packed.update(computed)
+
+        for key, future in waiting.items():
+            # Raises the owner's error, e.g. EmbeddingError, to every waiter.
+            packed[key] = future.result()
+        return packed
+
+    def _finish(self, keys: list[bytes], results: dict[bytes, bytes] | None = None, error=None) -> None:
+        with self._lock:
+            futures = [self._inflight.pop(key) for key in keys]
+        for key, future in zip(keys, futures):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[key])
+
+    def close(self) -> None:
+        if self.persistent is not None:
+            self.persistent.close()
+
+    def stats(self) -> dict:
+        return {
+            **self.memory.stats(),
+            "computed": self.computed,
+            "joined_inflight": self.joined,
+            "persistent": self.persistent.stats() if self.persistent is not None else None,
+        }
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """The process-wide cache, or ``None`` when ``EMBEDDING_CACHE_ENABLED`` is off."""
+    global _cache
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                persistent = None
+                if settings.EMBEDDING_CACHE_MAX_ROWS > 0:
+                    path = Path(settings.EMBEDDING_CACHE_PATH or DEFAULT_PATH)
+                    persistent = PersistentTier(path, settings.EMBEDDING_CACHE_MAX_ROWS)
+                _cache = EmbeddingCache(settings.EMBEDDING_CACHE_MAXSIZE, persistent)
+    return _cache
+
+
+def close_embedding_cache() -> None:
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
@@ -0,0 +1,218 @@
+"""Text embedding backends for knowledge-base retrieval.
+
+``embed_texts`` turns a list of texts into L2-normalized float vectors,
+sending them to the backend ``EMBEDDING_BATCH_SIZE`` at a time. Backends
+(``EMBEDDING_BACKEND``):
+
+- ``openai``: the ``/embeddings`` endpoint at ``OPENAI_BASE_URL`` over one
+  shared httpx connection pool, retrying throttling and server errors;
+- ``local``: a deterministic feature-hashing model of words and character
+  bigrams (so Chinese text embeds meaningfully without a tokenizer). It needs
+  no network and gives identical vectors on every run, which suits
+  development and tests; retrieval quality is far below a real model.
+
+``auto`` picks ``openai`` when ``OPENAI_API_KEY`` is set. Vectors are stored
+as packed float32 (``pack_vector`` / ``unpack_vector``). API results are
+cached by content (app.services.embedding_cache).
+"""
+
+import hashlib
+import logging
+import math
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+_WORD = re.compile(r"\w+")
+
+
+class EmbeddingError(Exception):
+    pass
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"upstream returned {status_code}")
+
+
+class EmbeddingBackend(ABC):
+    name = "base"
+    # Whether results go through the embedding cache; not worth it for local hashing.
+    cacheable = True
+
+    @property
+    def cache_namespace(self) -> str:
+        """Identifies the vector space, so different backends never share cache entries."""
+        return self.name
+
+    @abstractmethod
+    def embed(self, texts: list[str], model: str) -> list[list[float]]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else vector
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    name = "local"
+    cacheable = False
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    def _features(self, text: str) -> list[str]:
+        text = text.lower()
+        features = _WORD.findall(text)
+        compact = "".join(ch for ch in text if not ch.isspace())
+        features.extend(compact[i:i + 2] for i in range(len(compact) - 1))
+        return features
+
+    def embed(self, texts: list[str], model: str) -> list[list[float]]:
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dimension
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dimension
+                vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+            vectors.append(_normalize(vector))
+        return vectors
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    name = "openai"
+
+    def __init__(self, base_url: str, api_key: str, timeout: float, max_retries: int, retry_backoff: float):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._client: httpx.Client | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"{self.name}:{self.base_url}"
+
+    def _get_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None or self._client.is_closed:
+                self._client = httpx.Client(
+                    base_url=self.base_url,
+                    headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else {},
+                    timeout=self.timeout,
+                )
+            return self._client
+
+    def embed(self, texts: list[str], model: str) -> list[list[float]]:
+        attempt = 0
+        while True:
+            try:
+                response = self._get_client().post("/embeddings", json={"model": model, "input": texts})
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                    raise _RetryableStatus(response.status_code)
+                if response.status_code >= 400:
+                    raise EmbeddingError(f"upstream returned {response.status_code}: {response.text[:200]}")
+                data = sorted(response.json()["data"], key=lambda item: item["index"])
+                return [_normalize(item["embedding"]) for item in data]
+            except (httpx.TransportError, _RetryableStatus) as exc:
+                if attempt >= self.max_retries:
+                    raise EmbeddingError(f"embedding request failed: {exc!r}") from exc
+                attempt += 1
+                delay = random.uniform(0, self.retry_backoff * 2 ** (attempt - 1))
+                logger.warning("embedding request failed (%r), retry %d in %.2fs", exc, attempt, delay)
+                time.sleep(delay)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+_backend: EmbeddingBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def _create_backend() -> EmbeddingBackend:
+    kind = settings.EMBEDDING_BACKEND
+    if kind == "auto":
+        kind = "openai" if settings.OPENAI_API_KEY else "local"
+    if kind == "local":
+        return LocalEmbeddingBackend(settings.EMBEDDING_LOCAL_DIMENSION)
+    if kind == "openai":
+        return OpenAIEmbeddingBackend(
+            base_url=settings.OPENAI_BASE_URL or "https://api.openai.com/v1",
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.EMBEDDING_TIMEOUT_SECONDS,
+            max_retries=settings.LLM_MAX_RETRIES,
+            retry_backoff=settings.LLM_RETRY_BACKOFF_SECONDS,
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {settings.EMBEDDING_BACKEND}")
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+    return _backend
+
+
+def set_embedding_backend(backend: EmbeddingBackend | None) -> None:
+    """Override the process-wide backend (``None`` restores the configured one)."""
+    global _backend
+    _backend = backend
+
+
+def close_embedding_backend() -> None:
+    global _backend
+    if _backend is not None:
+        _backend.close()
+        _backend = None
+
+
+def _embed_batched(backend: EmbeddingBackend, texts: list[str], model: str) -> list[list[float]]:
+    vectors: list[list[float]] = []
+    for start in range(0, len(texts), settings.EMBEDDING_BATCH_SIZE):
+        vectors.extend(backend.embed(texts[start:start + settings.EMBEDDING_BATCH_SIZE], model))
+    return vectors
+
+
+def embed_texts(texts: list[str], model: str) -> list[list[float]]:
+    # Imported lazily: the cache packs vectors with this module's helpers.
+    from app.services.embedding_cache import get_embedding_cache
+
+    backend = get_embedding_backend()
+    cache = get_embedding_cache() if backend.cacheable else None
+    if cache is None:
+        return _embed_batched(backend, texts, model)
+    return cache.embed(backend.cache_namespace, model, texts, lambda missing: _embed_batched(backend, missing, model))
+
+
+def pack_vector(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
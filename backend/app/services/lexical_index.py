@@ -0,0 +1,121 @@
+"""BM25 keyword search over knowledge-base chunks.
+
+Vector search misses what embeddings blur: names, numbers and exact terms in
+character lore. This index scores chunks with Okapi BM25 over the terms of
+app.services.search_service (lowercased words; CJK runs as bigrams, plus
+unigrams when indexing), so it needs no tokenizer model and handles Chinese.
+
+It is held in process per knowledge base and synced with ``document_chunks``
+like the embedded vector index (app.services.vector_store.ChunkIndexes).
+Removed chunks stay in the postings, masked, until they outnumber the live
+ones and the index is rebuilt; until then document frequencies still count
+them, which only slightly softens the weight of terms they contained.
+"""
+
+import math
+import threading
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from app.config import settings
+from app.services.search_service import index_terms, query_terms
+from app.services.vector_store import ChunkIndexes, SearchHit, chunks
+
+K1 = 1.2
+B = 0.75
+
+
+class LexicalIndex:
+    """Append-only BM25 postings with deletion marks. Not thread-safe; callers hold a lock."""
+
+    def __init__(self):
+        # term -> (rows, term frequencies)
+        self.postings: dict[str, tuple[array, array]] = {}
+        self.lengths = array("i")
+        self.alive = bytearray()
+        self.live_count = 0
+        self.live_length = 0
+        self.deleted = 0
+
+    def __len__(self) -> int:
+        return self.live_count
+
+    def add(self, documents: list[list[str]]) -> np.ndarray:
+        """Index each term list as a row; returns the rows."""
+        start = len(self.lengths)
+        for row, terms in enumerate(documents, start):
+            for term, frequency in Counter(terms).items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = (array("i"), array("i"))
+                posting[0].append(row)
+                posting[1].append(frequency)
+            self.lengths.append(len(terms))
+            self.alive.append(1)
+            self.live_count += 1
+            self.live_length += len(terms)
+        return np.arange(start, len(self.lengths))
+
+    def remove(self, rows: np.ndarray) -> None:
+        for row in rows.tolist():
+            if self.alive[row]:
+                self.alive[row] = 0
+                self.live_count -= 1
+                self.live_length -= self.lengths[row]
+                self.deleted += 1
+
+    def search(self, terms: list[str], top_k: int) -> list[tuple[int, float]]:
+        """``(row, BM25 score)`` of the ``top_k`` best live rows matching any of ``terms``, best first."""
+        if not self.live_count or top_k <= 0:
+            return []
+        lengths = np.frombuffer(self.lengths, dtype=np.intc)
+        average_length = self.live_length / self.live_count or 1.0
+        scores = np.zeros(len(lengths), dtype=np.float32)
+        for term in dict.fromkeys(terms):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows = np.frombuffer(posting[0], dtype=np.intc)
+            frequencies = np.frombuffer(posting[1], dtype=np.intc).astype(np.float32)
+            idf = math.log(1 + (self.live_count - len(rows) + 0.5) / (len(rows) + 0.5))
+            norms = K1 * (1 - B + B * lengths[rows] / average_length)
+            scores[rows] += idf * frequencies * (K1 + 1) / (frequencies + norms)
+        scores[np.frombuffer(self.alive, dtype=np.uint8) == 0] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        best = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(row), float(scores[row])) for row in best]
+
+
+class LexicalStore(ChunkIndexes):
+    column = chunks.c.content
+
+    def _prepare(self, kb_index, value):
+        if kb_index.index is None:
+            kb_index.index = LexicalIndex()
+        return index_terms(value).split()
+
+    def search(self, db, knowledge_base_id, query: str, top_k: int, generation: int | None = None) -> list[SearchHit]:
+        terms = query_terms(query)
+        if not terms:
+            return []
+        with self.synced(db, knowledge_base_id, generation) as kb_index:
+            if kb_index.index is None:
+                return []
+            return [SearchHit(*kb_index.key(row), score) for row, score in kb_index.index.search(terms, top_k)]
+
+
+_store: LexicalStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_lexical_store() -> LexicalStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LexicalStore(settings.VECTOR_INDEX_MAX_KNOWLEDGE_BASES)
+    return _store
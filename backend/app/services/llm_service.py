@@ -1 +1,344 @@
-pass
+"""Chat completion backends.
+
+Endpoints talk to an ``LLMBackend`` obtained from ``get_llm_backend()``. Replies
+are produced as an async stream of text deltas so callers can forward tokens
+to the client as soon as they arrive; ``complete_chat`` joins the stream for
+callers that need the whole reply, and coalesces a user's identical in-flight
+requests into a single upstream call.
+
+``OpenAICompatibleBackend`` talks to ``OPENAI_BASE_URL`` through one shared
+httpx connection pool, bounded by per-model and per-user concurrency limits,
+and retries failed requests with jittered exponential backoff until the first
+token has been received. Closing the stream (e.g. the client disconnected)
+closes the upstream response and releases its connection and limiter slots.
+
+``FakeLLMBackend`` needs no network and has configurable first-token and
+per-token delays, which makes it suitable for local development and for
+measuring time-to-first-token and throughput offline. ``mock_llm_server``
+serves it over the OpenAI wire format for load tests.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import random
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+ChatMessage = dict[str, str]
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """The upstream model failed to produce a reply."""
+
+
+class LLMOverloadedError(LLMError):
+    """A concurrency limit could not be acquired within the queue timeout."""
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"upstream returned {status_code}")
+        self.status_code = status_code
+
+
+class _LeaderCancelled(Exception):
+    """The request a coalesced caller was waiting on was cancelled."""
+
+
+class LLMBackend(ABC):
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @abstractmethod
+    def stream_chat(
+        self,
+        messages: list[ChatMessage],
+        *,
+        model: str | None = None,
+        temperature: float | None = None,
+        max_tokens: int | None = None,
+        user: str | None = None,
+    ) -> AsyncIterator[str]:
+        """The reply as text deltas; implemented as an async generator."""
+
+    async def complete_chat(self, messages: list[ChatMessage], **kwargs) -> str:
+        """Return the full reply, sharing one upstream call between a user's identical requests."""
+        key = _coalesce_key(messages, kwargs)
+        future = self._inflight.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # The leading caller went away; make our own request instead.
+                pass
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            parts = [delta async for delta in self.stream_chat(messages, **kwargs)]
+            reply = "".join(parts)
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark the exception retrieved when nobody else was waiting on it.
+            future.exception()
+            raise
+        else:
+            future.set_result(reply)
+            return reply
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def aclose(self) -> None:
+        pass
+
+
+def _coalesce_key(messages: list[ChatMessage], kwargs: dict) -> str:
+    # ``user`` stays in the key: every user gets their own upstream call, and
+    # so goes through their own per-user concurrency limit.
+    raw = json.dumps([messages, kwargs], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _KeyedLimiter:
+    """One semaphore per key, created on demand and dropped when idle."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._entries: dict[str, list] = {}
+
+    @asynccontextmanager
+    async def acquire(self, key: str, timeout: float):
+        entry = self._entries.setdefault(key, [asyncio.Semaphore(self.limit), 0])
+        entry[1] += 1
+        try:
+            try:
+                await asyncio.wait_for(entry[0].acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise LLMOverloadedError(f"concurrency limit reached for {key}") from None
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._entries.pop(key, None)
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        default_model: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        max_concurrency_per_model: int = 64,
+        max_concurrency_per_user: int = 2,
+        queue_timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        max_retries: int = 2,
+        retry_backoff: float = 0.5,
+    ):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.default_model = default_model
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.model_limiter = _KeyedLimiter(max_concurrency_per_model)
+        self.user_limiter = _KeyedLimiter(max_concurrency_per_user)
+        self._client: httpx.AsyncClient | None = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                limits=self.limits,
+                timeout=self.timeout,
+            )
+        return self._client
+
+    def _backoff(self, attempt: int, retry_after: str | None = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), 30.0)
+            except ValueError:
+                pass
+        # Full jitter keeps retries from a burst of failures from re-synchronizing.
+        return random.uniform(0, self.retry_backoff * 2 ** (attempt - 1))
+
+    @asynccontextmanager
+    async def _slots(self, model: str, user: str | None):
+        # Take the per-user slot first so one user's burst queues on their own
+        # limit instead of occupying model-wide capacity while waiting.
+        if user is None:
+            async with self.model_limiter.acquire(model, self.queue_timeout):
+                yield
+            return
+        async with self.user_limiter.acquire(user, self.queue_timeout):
+            async with self.model_limiter.acquire(model, self.queue_timeout):
+                yield
+
+    async def stream_chat(self, messages, *, model=None, temperature=None, max_tokens=None, user=None):
+        model = model or self.default_model
+        payload: dict = {"model": model, "messages": messages, "stream": True}
+        if temperature is not None:
+            payload["temperature"] = temperature
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        if user is not None:
+            payload["user"] = user
+
+        async with self._slots(model, user):
+            attempt = 0
+            while True:
+                started = False
+                retry_after = None
+                try:
+                    async with self._get_client().stream("POST", "/chat/completions", json=payload) as response:
+                        if response.status_code >= 400:
+                            await response.aread()
+                            if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                                retry_after = response.headers.get("retry-after")
+                                raise _RetryableStatus(response.status_code)
+                            raise LLMError(f"upstream returned {response.status_code}: {response.text[:200]}")
+
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                return
+                            chunk = json.loads(data)
+                            choices = chunk.get("choices") or []
+                            delta = choices[0].get("delta", {}).get("content") if choices else None
+                            if delta:
+                                started = True
+                                yield delta
+                    return
+                except (httpx.TransportError, _RetryableStatus) as exc:
+                    # Tokens already sent to the caller cannot be taken back.
+                    if started or attempt >= self.max_retries:
+                        raise LLMError(f"upstream request failed: {exc!r}") from exc
+                    attempt += 1
+                    delay = self._backoff(attempt, retry_after)
+                    logger.warning("LLM request failed (%r), retry %d in %.2fs", exc, attempt, delay)
+                    await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class FakeLLMBackend(LLMBackend):
+    """Echoes the last user message back in fixed-size chunks."""
+
+    def __init__(
+        self,
+        first_token_delay: float = 0.0,
+        token_delay: float = 0.0,
+        chunk_chars: int = 2,
+        reply_template: str = "你说的是：{content}",
+    ):
+        super().__init__()
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.chunk_chars = max(chunk_chars, 1)
+        self.reply_template = reply_template
+
+    def build_reply(self, messages: list[ChatMessage]) -> str:
+        last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        return self.reply_template.format(content=last_user)
+
+    async def stream_chat(self, messages, *, model=None, temperature=None, max_tokens=None, user=None):
+        reply = self.build_reply(messages)
+        if max_tokens is not None:
+            reply = reply[: max_tokens * self.chunk_chars]
+        if self.first_token_delay:
+            await asyncio.sleep(self.first_token_delay)
+        for i in range(0, len(reply), self.chunk_chars):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield reply[i : i + self.chunk_chars]
+
+
+_backend: LLMBackend | None = None
+
+
+def create_fake_backend() -> FakeLLMBackend:
+    return FakeLLMBackend(
+        first_token_delay=settings.FAKE_LLM_FIRST_TOKEN_DELAY_MS / 1000,
+        token_delay=settings.FAKE_LLM_TOKEN_DELAY_MS / 1000,
+        chunk_chars=settings.FAKE_LLM_CHUNK_CHARS,
+    )
+
+
+def _create_backend() -> LLMBackend:
+    kind = settings.LLM_BACKEND
+    if kind == "auto":
+        kind = "openai" if settings.OPENAI_API_KEY else "fake"
+    if kind == "fake":
+        return create_fake_backend()
+    if kind == "openai":
+        return OpenAICompatibleBackend(
+            base_url=settings.OPENAI_BASE_URL or "https://api.openai.com/v1",
+            api_key=settings.OPENAI_API_KEY,
+            default_model=settings.OPENAI_MODEL,
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            max_concurrency_per_model=settings.LLM_MAX_CONCURRENCY_PER_MODEL,
+            max_concurrency_per_user=settings.LLM_MAX_CONCURRENCY_PER_USER,
+            queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+            connect_timeout=settings.LLM_CONNECT_TIMEOUT_SECONDS,
+            read_timeout=settings.LLM_READ_TIMEOUT_SECONDS,
+            max_retries=settings.LLM_MAX_RETRIES,
+            retry_backoff=settings.LLM_RETRY_BACKOFF_SECONDS,
+        )
+    raise ValueError(f"Unknown LLM_BACKEND: {settings.LLM_BACKEND}")
+
+
+def get_llm_backend() -> LLMBackend:
+    global _backend
+    if _backend is None:
+        _backend = _create_backend()
+    return _backend
+
+
+async def close_llm_backend() -> None:
+    global _backend
+    if _backend is not None:
+        await _backend.aclose()
+        _backend = None
+
+
+def set_llm_backend(backend: LLMBackend | None) -> None:
+    """Override the process-wide backend (``None`` restores the configured one)."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,74 @@
+"""OpenAI-compatible mock server for local load tests.
+
+Serves ``POST /v1/chat/completions`` (streaming and non-streaming) using
+``FakeLLMBackend``, so the real ``OpenAICompatibleBackend`` can be exercised
+end to end without network access or API spend::
+
+    FAKE_LLM_FIRST_TOKEN_DELAY_MS=300 FAKE_LLM_TOKEN_DELAY_MS=20 \\
+        uvicorn app.services.mock_llm_server:app --port 9100
+
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 LLM_BACKEND=openai uvicorn app.main:app
+
+``FAKE_LLM_ERROR_RATE`` makes that fraction of requests fail with a 503 to
+exercise the client's retry path.
+"""
+
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.config import settings
+from app.services.llm_service import create_fake_backend
+
+app = FastAPI(title="Mock LLM")
+backend = create_fake_backend()
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason: str | None = None) -> str:
+    body = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if settings.FAKE_LLM_ERROR_RATE and random.random() < settings.FAKE_LLM_ERROR_RATE:
+        return JSONResponse({"error": {"message": "injected failure"}}, status_code=503)
+
+    model = body.get("model", "mock")
+    messages = body.get("messages", [])
+    max_tokens = body.get("max_tokens")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    if not body.get("stream"):
+        content = await backend.complete_chat(messages, max_tokens=max_tokens)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+        }
+
+    async def event_stream():
+        yield _chunk(completion_id, model, {"role": "assistant"})
+        async for delta in backend.stream_chat(messages, max_tokens=max_tokens):
+            yield _chunk(completion_id, model, {"content": delta})
+        yield _chunk(completion_id, model, {}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
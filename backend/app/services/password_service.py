@@ -0,0 +1,101 @@
+"""Password hashing off the request threads.
+
+bcrypt costs ~250 ms of CPU per call at the default cost. Run inline in sync
+handlers it held a threadpool slot for that long, so a burst of logins
+starved every other endpoint. The async helpers here hand the work to a
+dedicated process pool (``PASSWORD_HASH_WORKERS`` processes, so hashing
+also escapes the GIL) and await the result.
+
+At most ``PASSWORD_HASH_MAX_PENDING`` hashes may be queued or running; past
+that, callers get an immediate 503 instead of waiting behind the backlog.
+
+``PASSWORD_BCRYPT_ROUNDS`` sets the cost for new hashes. When it changes,
+``verify_password_async`` returns a replacement hash on the next successful
+login so stored hashes migrate to the new cost transparently.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.config import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    return pwd_context.verify(plain, hashed)
+
+
+def verify_and_update(plain: str, hashed: str) -> tuple[bool, str | None]:
+    """``(valid, new_hash)``; ``new_hash`` is set when ``hashed`` uses an outdated cost or scheme."""
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+_pool: Executor | None = None
+_pool_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _get_pool() -> Executor | None:
+    global _pool
+    if settings.PASSWORD_HASH_WORKERS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a process that already runs threads and an event loop is unsafe.
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+async def _run(func, *args):
+    global _pending
+    with _pending_lock:
+        if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="请求过多，请稍后再试",
+                headers={"Retry-After": "1"},
+            )
+        _pending += 1
+    try:
+        pool = _get_pool()
+        if pool is None:
+            return await asyncio.to_thread(func, *args)
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(hash_password, password)
+
+
+async def verify_password_async(plain: str, hashed: str) -> tuple[bool, str | None]:
+    return await _run(verify_and_update, plain, hashed)
+
+
+def pending() -> int:
+    return _pending
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
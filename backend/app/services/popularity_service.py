@@ -0,0 +1,120 @@
+"""Popularity and trending scores for the explore catalogue.
+
+``popularity_score`` (all-time ``like_count + chat_count``) is maintained on
+every ORM write; ``recompute_popularity_scores`` re-derives it in one set-based
+UPDATE for backfills and after bulk counter changes.
+
+``trending_score`` is a time-decayed sum over likes and new conversations in
+the last ``TRENDING_WINDOW_DAYS``: each event contributes
+``0.5 ** (age_hours / TRENDING_HALF_LIFE_HOURS)``. The database counts events
+per character and hour of age, so a refresh reads at most one row per
+character-hour however many events there are, and the decayed sums are
+written back in one bulk UPDATE. It is refreshed by
+``refresh_trending_scores`` on an interval (see ``app.main``) or on demand::
+
+    python -m app.services.popularity_service
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Integer, Select, bindparam, cast, func, literal, select, union_all, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.character import Character, Favorite
+from app.models.conversation import Conversation
+
+logger = logging.getLogger(__name__)
+
+
+characters = Character.__table__
+
+
+def recompute_popularity_scores(db: Session) -> int:
+    # Score writes pin updated_at so they do not reorder "my characters" lists.
+    result = db.execute(
+        update(characters).values(
+            popularity_score=func.coalesce(characters.c.like_count, 0) + func.coalesce(characters.c.chat_count, 0),
+            updated_at=characters.c.updated_at,
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _age_hours(created_at, now: datetime, dialect: str):
+    """Whole hours from ``created_at`` to ``now``, computed by the database."""
+    if dialect == "sqlite":
+        # Timestamps are stored as UTC text, which julianday() parses.
+        now_text = now.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+        return cast((func.julianday(now_text) - func.julianday(created_at)) * 24, Integer)
+    return cast(func.floor(func.extract("epoch", literal(now) - created_at) / 3600), Integer)
+
+
+def trending_events(now: datetime, since: datetime, dialect: str) -> Select:
+    """``(character_id, age_hours, events)`` for likes and new conversations since ``since``."""
+    events = union_all(
+        select(Favorite.character_id, Favorite.created_at).where(Favorite.created_at >= since),
+        select(Conversation.character_id, Conversation.created_at).where(Conversation.created_at >= since),
+    ).subquery()
+    age_hours = _age_hours(events.c.created_at, now, dialect)
+    return select(events.c.character_id, age_hours, func.count()).group_by(events.c.character_id, age_hours)
+
+
+def refresh_trending_scores(db: Session, now: datetime | None = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    half_life = settings.TRENDING_HALF_LIFE_HOURS
+
+    scores: dict = defaultdict(float)
+    for character_id, age_hours, count in db.execute(trending_events(now, since, db.get_bind().dialect.name)):
+        # Events are weighted as if made in the middle of their hour.
+        scores[character_id] += count * 0.5 ** ((max(age_hours, 0) + 0.5) / half_life)
+
+    db.execute(
+        update(characters)
+        .where(characters.c.trending_score != 0)
+        .values(trending_score=0, updated_at=characters.c.updated_at)
+    )
+    if scores:
+        db.execute(
+            update(characters)
+            .where(characters.c.id == bindparam("character_id"))
+            .values(trending_score=bindparam("score"), updated_at=characters.c.updated_at),
+            [{"character_id": character_id, "score": score} for character_id, score in scores.items()],
+        )
+    db.commit()
+    return len(scores)
+
+
+def run_refresh() -> None:
+    db = SessionLocal()
+    try:
+        updated = refresh_trending_scores(db)
+        logger.info("trending scores refreshed for %d characters", updated)
+    except Exception:
+        db.rollback()
+        logger.exception("trending score refresh failed")
+    finally:
+        db.close()
+
+
+async def trending_refresh_loop() -> None:
+    interval = settings.TRENDING_REFRESH_INTERVAL_SECONDS
+    while True:
+        await asyncio.to_thread(run_refresh)
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        print(f"popularity_score backfilled for {recompute_popularity_scores(session)} characters")
+        print(f"trending_score set for {refresh_trending_scores(session)} characters")
+    finally:
+        session.close()
@@ -0,0 +1,107 @@
+"""Compiled character system prompts.
+
+A character's system prompt is assembled from ``system_prompt``, its profile
+fields, ``personality_tags`` and the personality templates, then counted once.
+The result is cached under the character id together with a hash of those
+inputs, and an entry is only used while the hash still matches, so an edited
+row never gets a stale prompt in any worker, however close together the edits
+are; ``invalidate_character_prompt`` also drops the entry eagerly.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass
+
+from app.config import settings
+from app.models.character import Character
+from app.services.cache_service import LRUCache
+from app.utils.tokens import count_tokens
+
+DEFAULT_SYSTEM_PROMPT = "你是一个友善的 AI 伙伴。"
+
+GENDER_LABELS = {"male": "男", "female": "女", "other": "其他"}
+RELATIONSHIP_LABELS = {"girlfriend": "女朋友", "boyfriend": "男朋友", "friend": "朋友"}
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    text: str
+    token_count: int
+    # Hash of the inputs the prompt was compiled from.
+    version: str | None
+
+
+prompt_cache = LRUCache(maxsize=settings.PROMPT_CACHE_MAXSIZE)
+
+_templates: dict[str, str] | None = None
+
+
+def _personality_templates() -> dict[str, str]:
+    global _templates
+    if _templates is None:
+        # Imported lazily: the characters router imports this module.
+        from app.api.characters import PERSONALITY_TEMPLATES
+
+        _templates = {t.name: t.personality_text for t in PERSONALITY_TEMPLATES}
+    return _templates
+
+
+def compile_system_prompt(character: Character) -> str:
+    sections = [character.system_prompt.strip() if character.system_prompt else f"你是{character.name}。"]
+
+    profile = [f"- 名字：{character.name}"]
+    if character.gender in GENDER_LABELS:
+        profile.append(f"- 性别：{GENDER_LABELS[character.gender]}")
+    if character.relationship_type in RELATIONSHIP_LABELS:
+        profile.append(f"- 你和用户的关系：{RELATIONSHIP_LABELS[character.relationship_type]}")
+    if character.description:
+        profile.append(f"- 简介：{character.description}")
+    if character.tags:
+        profile.append(f"- 标签：{'、'.join(character.tags)}")
+    sections.append("【角色设定】\n" + "\n".join(profile))
+
+    if character.personality:
+        sections.append(f"【性格】\n{character.personality}")
+
+    tags = dict(character.personality_tags or {})
+    template = _personality_templates().get(tags.pop("template", None) or "")
+    if template:
+        sections.append(f"【性格模板】\n{template}")
+    if tags:
+        traits = "\n".join(f"- {key}：{value}" for key, value in tags.items())
+        sections.append(f"【性格特征】\n{traits}")
+
+    if character.backstory:
+        sections.append(f"【背景故事】\n{character.backstory}")
+
+    return "\n\n".join(sections)
+
+
+def _prompt_version(character: Character) -> str:
+    inputs = [
+        character.system_prompt, character.name, character.gender, character.relationship_type,
+        character.description, character.tags, character.personality, character.personality_tags,
+        character.backstory,
+    ]
+    raw = json.dumps(inputs, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_system_prompt(character: Character | None) -> CompiledPrompt:
+    if character is None:
+        return CompiledPrompt(DEFAULT_SYSTEM_PROMPT, count_tokens(DEFAULT_SYSTEM_PROMPT), None)
+
+    version = _prompt_version(character)
+    cached = prompt_cache.get(character.id)
+    if cached is not None and cached.version == version:
+        return cached
+
+    text = compile_system_prompt(character)
+    compiled = CompiledPrompt(text, count_tokens(text), version)
+    prompt_cache.set(character.id, compiled)
+    return compiled
+
+
+def invalidate_character_prompt(character: Character) -> None:
+    """Drop the cached prompt for ``character`` (anything with an ``id``)."""
+    prompt_cache.delete(character.id)
@@ -1 +1,302 @@
-pass
+"""Knowledge-base document ingestion.
+
+Uploaded documents are ingested by the ``ingest_document`` task as a stream:
+app.utils.document_reader yields the text page by page, ``iter_chunks``
+splits it into ``KnowledgeBase.chunk_size`` character chunks overlapping by
+``chunk_overlap``, and every ``RAG_INGEST_BATCH_SIZE`` chunks are embedded
+together and inserted in one statement. Only the current page and batch are
+ever in memory, so a 500 MB document costs no more memory than a small one.
+
+Each batch is committed together with ``Document.chunk_count``, so progress
+is visible while a document is ``processing`` and survives a crash. Chunking
+is deterministic, so a retried or resumed ingestion re-reads the file and
+skips the first ``chunk_count`` chunks instead of embedding them again.
+``resume_ingestion`` re-enqueues documents left unfinished by a restart.
+
+Every change to a knowledge base's searchable chunks bumps
+``KnowledgeBase.generation`` (``bump_generation``) in the same transaction;
+retrieval (app.services.retrieval_service) keys its caches and index syncs
+on it.
+"""
+
+import logging
+import os
+import tempfile
+import uuid
+from contextlib import suppress
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.knowledge_base import Document, DocumentChunk, KnowledgeBase
+from app.services.embedding_service import embed_texts, pack_vector
+from app.services.lexical_index import get_lexical_store
+from app.services.storage_service import get_storage, key_for_url
+from app.services.task_service import report_progress, task
+from app.services.vector_store import get_vector_store
+from app.utils.document_reader import DocumentReadError, iter_pages
+
+logger = logging.getLogger(__name__)
+
+knowledge_bases = KnowledgeBase.__table__
+documents = Document.__table__
+chunks = DocumentChunk.__table__
+
+# Preferred chunk boundaries, best first. A chunk is cut at the last one found
+# in its second half, or hard at chunk_size when there is none.
+SEPARATORS = ("\n\n", "\n", "。", "！", "？", "；", ". ", "! ", "? ", "; ", "，", ", ", " ")
+
+UNFINISHED_STATUSES = ("pending", "processing")
+
+
+class Chunk(NamedTuple):
+    index: int
+    content: str
+    page: int | None
+
+
+def bump_generation(db: Session, knowledge_base_ids) -> None:
+    """Invalidate cached retrieval for these knowledge bases; call in the transaction that changes their chunks."""
+    knowledge_base_ids = list(set(knowledge_base_ids))
+    if knowledge_base_ids:
+        db.execute(
+            update(knowledge_bases)
+            .where(knowledge_bases.c.id.in_(knowledge_base_ids))
+            .values(generation=knowledge_bases.c.generation + 1)
+        )
+
+
+def _cut_point(window: str, chunk_size: int) -> int:
+    for separator in SEPARATORS:
+        pos = window.rfind(separator, chunk_size // 2)
+        if pos != -1:
+            return pos + len(separator)
+    return chunk_size
+
+
+def iter_chunks(pages: Iterable[tuple[int | None, str]], chunk_size: int, chunk_overlap: int) -> Iterator[Chunk]:
+    """Split a stream of ``(page, text)`` into overlapping chunks; each carries the page it starts on."""
+    overlap = max(0, min(chunk_overlap, chunk_size // 2))
+    buffer = ""
+    # (offset in buffer, page) where each page's text begins.
+    marks: list[tuple[int, int | None]] = []
+    index = 0
+
+    def page_at(offset: int) -> int | None:
+        page = None
+        for mark_offset, mark_page in marks:
+            if mark_offset > offset:
+                break
+            page = mark_page
+        return page
+
+    for page, text in pages:
+        marks.append((len(buffer), page))
+        buffer += text
+        # Advance an offset rather than slicing the buffer per chunk, so a large
+        # page is not copied once for every chunk cut from it.
+        pos = 0
+        while len(buffer) - pos > chunk_size:
+            cut = _cut_point(buffer[pos:pos + chunk_size], chunk_size)
+            content = buffer[pos:pos + cut].strip()
+            if content:
+                yield Chunk(index, content, page_at(pos))
+                index += 1
+            pos += max(cut - overlap, 1)
+        if pos:
+            buffer = buffer[pos:]
+            current = page_at(pos)
+            marks = [(0, current)] + [(offset - pos, p) for offset, p in marks if offset > pos]
+
+    content = buffer.strip()
+    if content:
+        yield Chunk(index, content, page_at(0))
+
+
+class _DocumentGone(Exception):
+    """The document was deleted or reset while it was being ingested."""
+
+
+def _write_batch(db: Session, document, batch: list[Chunk]) -> int:
+    vectors = embed_texts([chunk.content for chunk in batch], document.embedding_model)
+    done = batch[-1].index + 1
+    updated = db.execute(
+        update(documents)
+        .where(documents.c.id == document.id, documents.c.status == "processing")
+        .values(chunk_count=done)
+    ).rowcount
+    if not updated:
+        db.rollback()
+        raise _DocumentGone
+    db.execute(insert(chunks), [
+        {
+            "id": uuid.uuid4(),
+            "document_id": document.id,
+            "knowledge_base_id": document.knowledge_base_id,
+            "chunk_index": chunk.index,
+            "content": chunk.content,
+            "page": chunk.page,
+            "embedding": pack_vector(vector),
+        }
+        for chunk, vector in zip(batch, vectors)
+    ])
+    bump_generation(db, [document.knowledge_base_id])
+    # Idempotent, so a batch whose commit fails is simply written again on retry.
+    get_vector_store().upsert(document.knowledge_base_id, document.id, [chunk.index for chunk in batch], vectors)
+    db.commit()
+    report_progress(chunks=done)
+    return done
+
+
+def _fail(db: Session, document_id: uuid.UUID, error: str) -> dict:
+    db.execute(
+        update(documents)
+        .where(documents.c.id == document_id)
+        .values(status="failed", metadata_json={"error": error})
+    )
+    db.commit()
+    return {"status": "failed", "error": error}
+
+
+def ingest(db: Session, document_id: uuid.UUID) -> dict:
+    document = db.execute(
+        select(
+            documents.c.id,
+            documents.c.knowledge_base_id,
+            documents.c.file_url,
+            documents.c.file_type,
+            documents.c.chunk_count,
+            documents.c.status,
+            knowledge_bases.c.chunk_size,
+            knowledge_bases.c.chunk_overlap,
+            knowledge_bases.c.embedding_model,
+        )
+        .join(knowledge_bases, knowledge_bases.c.id == documents.c.knowledge_base_id)
+        .where(documents.c.id == document_id)
+    ).first()
+    if document is None or document.status not in UNFINISHED_STATUSES:
+        return {"status": document.status if document else "missing"}
+
+    storage = get_storage()
+    key = key_for_url(document.file_url)
+    if key is None or not storage.exists(key):
+        return _fail(db, document_id, "文件不存在")
+
+    db.execute(update(documents).where(documents.c.id == document_id).values(status="processing"))
+    # Chunks past chunk_count can only come from a batch that was never counted.
+    db.execute(
+        delete(chunks).where(chunks.c.document_id == document_id, chunks.c.chunk_index >= document.chunk_count)
+    )
+    db.commit()
+
+    done = document.chunk_count
+    fd, path = tempfile.mkstemp(prefix="document-", suffix=f".{document.file_type}")
+    os.close(fd)
+    try:
+        storage.download(key, Path(path))
+        batch: list[Chunk] = []
+        pages = iter_pages(Path(path), document.file_type)
+        for chunk in iter_chunks(pages, document.chunk_size, document.chunk_overlap):
+            if chunk.index < done:
+                continue
+            batch.append(chunk)
+            if len(batch) >= settings.RAG_INGEST_BATCH_SIZE:
+                done = _write_batch(db, document, batch)
+                batch = []
+        if batch:
+            done = _write_batch(db, document, batch)
+    except DocumentReadError as exc:
+        return _fail(db, document_id, str(exc))
+    except _DocumentGone:
+        return {"status": "cancelled"}
+    finally:
+        with suppress(FileNotFoundError):
+            os.unlink(path)
+
+    db.execute(
+        update(documents)
+        .where(documents.c.id == document_id, documents.c.status == "processing")
+        .values(status="ready", metadata_json=None)
+    )
+    db.commit()
+    return {"status": "ready", "chunks": done}
+
+
+@task("knowledge.ingest", max_retries=3, retry_backoff=5.0, priority=6)
+def ingest_document(document_id: str) -> dict:
+    db = SessionLocal()
+    try:
+        return ingest(db, uuid.UUID(document_id))
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def reset_documents(db: Session, criteria) -> list[uuid.UUID]:
+    """Drop the chunks of the matching documents and mark them for ingestion again; returns their ids."""
+    rows = db.execute(select(documents.c.id, documents.c.knowledge_base_id).where(criteria)).all()
+    document_ids = [row.id for row in rows]
+    if document_ids:
+        db.execute(delete(chunks).where(chunks.c.document_id.in_(document_ids)))
+        db.execute(
+            update(documents)
+            .where(documents.c.id.in_(document_ids))
+            .values(status="pending", chunk_count=0, metadata_json=None)
+        )
+        bump_generation(db, [row.knowledge_base_id for row in rows])
+        _delete_vectors(rows)
+    return document_ids
+
+
+def _delete_vectors(rows) -> None:
+    by_knowledge_base: dict[uuid.UUID, list[uuid.UUID]] = {}
+    for row in rows:
+        by_knowledge_base.setdefault(row.knowledge_base_id, []).append(row.id)
+    store = get_vector_store()
+    for knowledge_base_id, document_ids in by_knowledge_base.items():
+        store.delete_documents(knowledge_base_id, document_ids)
+
+
+def resume_ingestion() -> int:
+    """Enqueue ingestion for every document not yet ``ready``, e.g. after a restart."""
+    db = SessionLocal()
+    try:
+        document_ids = list(db.scalars(select(documents.c.id).where(documents.c.status.in_(UNFINISHED_STATUSES))))
+    finally:
+        db.close()
+    for document_id in document_ids:
+        ingest_document.submit(str(document_id))
+    if document_ids:
+        logger.info("resumed ingestion of %d documents", len(document_ids))
+    return len(document_ids)
+
+
+def cleanup_deleted_documents(db: Session, removed, knowledge_base_id: uuid.UUID | None = None) -> None:
+    """Drop the vectors and stored files of committed document deletions.
+
+    ``removed`` holds ``(id, knowledge_base_id, file_url)`` rows as returned by
+    the deletion service; pass ``knowledge_base_id`` when the whole knowledge
+    base was deleted. Files are shared between identical uploads, so only
+    those no remaining document points at are deleted.
+    """
+    if knowledge_base_id is not None:
+        get_vector_store().delete_knowledge_base(knowledge_base_id)
+        get_lexical_store().drop(knowledge_base_id)
+    else:
+        _delete_vectors(removed)
+
+    urls = list({row.file_url for row in removed})
+    if not urls:
+        return
+    referenced = set(db.scalars(select(documents.c.file_url).where(documents.c.file_url.in_(urls))))
+    storage = get_storage()
+    for url in urls:
+        key = key_for_url(url)
+        if key is not None and url not in referenced:
+            storage.delete(key)
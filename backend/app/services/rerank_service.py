@@ -0,0 +1,88 @@
+"""Cross-encoder reranking for knowledge-base retrieval.
+
+A cross-encoder reads the question and a chunk together, so it orders the
+fused candidates far better than either retriever, at a cost of one model
+pass per candidate. It runs locally with sentence-transformers (an optional
+dependency) and the model in ``RAG_RERANK_MODEL``; leaving that empty, or not
+installing the package, turns the stage off.
+
+The model is loaded in a background thread on first use, and candidates are
+scored in small batches against a deadline: a chat turn never waits for the
+load, and a rerank that cannot finish within its time budget is abandoned in
+favour of the fused order. Batches are not interrupted, so an abandoned rerank
+can overrun the budget by up to one batch (see ``Reranker.score``).
+"""
+
+import logging
+import threading
+import time
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 8
+
+
+class Reranker:
+    def __init__(self, model):
+        self.model = model
+
+    def score(self, query: str, texts: list[str], deadline: float) -> list[float] | None:
+        """Relevance of each text to ``query``, or ``None`` if it cannot finish by ``deadline`` (monotonic).
+
+        A batch cannot be interrupted, so a batch is only started if the
+        previous one, taking as long again, would finish in time. The deadline
+        can still be overrun by at most one batch: the first, or one slower
+        than the batch before it.
+        """
+        scores: list[float] = []
+        batch_seconds = 0.0
+        for start in range(0, len(texts), BATCH_SIZE):
+            started = time.monotonic()
+            if started + batch_seconds >= deadline:
+                return None
+            pairs = [(query, text) for text in texts[start:start + BATCH_SIZE]]
+            scores.extend(float(score) for score in self.model.predict(pairs, show_progress_bar=False))
+            finished = time.monotonic()
+            batch_seconds = finished - started
+            if finished >= deadline and start + BATCH_SIZE < len(texts):
+                return None
+        return scores
+
+
+_reranker: Reranker | None = None
+_loading = False
+_lock = threading.Lock()
+
+
+def _load(model_name: str) -> None:
+    global _reranker
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError:
+        logger.warning("sentence-transformers not installed; reranking disabled")
+        return
+    try:
+        _reranker = Reranker(CrossEncoder(model_name, device=settings.RAG_RERANK_DEVICE or None))
+        logger.info("loaded rerank model %s", model_name)
+    except Exception:
+        logger.exception("failed to load rerank model %s; reranking disabled", model_name)
+
+
+def get_reranker() -> Reranker | None:
+    """The loaded reranker, or ``None`` while it loads or when reranking is unavailable."""
+    global _loading
+    if _reranker is not None or not settings.RAG_RERANK_MODEL:
+        return _reranker
+    with _lock:
+        if not _loading:
+            _loading = True
+            threading.Thread(target=_load, args=(settings.RAG_RERANK_MODEL,), name="rerank-load", daemon=True).start()
+    return None
+
+
+def set_reranker(reranker: Reranker | None) -> None:
+    """Override the process-wide reranker, e.g. with one already loaded."""
+    global _reranker
+    _reranker = reranker
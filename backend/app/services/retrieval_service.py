@@ -0,0 +1,315 @@
+"""Knowledge-base retrieval for chat turns.
+
+``retrieve`` finds the chunks of a knowledge base that best answer a
+question. Per knowledge base (``metadata_json["retrieval"]``, see
+app.schemas.knowledge.RetrievalOptions, over the ``RAG_*`` defaults) it runs:
+
+- ``vector``: the question is embedded and searched in app.services.vector_store;
+- ``lexical``: BM25 over CJK-aware terms (app.services.lexical_index), which
+  catches names and exact facts that embeddings blur;
+- ``hybrid`` (default): both, the embedding call overlapping the BM25 search,
+  fused with weighted reciprocal rank fusion. RRF uses only ranks, so the
+  two incomparable score scales need no calibration.
+
+An optional cross-encoder stage (app.services.rerank_service) then reorders
+the fused candidates within ``rerank_budget_ms``.
+
+Results are cached per knowledge base, normalized question and top-k in
+``retrieval_cache``, tagged with ``KnowledgeBase.generation``, which every
+change to the knowledge base's chunks or retrieval options bumps; repeated
+questions skip every stage. Measure the stages offline with
+``python -m scripts.retrieval_eval``.
+"""
+
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import NamedTuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.knowledge_base import Document, DocumentChunk, KnowledgeBase
+from app.schemas.knowledge import RetrievalOptions
+from app.services.cache_service import TieredCache
+from app.services.embedding_service import EmbeddingError, embed_texts
+from app.services.lexical_index import get_lexical_store
+from app.services.rerank_service import get_reranker
+from app.services.vector_store import SearchHit, get_vector_store
+
+logger = logging.getLogger(__name__)
+
+knowledge_bases = KnowledgeBase.__table__
+documents = Document.__table__
+chunks = DocumentChunk.__table__
+
+MODES = ("hybrid", "vector", "lexical")
+
+# Embedding calls made while BM25 runs in the request thread.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+
+class RetrievedChunk(NamedTuple):
+    document_id: uuid.UUID
+    chunk_index: int
+    content: str
+    page: int | None
+    score: float
+
+
+@dataclass(frozen=True)
+class RetrievalConfig:
+    mode: str
+    top_k: int
+    candidates: int
+    rrf_k: int
+    vector_weight: float
+    lexical_weight: float
+    rerank: bool
+    rerank_candidates: int
+    rerank_budget_ms: int
+
+
+def retrieval_config(metadata_json: dict | None) -> RetrievalConfig:
+    """A knowledge base's retrieval settings: its stored options over the server defaults."""
+    defaults = RetrievalConfig(
+        mode=settings.RAG_RETRIEVAL_MODE,
+        top_k=settings.RAG_TOP_K,
+        candidates=settings.RAG_FUSION_CANDIDATES,
+        rrf_k=settings.RAG_RRF_K,
+        vector_weight=1.0,
+        lexical_weight=1.0,
+        rerank=settings.RAG_RERANK_ENABLED,
+        rerank_candidates=settings.RAG_RERANK_CANDIDATES,
+        rerank_budget_ms=settings.RAG_RERANK_BUDGET_MS,
+    )
+    stored = (metadata_json or {}).get("retrieval")
+    if not stored:
+        return defaults
+    try:
+        options = RetrievalOptions.model_validate(stored)
+    except ValueError:
+        logger.warning("ignoring invalid retrieval options %r", stored)
+        return defaults
+    return replace(defaults, **options.model_dump(exclude_none=True))
+
+
+class RetrievalCache:
+    """Retrieval results by (knowledge base, normalized query, top-k), tagged with the generation they were computed at.
+
+    An entry from an older generation is a miss, counted as ``stale``.
+    """
+
+    def __init__(self):
+        self.cache = TieredCache(
+            namespace="retrieval",
+            maxsize=settings.RETRIEVAL_CACHE_MAXSIZE,
+            ttl=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+            shared=settings.RETRIEVAL_CACHE_SHARED,
+            dumps=self._dumps,
+            loads=self._loads,
+        )
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def _dumps(entry: tuple[int, list[RetrievedChunk]]) -> str:
+        generation, results = entry
+        return json.dumps([generation, [[str(r.document_id), r.chunk_index, r.content, r.page, r.score] for r in results]])
+
+    @staticmethod
+    def _loads(raw: str) -> tuple[int, list[RetrievedChunk]]:
+        generation, results = json.loads(raw)
+        return generation, [RetrievedChunk(uuid.UUID(r[0]), *r[1:]) for r in results]
+
+    @staticmethod
+    def key(knowledge_base_id: uuid.UUID, query: str, top_k: int) -> str:
+        digest = hashlib.sha256(normalize_query(query).encode()).hexdigest()
+        return f"{knowledge_base_id.hex}:{top_k}:{digest}"
+
+    def get(self, knowledge_base_id: uuid.UUID, generation: int, query: str, top_k: int) -> list[RetrievedChunk] | None:
+        entry = self.cache.get(self.key(knowledge_base_id, query, top_k))
+        if entry is not None and entry[0] == generation:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        if entry is not None:
+            self.stale += 1
+        return None
+
+    def set(
+        self, knowledge_base_id: uuid.UUID, generation: int, query: str, top_k: int, results: list[RetrievedChunk]
+    ) -> None:
+        self.cache.set(self.key(knowledge_base_id, query, top_k), (generation, results))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            **self.cache.stats(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / total if total else 0.0,
+            "stale_rate": self.stale / self.misses if self.misses else 0.0,
+        }
+
+
+retrieval_cache = RetrievalCache()
+
+_QUERY_EDGE_PUNCTUATION = " \t\n,.!?;:'\"，。！？；：、…“”‘’～~"
+
+
+def normalize_query(query: str) -> str:
+    """Fold the differences that do not change what is asked: width, case, spacing, edge punctuation."""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    return " ".join(query.split()).strip(_QUERY_EDGE_PUNCTUATION)
+
+
+def fuse(rankings: list[tuple[list[SearchHit], float]], rrf_k: int) -> list[SearchHit]:
+    """Weighted reciprocal rank fusion: each chunk scores the sum of ``weight / (rrf_k + rank)``."""
+    scores: dict[tuple[uuid.UUID, int], float] = {}
+    for hits, weight in rankings:
+        for rank, hit in enumerate(hits, 1):
+            key = (hit.document_id, hit.chunk_index)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [SearchHit(document_id, chunk_index, score) for (document_id, chunk_index), score in ranked]
+
+
+class _Stopwatch:
+    """Adds stage durations in seconds to ``timings`` when one is given."""
+
+    def __init__(self, timings: dict | None):
+        self.timings = timings
+        self.started = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        if self.timings is not None:
+            self.timings[stage] = self.timings.get(stage, 0.0) + now - self.started
+        self.started = now
+
+
+def _embed(query: str, model: str, timings: dict | None) -> list[float]:
+    watch = _Stopwatch(timings)
+    vector = embed_texts([query], model)[0]
+    watch.lap("embed")
+    return vector
+
+
+def retrieve(
+    db: Session,
+    knowledge_base_id: uuid.UUID,
+    query: str,
+    top_k: int | None = None,
+    *,
+    config: RetrievalConfig | None = None,
+    use_cache: bool = True,
+    timings: dict | None = None,
+) -> list[RetrievedChunk]:
+    """The ``top_k`` chunks of a knowledge base that best answer ``query``, best first.
+
+    ``config`` overrides the knowledge base's own settings; ``timings``
+    receives the seconds spent in each stage.
+    """
+    knowledge_base = db.execute(
+        select(knowledge_bases.c.embedding_model, knowledge_bases.c.generation, knowledge_bases.c.metadata_json)
+        .where(knowledge_bases.c.id == knowledge_base_id)
+    ).first()
+    if knowledge_base is None or not normalize_query(query):
+        return []
+    config = config or retrieval_config(knowledge_base.metadata_json)
+    top_k = top_k or config.top_k
+    use_cache = use_cache and settings.RETRIEVAL_CACHE_ENABLED
+    if use_cache:
+        cached = retrieval_cache.get(knowledge_base_id, knowledge_base.generation, query, top_k)
+        if cached is not None:
+            return cached
+
+    watch = _Stopwatch(timings)
+    generation = knowledge_base.generation
+    depth = max(config.candidates, top_k)
+    embedding = None
+    if config.mode != "lexical":
+        embedding = _executor.submit(_embed, query, knowledge_base.embedding_model, timings)
+
+    rankings: list[tuple[list[SearchHit], float]] = []
+    try:
+        if config.mode != "vector":
+            rankings.append((get_lexical_store().search(db, knowledge_base_id, query, depth, generation), config.lexical_weight))
+            watch.lap("lexical")
+        if embedding is not None:
+            vector = embedding.result()
+            watch.lap("embed_wait")
+            rankings.append((get_vector_store().search(db, knowledge_base_id, vector, depth, generation), config.vector_weight))
+            watch.lap("vector")
+    finally:
+        if embedding is not None and not embedding.done():
+            embedding.cancel()
+
+    hits = rankings[0][0] if len(rankings) == 1 else fuse(rankings, config.rrf_k)
+    watch.lap("fusion")
+    rerank_depth = max(config.rerank_candidates, top_k) if config.rerank else top_k
+    results = _load_chunks(db, hits[:rerank_depth])
+    watch.lap("load")
+    if config.rerank and len(results) > 1:
+        results = _rerank(query, results, config.rerank_budget_ms, timings)
+        watch.lap("rerank")
+    results = results[:top_k]
+
+    if use_cache:
+        retrieval_cache.set(knowledge_base_id, generation, query, top_k, results)
+    return results
+
+
+def _rerank(query: str, results: list[RetrievedChunk], budget_ms: int, timings: dict | None) -> list[RetrievedChunk]:
+    reranker = get_reranker()
+    scores = None
+    if reranker is not None:
+        scores = reranker.score(query, [chunk.content for chunk in results], time.monotonic() + budget_ms / 1000)
+    if scores is None:
+        # Unavailable or over budget: keep the fused order.
+        if timings is not None:
+            timings["rerank_skipped"] = timings.get("rerank_skipped", 0) + 1
+        return results
+    ranked = sorted(zip(scores, results), key=lambda pair: pair[0], reverse=True)
+    return [chunk._replace(score=score) for score, chunk in ranked]
+
+
+def _load_chunks(db: Session, hits: list[SearchHit]) -> list[RetrievedChunk]:
+    if not hits:
+        return []
+    rows = db.execute(
+        select(chunks.c.document_id, chunks.c.chunk_index, chunks.c.content, chunks.c.page)
+        .join(documents, documents.c.id == chunks.c.document_id)
+        .where(
+            or_(*(and_(chunks.c.document_id == hit.document_id, chunks.c.chunk_index == hit.chunk_index) for hit in hits)),
+            documents.c.status != "deleting",
+        )
+    )
+    found = {(row.document_id, row.chunk_index): row for row in rows}
+    return [
+        RetrievedChunk(hit.document_id, hit.chunk_index, row.content, row.page, hit.score)
+        for hit in hits
+        if (row := found.get((hit.document_id, hit.chunk_index))) is not None
+    ]
+
+
+def retrieve_for_chat(knowledge_base_id: uuid.UUID, query: str) -> list[str]:
+    """Chunk texts for a chat turn; empty when retrieval fails, so the chat goes on without them."""
+    db = SessionLocal()
+    try:
+        return [chunk.content for chunk in retrieve(db, knowledge_base_id, query)]
+    except EmbeddingError:
+        logger.warning("knowledge retrieval failed for knowledge base %s", knowledge_base_id, exc_info=True)
+        return []
+    finally:
+        db.close()
@@ -0,0 +1,230 @@
+"""Character search.
+
+Text is tokenized here rather than by the database: Latin words are kept as
+lowercased words, CJK runs are split into overlapping bigrams (plus unigrams
+when indexing, so one-character queries still match). The terms are stored in
+``CharacterSearchDocument``, which ``index_character`` refreshes on every
+character write.
+
+Matching and relevance come from a pluggable backend chosen by
+``SEARCH_BACKEND`` (``auto`` picks one for the database dialect):
+
+- ``fts``: SQLite FTS5 with ``bm25`` ranking, name weighted over body;
+- ``postgres``: a GIN-indexed weighted tsvector with ``ts_rank_cd``;
+- ``like``: ``ILIKE`` on the source columns, for databases without either.
+
+The backend returns at most ``SEARCH_MAX_RESULTS`` candidates. They are then
+re-ranked by ``relevance * (1 + SEARCH_POPULARITY_WEIGHT * ln(1 + popularity))``
+and paged with a ``(score, id)`` keyset cursor.
+"""
+
+import math
+import re
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+from fastapi import HTTPException
+from sqlalchemy import column, func, literal, literal_column, or_, table, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.character import SEARCH_PG_VECTOR, Character, CharacterSearchDocument
+from app.utils.pagination import decode_cursor, encode_cursor
+
+# Kana, CJK unified ideographs (+ extension A), Hangul, compatibility ideographs.
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TERM_RE = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+
+NAME_WEIGHT = 5.0
+BODY_WEIGHT = 1.0
+
+character_search_fts = table("character_search_fts", column("rowid"))
+
+
+def _terms(value: str | None, unigrams: bool) -> list[str]:
+    terms: list[str] = []
+    for run in _TERM_RE.findall(value or ""):
+        if not _CJK_RE.match(run):
+            terms.append(run.lower())
+            continue
+        if unigrams or len(run) == 1:
+            terms.extend(run)
+        terms.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def index_terms(value: str | None) -> str:
+    return " ".join(_terms(value, unigrams=True))
+
+
+def query_terms(q: str) -> list[str]:
+    return list(dict.fromkeys(_terms(q, unigrams=False)))
+
+
+def index_character(db: Session, character: Character) -> None:
+    """Refresh ``character``'s search document (call before committing a write)."""
+    if character.id is None:
+        db.flush()
+    name_terms = index_terms(character.name)
+    body_terms = index_terms(" ".join([character.description or "", *(character.tags or [])]))
+
+    document = (
+        db.query(CharacterSearchDocument)
+        .filter(CharacterSearchDocument.character_id == character.id)
+        .first()
+    )
+    if document is None:
+        db.add(CharacterSearchDocument(character_id=character.id, name_terms=name_terms, body_terms=body_terms))
+    elif (document.name_terms, document.body_terms) != (name_terms, body_terms):
+        document.name_terms = name_terms
+        document.body_terms = body_terms
+
+
+def remove_character(db: Session, character_id: uuid.UUID) -> None:
+    db.query(CharacterSearchDocument).filter(
+        CharacterSearchDocument.character_id == character_id
+    ).delete(synchronize_session=False)
+
+
+class SearchBackend(ABC):
+    """Finds characters matching ``q`` among those passing ``criteria``.
+
+    ``candidates`` returns ``(character_id, relevance, popularity_score)``
+    tuples, most relevant first, with higher relevance meaning a better match.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def candidates(self, db: Session, q: str, criteria: list, limit: int) -> list[tuple]:
+        ...
+
+
+class FTS5Backend(SearchBackend):
+    name = "fts"
+
+    def candidates(self, db, q, criteria, limit):
+        terms = query_terms(q)
+        if not terms:
+            return []
+        # Quote every term; Latin terms also match as prefixes while typing.
+        match = " ".join(
+            f'"{t}"' if _CJK_RE.match(t) else f'"{t}"*' for t in (t.replace('"', '""') for t in terms)
+        )
+        fts = literal_column("character_search_fts")
+        rank = func.bm25(fts, NAME_WEIGHT, BODY_WEIGHT)
+        rows = (
+            db.query(CharacterSearchDocument.character_id, rank, Character.popularity_score)
+            .select_from(character_search_fts)
+            .join(CharacterSearchDocument, CharacterSearchDocument.id == character_search_fts.c.rowid)
+            .join(Character, Character.id == CharacterSearchDocument.character_id)
+            .filter(fts.op("MATCH")(match), *criteria)
+            .order_by(rank)
+            .limit(limit)
+            .all()
+        )
+        # bm25() is lower-is-better.
+        return [(character_id, -score, popularity) for character_id, score, popularity in rows]
+
+
+class PostgresBackend(SearchBackend):
+    name = "postgres"
+
+    def candidates(self, db, q, criteria, limit):
+        terms = query_terms(q)
+        if not terms:
+            return []
+        tsquery = func.to_tsquery(
+            "simple",
+            " & ".join("'" + t.replace("'", "''") + "'" + ("" if _CJK_RE.match(t) else ":*") for t in terms),
+        )
+        vector = text(SEARCH_PG_VECTOR)
+        rank = func.ts_rank_cd(vector, tsquery)
+        return (
+            db.query(CharacterSearchDocument.character_id, rank, Character.popularity_score)
+            .join(Character, Character.id == CharacterSearchDocument.character_id)
+            .filter(vector.op("@@")(tsquery), *criteria)
+            .order_by(rank.desc())
+            .limit(limit)
+            .all()
+        )
+
+
+class LikeBackend(SearchBackend):
+    name = "like"
+
+    def candidates(self, db, q, criteria, limit):
+        pattern = f"%{q}%"
+        return (
+            db.query(Character.id, literal(1.0), Character.popularity_score)
+            .filter(or_(Character.name.ilike(pattern), Character.description.ilike(pattern)), *criteria)
+            .order_by(Character.popularity_score.desc(), Character.id.desc())
+            .limit(limit)
+            .all()
+        )
+
+
+BACKENDS: dict[str, SearchBackend] = {b.name: b for b in (FTS5Backend(), PostgresBackend(), LikeBackend())}
+DIALECT_BACKENDS = {"sqlite": "fts", "postgresql": "postgres"}
+
+
+def get_backend(db: Session) -> SearchBackend:
+    name = settings.SEARCH_BACKEND
+    if name == "auto":
+        name = DIALECT_BACKENDS.get(db.get_bind().dialect.name, "like")
+    return BACKENDS[name]
+
+
+@dataclass
+class SearchPage:
+    items: list[Character]
+    total: int
+    next_cursor: str | None
+
+
+def search_characters(
+    db: Session,
+    q: str,
+    criteria: list,
+    scope: str,
+    page_size: int,
+    cursor: str | None = None,
+    page: int = 1,
+) -> SearchPage:
+    """One page of characters matching ``q`` and ``criteria``, best first.
+
+    ``total`` counts the ranked candidates, so it is capped at
+    ``SEARCH_MAX_RESULTS``.
+    """
+    weight = settings.SEARCH_POPULARITY_WEIGHT
+    ranked = sorted(
+        (
+            (relevance * (1 + weight * math.log1p(max(popularity or 0.0, 0.0))), character_id)
+            for character_id, relevance, popularity in get_backend(db).candidates(
+                db, q, criteria, settings.SEARCH_MAX_RESULTS
+            )
+        ),
+        key=lambda item: (item[0], item[1].hex),
+        reverse=True,
+    )
+    total = len(ranked)
+
+    if cursor:
+        score, last_id = decode_cursor(cursor, scope, 2)
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not isinstance(last_id, uuid.UUID):
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+        after = (score, last_id.hex)
+        ranked = [item for item in ranked if (item[0], item[1].hex) < after]
+    else:
+        ranked = ranked[(page - 1) * page_size :]
+
+    next_cursor = None
+    if len(ranked) > page_size:
+        ranked = ranked[:page_size]
+        next_cursor = encode_cursor(scope, list(ranked[-1]))
+
+    ids = [character_id for _, character_id in ranked]
+    by_id = {c.id: c for c in db.query(Character).filter(Character.id.in_(ids))} if ids else {}
+    return SearchPage(items=[by_id[i] for i in ids if i in by_id], total=total, next_cursor=next_cursor)
@@ -1 +1,329 @@
-pass
+"""Object storage for uploaded files.
+
+Everything that stores user files goes through ``get_storage()`` instead of
+writing under ``uploads/`` directly, so the API can run on more than one
+node. Backends (``STORAGE_BACKEND``):
+
+- ``local`` (default): a directory (``STORAGE_LOCAL_ROOT``, by default
+  ``backend/uploads``) served by the ``/uploads`` static mount. Keys under a
+  ``PRIVATE_PREFIXES`` directory (client uploads in ``incoming/``) are kept
+  in a sibling directory outside it (``STORAGE_LOCAL_PRIVATE_ROOT``) and
+  read through signed ``/api/storage/objects/...`` URLs;
+- ``minio``: an S3-compatible bucket (``MINIO_*``). Objects are read from
+  ``STORAGE_PUBLIC_URL`` (a CDN or public bucket URL) or through presigned
+  GET URLs, so clients fetch bytes from storage rather than through the API.
+
+Keys are ``/``-separated paths such as ``avatars/ab/abcdef....png``.
+``store_content`` names objects by the SHA-256 of their bytes, so uploading
+the same file twice stores it once. Such objects can be shared by several
+rows; delete them only once nothing references them.
+
+Clients can also upload directly: ``presigned_put_url`` returns a URL that
+accepts one ``PUT`` of the object (MinIO's own presigned URL, or a signed
+``/api/storage/objects/...`` URL handled by app.api.storage for ``local``).
+Only the local URL enforces ``STORAGE_MAX_UPLOAD_BYTES``; a MinIO URL accepts
+a body of any size, so whatever consumes an uploaded key checks ``size()``.
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import suppress
+from datetime import timedelta
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterator, NamedTuple
+from urllib.parse import quote
+
+from fastapi import HTTPException
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_LOCAL_ROOT = Path(__file__).resolve().parent.parent.parent / "uploads"
+LOCAL_URL_PREFIX = "/uploads/"
+LOCAL_OBJECT_PATH = "/api/storage/objects/"
+INCOMING_PREFIX = "incoming"
+# Top-level directories the local backend keeps out of the static mount.
+PRIVATE_PREFIXES = (INCOMING_PREFIX,)
+
+
+class StoredObject(NamedTuple):
+    key: str
+    size: int
+    sha256: str
+    # True when identical content was already stored and nothing was uploaded.
+    deduplicated: bool
+
+
+def validate_key(key: str) -> str:
+    path = PurePosixPath(key)
+    if not key or path.is_absolute() or ".." in path.parts or key != str(path):
+        raise ValueError(f"invalid storage key {key!r}")
+    return key
+
+
+class LocalStorage:
+    def __init__(self, root: Path, private_root: Path, url_prefix: str = LOCAL_URL_PREFIX):
+        self.root = root
+        self.private_root = private_root
+        self.url_prefix = url_prefix
+
+    def _root(self, key: str) -> Path:
+        return self.private_root if is_private(key) else self.root
+
+    def _path(self, key: str) -> Path:
+        return self._root(key) / validate_key(key)
+
+    def file_path(self, key: str) -> Path:
+        """Where the object lives on disk (it may not exist)."""
+        return self._path(key)
+
+    def put(self, key: str, source: BinaryIO, size: int = -1, content_type: str | None = None) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(source, out, CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+
+    def put_path(self, key: str, path: Path, content_type: str | None = None) -> None:
+        with open(path, "rb") as source:
+            self.put(key, source, path.stat().st_size, content_type)
+
+    def download(self, key: str, path: Path) -> None:
+        shutil.copyfile(self._path(key), path)
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+    def size(self, key: str) -> int | None:
+        """The object's size in bytes, or ``None`` if it does not exist."""
+        path = self._path(key)
+        with suppress(FileNotFoundError):
+            if path.is_file():
+                return path.stat().st_size
+        return None
+
+    def delete(self, key: str) -> None:
+        with suppress(FileNotFoundError):
+            self._path(key).unlink()
+
+    def list(self, prefix: str) -> Iterator[tuple[str, float]]:
+        """``(key, modified timestamp)`` for every object under the ``prefix`` directory."""
+        base = self._path(prefix)
+        if not base.is_dir():
+            return
+        for path in base.rglob("*"):
+            if path.is_file() and not path.name.startswith("."):
+                with suppress(FileNotFoundError):
+                    yield path.relative_to(self._root(prefix)).as_posix(), path.stat().st_mtime
+
+    def public_url(self, key: str) -> str:
+        return self.url_prefix + quote(validate_key(key))
+
+    def presigned_get_url(self, key: str, expires: int | None = None) -> str:
+        if not is_private(key):
+            # The static mount serves these objects; there is nothing to sign.
+            return self.public_url(key)
+        return _signed_local_url("GET", key, expires)
+
+    def presigned_put_url(self, key: str, content_type: str | None = None, expires: int | None = None) -> str:
+        return _signed_local_url("PUT", key, expires)
+
+
+class MinioStorage:
+    def __init__(self):
+        from minio import Minio
+
+        self.client = Minio(
+            settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=settings.MINIO_SECURE,
+        )
+        self.bucket = settings.MINIO_BUCKET
+        if not self.client.bucket_exists(self.bucket):
+            self.client.make_bucket(self.bucket)
+
+    def put(self, key: str, source: BinaryIO, size: int = -1, content_type: str | None = None) -> None:
+        # With an unknown size the SDK streams a multipart upload, part_size at a time.
+        self.client.put_object(
+            self.bucket,
+            validate_key(key),
+            source,
+            length=size,
+            content_type=content_type or "application/octet-stream",
+            part_size=settings.STORAGE_PART_SIZE if size < 0 else 0,
+        )
+
+    def put_path(self, key: str, path: Path, content_type: str | None = None) -> None:
+        self.client.fput_object(
+            self.bucket,
+            validate_key(key),
+            str(path),
+            content_type=content_type or "application/octet-stream",
+            part_size=settings.STORAGE_PART_SIZE,
+        )
+
+    def download(self, key: str, path: Path) -> None:
+        self.client.fget_object(self.bucket, validate_key(key), str(path))
+
+    def exists(self, key: str) -> bool:
+        return self.size(key) is not None
+
+    def size(self, key: str) -> int | None:
+        from minio.error import S3Error
+
+        try:
+            return self.client.stat_object(self.bucket, validate_key(key)).size
+        except S3Error as exc:
+            if exc.code in ("NoSuchKey", "NoSuchObject"):
+                return None
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.remove_object(self.bucket, validate_key(key))
+
+    def list(self, prefix: str) -> Iterator[tuple[str, float]]:
+        for obj in self.client.list_objects(self.bucket, prefix=f"{validate_key(prefix)}/", recursive=True):
+            yield obj.object_name, obj.last_modified.timestamp()
+
+    def public_url(self, key: str) -> str:
+        if settings.STORAGE_PUBLIC_URL:
+            return f"{settings.STORAGE_PUBLIC_URL.rstrip('/')}/{quote(validate_key(key))}"
+        scheme = "https" if settings.MINIO_SECURE else "http"
+        return f"{scheme}://{settings.MINIO_ENDPOINT}/{self.bucket}/{quote(validate_key(key))}"
+
+    def presigned_get_url(self, key: str, expires: int | None = None) -> str:
+        return self.client.presigned_get_object(
+            self.bucket,
+            validate_key(key),
+            expires=timedelta(seconds=expires or settings.STORAGE_PRESIGN_EXPIRE_SECONDS),
+        )
+
+    def presigned_put_url(self, key: str, content_type: str | None = None, expires: int | None = None) -> str:
+        return self.client.presigned_put_object(
+            self.bucket,
+            validate_key(key),
+            expires=timedelta(seconds=expires or settings.STORAGE_PRESIGN_EXPIRE_SECONDS),
+        )
+
+
+def is_private(key: str) -> bool:
+    return key.split("/", 1)[0] in PRIVATE_PREFIXES
+
+
+def sign_local(method: str, key: str, expires_at: int) -> str:
+    message = f"{method}\n{key}\n{expires_at}".encode()
+    return hmac.new(settings.JWT_SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_local(method: str, key: str, expires_at: int, signature: str) -> bool:
+    if expires_at < time.time():
+        return False
+    return hmac.compare_digest(sign_local(method, key, expires_at), signature)
+
+
+def _signed_local_url(method: str, key: str, expires: int | None) -> str:
+    expires_at = int(time.time()) + (expires or settings.STORAGE_PRESIGN_EXPIRE_SECONDS)
+    signature = sign_local(method, validate_key(key), expires_at)
+    return f"{LOCAL_OBJECT_PATH}{quote(key)}?expires={expires_at}&signature={signature}"
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if settings.STORAGE_BACKEND == "minio":
+                    _storage = MinioStorage()
+                else:
+                    root = Path(settings.STORAGE_LOCAL_ROOT or DEFAULT_LOCAL_ROOT)
+                    private_root = Path(settings.STORAGE_LOCAL_PRIVATE_ROOT or f"{root}-private")
+                    _storage = LocalStorage(root, private_root)
+    return _storage
+
+
+def key_for_url(url: str | None) -> str | None:
+    """The storage key behind a URL produced by ``public_url``, or ``None`` for foreign URLs."""
+    if not url:
+        return None
+    storage = get_storage()
+    prefix = storage.public_url("_")[:-1]
+    if not url.startswith(prefix):
+        return None
+    try:
+        return validate_key(url[len(prefix):])
+    except ValueError:
+        return None
+
+
+def spool(source: BinaryIO, max_size: int | None = None, head: bytes = b"") -> tuple[Path, int, str]:
+    """Copy ``source`` to a temporary file while hashing it.
+
+    Returns ``(path, size, sha256 hex)``; the caller removes the file. Raises
+    413 as soon as more than ``max_size`` bytes have been read.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(prefix="upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            chunk = head or source.read(CHUNK_SIZE)
+            while chunk:
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise HTTPException(status_code=413, detail=f"文件大小不能超过{max_size // (1024 * 1024)}MB")
+                digest.update(chunk)
+                out.write(chunk)
+                chunk = source.read(CHUNK_SIZE)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+    return Path(tmp_path), size, digest.hexdigest()
+
+
+def content_key(prefix: str, sha256: str, ext: str = "") -> str:
+    return f"{prefix}/{sha256[:2]}/{sha256}{ext}"
+
+
+def store_content(
+    source: BinaryIO,
+    prefix: str,
+    ext: str = "",
+    content_type: str | None = None,
+    max_size: int | None = None,
+    head: bytes = b"",
+) -> StoredObject:
+    """Store ``source`` under a key derived from its SHA-256, skipping the upload if it exists.
+
+    ``head`` is data already read from ``source`` (e.g. to sniff the format).
+    """
+    path, size, sha256 = spool(source, max_size, head)
+    try:
+        key = content_key(prefix, sha256, ext)
+        storage = get_storage()
+        if storage.exists(key):
+            return StoredObject(key, size, sha256, True)
+        storage.put_path(key, path, content_type)
+        return StoredObject(key, size, sha256, False)
+    finally:
+        with suppress(FileNotFoundError):
+            path.unlink()
@@ -0,0 +1,148 @@
+"""Normalized tag index for the explore catalogue.
+
+``Character.tags`` keeps the tags exactly as the creator entered them;
+``character_tags`` mirrors them so explore can find a tag's characters through
+an index, and ``Tag.character_count`` holds how many published, public
+characters carry each tag, so the tag cloud is a top-k read.
+
+Call ``sync_character_tags`` before committing any change to a character's
+tags or visibility, and ``remove_character_tags`` before deleting one. Counts
+are adjusted with relative UPDATEs, so concurrent writers do not lose
+increments. ``rebuild_tag_index`` re-derives everything from
+``Character.tags``::
+
+    python -m app.services.tag_service
+"""
+
+import uuid
+from collections import Counter
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.character import Character, CharacterTag, Tag
+
+MAX_TAG_LENGTH = 50
+
+
+def normalize_tag(tag: str | None) -> str:
+    return (tag or "").strip()[:MAX_TAG_LENGTH]
+
+
+def normalize_tags(tags: list[str] | None) -> list[str]:
+    names: list[str] = []
+    for tag in tags or []:
+        name = normalize_tag(tag)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def is_listed(character: Character) -> bool:
+    return character.status == "published" and bool(character.is_public)
+
+
+def _get_or_create_tags(db: Session, names: list[str]) -> dict[str, uuid.UUID]:
+    if not names:
+        return {}
+    ids = dict(db.query(Tag.name, Tag.id).filter(Tag.name.in_(names)).all())
+    for name in names:
+        if name in ids:
+            continue
+        tag = Tag(name=name)
+        try:
+            with db.begin_nested():
+                db.add(tag)
+            ids[name] = tag.id
+        except IntegrityError:
+            # Created concurrently by another request.
+            ids[name] = db.query(Tag.id).filter(Tag.name == name).scalar()
+    return ids
+
+
+def _apply_count_deltas(db: Session, deltas: Counter) -> None:
+    for tag_id, delta in deltas.items():
+        if delta:
+            db.query(Tag).filter(Tag.id == tag_id).update(
+                {Tag.character_count: Tag.character_count + delta}, synchronize_session=False
+            )
+
+
+def sync_character_tags(db: Session, character: Character) -> None:
+    """Bring ``character_tags`` and the tag counts in line with ``character``."""
+    if character.id is None:
+        db.flush()
+
+    listed = is_listed(character)
+    wanted = set(_get_or_create_tags(db, normalize_tags(character.tags)).values())
+    current = {
+        row.tag_id: row
+        for row in db.query(CharacterTag).filter(CharacterTag.character_id == character.id)
+    }
+
+    deltas: Counter = Counter()
+    for tag_id, row in current.items():
+        if tag_id not in wanted:
+            if row.listed:
+                deltas[tag_id] -= 1
+            db.delete(row)
+        elif row.listed != listed:
+            deltas[tag_id] += 1 if listed else -1
+            row.listed = listed
+    for tag_id in wanted - current.keys():
+        db.add(CharacterTag(character_id=character.id, tag_id=tag_id, listed=listed))
+        if listed:
+            deltas[tag_id] += 1
+
+    _apply_count_deltas(db, deltas)
+
+
+def remove_character_tags(db: Session, character_id: uuid.UUID) -> None:
+    rows = db.query(CharacterTag.tag_id, CharacterTag.listed).filter(CharacterTag.character_id == character_id).all()
+    _apply_count_deltas(db, Counter({tag_id: -1 for tag_id, listed in rows if listed}))
+    db.query(CharacterTag).filter(CharacterTag.character_id == character_id).delete(synchronize_session=False)
+
+
+def rebuild_tag_index(db: Session) -> int:
+    db.query(CharacterTag).delete(synchronize_session=False)
+
+    rows = []
+    names: set[str] = set()
+    characters = db.query(Character.id, Character.tags, Character.status, Character.is_public).yield_per(500)
+    for character_id, tags, status, is_public in characters:
+        tag_names = normalize_tags(tags)
+        if tag_names:
+            rows.append((character_id, tag_names, status == "published" and bool(is_public)))
+            names.update(tag_names)
+
+    ids = _get_or_create_tags(db, sorted(names))
+    db.bulk_insert_mappings(
+        CharacterTag,
+        [
+            {"character_id": character_id, "tag_id": ids[name], "listed": listed}
+            for character_id, tag_names, listed in rows
+            for name in tag_names
+        ],
+    )
+
+    db.query(Tag).update({Tag.character_count: 0}, synchronize_session=False)
+    counts = (
+        db.query(CharacterTag.tag_id, func.count())
+        .filter(CharacterTag.listed.is_(True))
+        .group_by(CharacterTag.tag_id)
+        .all()
+    )
+    for tag_id, count in counts:
+        db.query(Tag).filter(Tag.id == tag_id).update({Tag.character_count: count}, synchronize_session=False)
+    db.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    session = SessionLocal()
+    try:
+        print(f"tag index rebuilt for {rebuild_tag_index(session)} characters")
+    finally:
+        session.close()
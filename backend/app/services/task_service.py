@@ -0,0 +1,271 @@
+"""Background task queue.
+
+Slow work is registered with ``@task`` and enqueued from the request path
+with ``Task.submit``, which records the task as ``pending`` and returns its
+id straight away; ``GET /api/tasks/{id}`` (app.api.tasks) reports status,
+progress and the result.
+
+Backends (``TASK_BACKEND``):
+
+- ``local`` (default): a priority queue served by ``TASK_WORKERS`` threads in
+  this process. Queued tasks are lost on restart, so it is meant for
+  development, tests and single-process deployments.
+- ``celery``: tasks are sent to Celery over ``CELERY_BROKER_URL`` (defaults to
+  ``REDIS_URL``) and run by
+  ``celery -A app.services.task_service:celery_app worker``.
+
+Task state is kept in ``task_states``, a TieredCache that is Redis-backed
+with ``TASK_STATE_SHARED`` (always under Celery) so any process can report
+on any task; shared state skips the local tier, since workers update it. Arguments and results must be JSON-serializable.
+
+Priorities run from 0 (most urgent) to 9. A task that raises is retried up
+to ``max_retries`` times, waiting ``retry_backoff * 2 ** attempt`` seconds
+between attempts.
+"""
+
+import contextvars
+import importlib
+import itertools
+import json
+import logging
+import queue
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+from app.config import settings
+from app.services.cache_service import TieredCache
+
+logger = logging.getLogger(__name__)
+
+# Modules that define tasks; imported on demand so a Celery worker (which only
+# imports this module) knows every task name.
+TASK_MODULES = ["app.services.avatar_service", "app.services.deletion_service", "app.services.rag_service"]
+
+DEFAULT_PRIORITY = 5
+
+
+def _state_cache(shared: bool) -> TieredCache:
+    # Shared state is written by other processes (workers), so a local copy
+    # would keep answering with whatever this process saw last: read Redis.
+    return TieredCache(
+        namespace="task",
+        maxsize=10000,
+        ttl=settings.TASK_STATE_TTL_SECONDS,
+        local_ttl=0 if shared else None,
+        shared=shared,
+        dumps=json.dumps,
+        loads=json.loads,
+    )
+
+
+task_states = _state_cache(settings.TASK_STATE_SHARED or settings.TASK_BACKEND == "celery")
+
+_registry: dict[str, "Task"] = {}
+_current_task_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_task_id", default=None)
+
+
+@dataclass
+class Task:
+    name: str
+    func: Callable
+    max_retries: int = 0
+    retry_backoff: float = 1.0
+    priority: int = DEFAULT_PRIORITY
+
+    def submit(self, *args, priority: int | None = None, owner_id: uuid.UUID | None = None, **kwargs) -> str:
+        """Enqueue a run of this task and return its id without waiting for it."""
+        task_id = uuid.uuid4().hex
+        task_states.set(task_id, {
+            "id": task_id,
+            "name": self.name,
+            "status": "pending",
+            "owner_id": str(owner_id) if owner_id else None,
+            "attempts": 0,
+            "progress": {},
+            "result": None,
+            "error": None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+        get_backend().submit(task_id, self.name, list(args), kwargs, self.priority if priority is None else priority)
+        return task_id
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+
+def task(name: str, max_retries: int = 0, retry_backoff: float = 1.0, priority: int = DEFAULT_PRIORITY):
+    """Register a function as a background task under ``name``."""
+
+    def register(func: Callable) -> Task:
+        registered = Task(name, func, max_retries, retry_backoff, priority)
+        _registry[name] = registered
+        return registered
+
+    return register
+
+
+def _lookup(name: str) -> Task:
+    if name not in _registry:
+        for module in TASK_MODULES:
+            importlib.import_module(module)
+    return _registry[name]
+
+
+def get_status(task_id: str) -> dict | None:
+    return task_states.get(task_id)
+
+
+def _update(task_id: str, **fields) -> None:
+    state = task_states.get(task_id)
+    if state is None:
+        return
+    state.update(fields)
+    task_states.set(task_id, state)
+
+
+def report_progress(**fields) -> None:
+    """Merge ``fields`` into the running task's ``progress``; a no-op outside a task."""
+    task_id = _current_task_id.get()
+    if task_id is None:
+        return
+    state = task_states.get(task_id)
+    if state is not None:
+        state["progress"] = {**state.get("progress", {}), **fields}
+        task_states.set(task_id, state)
+
+
+def _execute(task_id: str, name: str, args: list, kwargs: dict, attempt: int) -> float | None:
+    """Run one attempt; returns the delay before a retry, or ``None`` when finished."""
+    registered = _lookup(name)
+    _update(task_id, status="running", attempts=attempt + 1)
+    token = _current_task_id.set(task_id)
+    try:
+        result = registered.func(*args, **kwargs)
+    except Exception as exc:
+        if attempt < registered.max_retries:
+            delay = registered.retry_backoff * 2 ** attempt
+            logger.warning("task %s (%s) failed, retrying in %.1fs", name, task_id, delay, exc_info=True)
+            _update(task_id, status="retrying", error=str(exc))
+            return delay
+        logger.exception("task %s (%s) failed", name, task_id)
+        _update(task_id, status="failed", error=str(exc))
+        return None
+    finally:
+        _current_task_id.reset(token)
+    _update(task_id, status="succeeded", result=result, error=None)
+    return None
+
+
+class LocalTaskBackend:
+    """Priority queue served by worker threads in this process."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"task-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, task_id: str, name: str, args: list, kwargs: dict, priority: int, attempt: int = 0) -> None:
+        self._start()
+        self._queue.put((priority, next(self._order), (task_id, name, args, kwargs, attempt)))
+
+    def _work(self) -> None:
+        while True:
+            priority, _, item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                task_id, name, args, kwargs, attempt = item
+                delay = _execute(task_id, name, args, kwargs, attempt)
+                if delay is not None:
+                    timer = threading.Timer(
+                        delay, self.submit, (task_id, name, args, kwargs, priority), {"attempt": attempt + 1}
+                    )
+                    timer.daemon = True
+                    timer.start()
+            except Exception:
+                logger.exception("task worker error")
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the workers once the tasks already queued have run."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            # Sorts after every real priority, so queued work drains first.
+            self._queue.put((10, next(self._order), None))
+        for thread in threads:
+            thread.join(timeout)
+
+
+class CeleryTaskBackend:
+    def __init__(self, app):
+        self.app = app
+
+    def submit(self, task_id: str, name: str, args: list, kwargs: dict, priority: int) -> None:
+        self.app.send_task(RUN_TASK_NAME, args=[task_id, name, args, kwargs], priority=priority)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        pass
+
+
+RUN_TASK_NAME = "app.services.task_service.run"
+
+
+def _create_celery_app():
+    from celery import Celery
+
+    app = Celery("ai_character", broker=settings.CELERY_BROKER_URL or settings.REDIS_URL)
+    app.conf.update(
+        task_serializer="json",
+        accept_content=["json"],
+        task_ignore_result=True,
+        task_acks_late=True,
+        worker_prefetch_multiplier=1,
+        task_default_priority=DEFAULT_PRIORITY,
+        # Redis emulates priorities with one list per level; 0 is served first.
+        broker_transport_options={"priority_steps": list(range(10)), "queue_order_strategy": "priority"},
+    )
+
+    @app.task(name=RUN_TASK_NAME, bind=True)
+    def run(self, task_id: str, name: str, args: list, kwargs: dict):
+        delay = _execute(task_id, name, args, kwargs, self.request.retries)
+        if delay is not None:
+            raise self.retry(countdown=delay, max_retries=None)
+
+    return app
+
+
+celery_app = _create_celery_app() if settings.TASK_BACKEND == "celery" else None
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if celery_app is not None:
+                    _backend = CeleryTaskBackend(celery_app)
+                else:
+                    _backend = LocalTaskBackend(settings.TASK_WORKERS)
+    return _backend
+
+
+def shutdown() -> None:
+    if _backend is not None:
+        _backend.shutdown()
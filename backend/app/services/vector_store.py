@@ -0,0 +1,408 @@
+"""Vector search over knowledge-base chunks.
+
+Every chat turn for a character with a knowledge base runs one search here,
+so it has to be fast and must not need the network when none is configured.
+Backends (``VECTOR_BACKEND``):
+
+- ``embedded`` (default): an in-process index per knowledge base built from
+  ``document_chunks``. Up to ``VECTOR_HNSW_THRESHOLD`` chunks it is an exact
+  NumPy matrix scan (a few ms at that size); above it an approximate HNSW
+  graph (hnswlib, shipped with chromadb) keeps queries sub-millisecond into
+  the millions. Indexes are loaded on first use, at most
+  ``VECTOR_INDEX_MAX_KNOWLEDGE_BASES`` at a time.
+- ``chroma``: one Chroma collection per knowledge base on
+  ``CHROMA_HOST:CHROMA_PORT``, shared by every process.
+
+``document_chunks`` stays the source of truth. The embedded index re-syncs
+with it when ``KnowledgeBase.generation`` differs from the one it last
+synced at, by comparing every document's ``chunk_count`` and first chunk id
+with what it has loaded; that works across processes and loads only what
+changed. The
+Chroma backend is written through instead (``upsert`` / ``delete_documents``).
+
+Scores are cosine similarities (vectors are L2-normalized on the way in).
+Benchmark recall and latency with ``python -m scripts.vector_bench``.
+"""
+
+import logging
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, NamedTuple
+
+import numpy as np
+from sqlalchemy import Select, and_, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.knowledge_base import Document, DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+documents = Document.__table__
+chunks = DocumentChunk.__table__
+
+LOAD_BATCH_SIZE = 2000
+
+
+class SearchHit(NamedTuple):
+    document_id: uuid.UUID
+    chunk_index: int
+    score: float
+
+
+def _hnswlib():
+    try:
+        import hnswlib
+    except ImportError:
+        return None
+    return hnswlib
+
+
+class VectorIndex:
+    """Append-only vectors with deletion marks, searched exactly or through HNSW.
+
+    Labels are row numbers. Not thread-safe; callers hold a lock.
+    """
+
+    def __init__(self, dimension: int, hnsw_threshold: int | None = None):
+        self.dimension = dimension
+        self.hnsw_threshold = settings.VECTOR_HNSW_THRESHOLD if hnsw_threshold is None else hnsw_threshold
+        self.vectors = np.empty((0, dimension), dtype=np.float32)
+        self.alive = np.empty(0, dtype=bool)
+        self.size = 0
+        self.deleted = 0
+        self.hnsw = None
+
+    def __len__(self) -> int:
+        return self.size - self.deleted
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """Append ``vectors`` (n x dimension); returns their labels."""
+        count = len(vectors)
+        if self.size + count > len(self.vectors):
+            capacity = max(self.size + count, len(self.vectors) * 2, 1024)
+            grown = np.empty((capacity, self.dimension), dtype=np.float32)
+            grown[:self.size] = self.vectors[:self.size]
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:self.size] = self.alive[:self.size]
+            self.vectors, self.alive = grown, alive
+        labels = np.arange(self.size, self.size + count)
+        self.vectors[labels] = vectors
+        self.alive[labels] = True
+        self.size += count
+        if self.hnsw is not None:
+            if self.size > self.hnsw.get_max_elements():
+                self.hnsw.resize_index(max(self.size, self.hnsw.get_max_elements() * 2))
+            self.hnsw.add_items(vectors, labels)
+        elif len(self) >= self.hnsw_threshold:
+            self._build_hnsw()
+        return labels
+
+    def remove(self, labels: np.ndarray) -> None:
+        labels = labels[self.alive[labels]]
+        self.alive[labels] = False
+        self.deleted += len(labels)
+        if self.hnsw is not None:
+            for label in labels:
+                self.hnsw.mark_deleted(int(label))
+
+    def _build_hnsw(self) -> None:
+        hnswlib = _hnswlib()
+        if hnswlib is None:
+            logger.warning("hnswlib not installed; searching %d vectors exactly", len(self))
+            self.hnsw_threshold = float("inf")
+            return
+        labels = np.flatnonzero(self.alive[:self.size])
+        index = hnswlib.Index(space="ip", dim=self.dimension)
+        index.init_index(
+            max_elements=max(self.size, 1024),
+            ef_construction=settings.VECTOR_HNSW_EF_CONSTRUCTION,
+            M=settings.VECTOR_HNSW_M,
+        )
+        index.add_items(self.vectors[labels], labels)
+        self.hnsw = index
+
+    def search(self, query: np.ndarray, top_k: int) -> list[tuple[int, float]]:
+        """``(label, cosine similarity)`` of the ``top_k`` nearest live vectors, best first."""
+        top_k = min(top_k, len(self))
+        if top_k <= 0:
+            return []
+        if self.hnsw is not None:
+            self.hnsw.set_ef(max(settings.VECTOR_HNSW_EF_SEARCH, top_k))
+            try:
+                labels, distances = self.hnsw.knn_query(query, k=top_k)
+            except RuntimeError:
+                # Raised when too few live neighbours are reachable; fall back to the exact scan.
+                logger.warning("HNSW search failed, scanning %d vectors", len(self), exc_info=True)
+            else:
+                # "ip" distance is 1 - inner product.
+                return [(int(label), 1.0 - float(distance)) for label, distance in zip(labels[0], distances[0])]
+        scores = self.vectors[:self.size] @ query
+        scores[~self.alive[:self.size]] = -np.inf
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        best = candidates[np.argsort(-scores[candidates])]
+        return [(int(label), float(scores[label])) for label in best]
+
+
+class _DocumentState(NamedTuple):
+    chunk_count: int
+    first_chunk_id: uuid.UUID | None
+    # Label ranges holding the document's vectors.
+    labels: list[range]
+
+
+class _KnowledgeBaseIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.generation: int | None = None
+        self.index = None
+        self.documents: dict[uuid.UUID, _DocumentState] = {}
+        # Label -> (document, chunk index), kept as two int arrays rather than
+        # millions of tuples.
+        self.slots: list[uuid.UUID] = []
+        self.label_slot = array("i")
+        self.label_chunk = array("i")
+
+    def key(self, label: int) -> tuple[uuid.UUID, int]:
+        return self.slots[self.label_slot[label]], self.label_chunk[label]
+
+
+def document_states(knowledge_base_id: uuid.UUID) -> Select:
+    """Each live document's chunk count and first chunk id, which change whenever it is re-chunked."""
+    first_chunk = chunks.alias("first_chunk")
+    return (
+        select(documents.c.id, documents.c.chunk_count, first_chunk.c.id.label("first_chunk_id"))
+        .outerjoin(first_chunk, and_(first_chunk.c.document_id == documents.c.id, first_chunk.c.chunk_index == 0))
+        .where(documents.c.knowledge_base_id == knowledge_base_id, documents.c.status != "deleting")
+    )
+
+
+def _as_array(vector) -> np.ndarray:
+    return np.asarray(vector, dtype=np.float32)
+
+
+class ChunkIndexes(ABC):
+    """In-process indexes over one ``document_chunks`` column, one per knowledge base.
+
+    Subclasses say which column to load and how to index it (``column``,
+    ``_prepare``, ``_add``); an index needs ``add(items) -> labels``,
+    ``remove(labels)``, ``deleted`` and ``len()``. At most
+    ``max_knowledge_bases`` indexes are kept, least recently used dropped.
+    """
+
+    column = None
+
+    def __init__(self, max_knowledge_bases: int):
+        self.max_knowledge_bases = max_knowledge_bases
+        self._indexes: OrderedDict[uuid.UUID, _KnowledgeBaseIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _prepare(self, kb_index: _KnowledgeBaseIndex, value):
+        """The item to index for a loaded column value, or ``None`` to skip it; may create ``kb_index.index``."""
+
+    def _add(self, index, items: list) -> np.ndarray:
+        return index.add(items)
+
+    def _get(self, knowledge_base_id: uuid.UUID) -> _KnowledgeBaseIndex:
+        with self._lock:
+            kb_index = self._indexes.get(knowledge_base_id)
+            if kb_index is None:
+                kb_index = self._indexes[knowledge_base_id] = _KnowledgeBaseIndex()
+                while len(self._indexes) > self.max_knowledge_bases:
+                    self._indexes.popitem(last=False)
+            else:
+                self._indexes.move_to_end(knowledge_base_id)
+            return kb_index
+
+    def drop(self, knowledge_base_id: uuid.UUID) -> None:
+        with self._lock:
+            self._indexes.pop(knowledge_base_id, None)
+
+    @contextmanager
+    def synced(self, db: Session, knowledge_base_id: uuid.UUID, generation: int | None) -> Iterator[_KnowledgeBaseIndex]:
+        """Hold the knowledge base's index, brought up to date with ``generation`` (``None``: always re-check)."""
+        kb_index = self._get(knowledge_base_id)
+        with kb_index.lock:
+            if generation is None or generation != kb_index.generation:
+                self._sync(db, knowledge_base_id, kb_index)
+                # A reset inside _sync clears it, so set it afterwards.
+                kb_index.generation = generation
+            yield kb_index
+
+    def _sync(self, db: Session, knowledge_base_id: uuid.UUID, kb_index: _KnowledgeBaseIndex) -> None:
+        current = {row.id: row for row in db.execute(document_states(knowledge_base_id))}
+
+        for document_id, state in list(kb_index.documents.items()):
+            row = current.get(document_id)
+            if row is None or row.first_chunk_id != state.first_chunk_id or row.chunk_count < state.chunk_count:
+                # Deleted or re-chunked: drop its rows and load it again.
+                for labels in state.labels:
+                    kb_index.index.remove(np.arange(labels.start, labels.stop))
+                del kb_index.documents[document_id]
+        if kb_index.index is not None and kb_index.index.deleted > len(kb_index.index):
+            # Mostly dead rows: rebuilding is cheaper than carrying them.
+            kb_index.reset()
+
+        for document_id, row in current.items():
+            state = kb_index.documents.get(document_id)
+            loaded = state.chunk_count if state else 0
+            if row.chunk_count > loaded:
+                labels = self._load(db, kb_index, document_id, loaded, row.chunk_count)
+                kb_index.documents[document_id] = _DocumentState(
+                    row.chunk_count, row.first_chunk_id, (state.labels if state else []) + labels
+                )
+
+    def _load(self, db: Session, kb_index: _KnowledgeBaseIndex, document_id: uuid.UUID, start: int, stop: int):
+        slot = len(kb_index.slots)
+        kb_index.slots.append(document_id)
+        loaded: list[range] = []
+        batch_indexes: list[int] = []
+        batch_items: list = []
+
+        def flush():
+            labels = self._add(kb_index.index, batch_items)
+            loaded.append(range(int(labels[0]), int(labels[-1]) + 1))
+            kb_index.label_slot.extend([slot] * len(batch_indexes))
+            kb_index.label_chunk.extend(batch_indexes)
+            batch_indexes.clear()
+            batch_items.clear()
+
+        rows = db.execute(
+            select(chunks.c.chunk_index, self.column)
+            .where(chunks.c.document_id == document_id, chunks.c.chunk_index >= start, chunks.c.chunk_index < stop)
+            .order_by(chunks.c.chunk_index)
+            .execution_options(yield_per=LOAD_BATCH_SIZE)
+        )
+        for chunk_index, value in rows:
+            item = self._prepare(kb_index, value) if value is not None else None
+            if item is None:
+                continue
+            batch_indexes.append(chunk_index)
+            batch_items.append(item)
+            if len(batch_items) >= LOAD_BATCH_SIZE:
+                flush()
+        if batch_items:
+            flush()
+        return loaded
+
+
+class VectorStore(ABC):
+    def upsert(self, knowledge_base_id: uuid.UUID, document_id: uuid.UUID, chunk_indexes: list[int], vectors) -> None:
+        pass
+
+    def delete_documents(self, knowledge_base_id: uuid.UUID, document_ids: list[uuid.UUID]) -> None:
+        pass
+
+    def delete_knowledge_base(self, knowledge_base_id: uuid.UUID) -> None:
+        pass
+
+    @abstractmethod
+    def search(
+        self, db: Session, knowledge_base_id: uuid.UUID, vector, top_k: int, generation: int | None = None
+    ) -> list[SearchHit]:
+        """``generation`` is the knowledge base's current one, or ``None`` if unknown."""
+
+
+class EmbeddedVectorStore(ChunkIndexes, VectorStore):
+    column = chunks.c.embedding
+
+    def _prepare(self, kb_index, value):
+        vector = np.frombuffer(value, dtype=np.float32)
+        if kb_index.index is None:
+            kb_index.index = VectorIndex(len(vector))
+        if len(vector) != kb_index.index.dimension:
+            logger.warning("skipping a chunk embedding with dimension %d", len(vector))
+            return None
+        return vector
+
+    def _add(self, index, items):
+        return index.add(np.stack(items))
+
+    def delete_knowledge_base(self, knowledge_base_id):
+        self.drop(knowledge_base_id)
+
+    def search(self, db, knowledge_base_id, vector, top_k, generation=None) -> list[SearchHit]:
+        query = _as_array(vector)
+        with self.synced(db, knowledge_base_id, generation) as kb_index:
+            if kb_index.index is None or len(query) != kb_index.index.dimension:
+                return []
+            results = kb_index.index.search(query, top_k)
+            return [SearchHit(*kb_index.key(label), score) for label, score in results]
+
+
+class ChromaVectorStore(VectorStore):
+    def __init__(self, host: str, port: int, collection_prefix: str):
+        import chromadb
+
+        self.client = chromadb.HttpClient(host=host, port=port)
+        self.collection_prefix = collection_prefix
+
+    def _collection(self, knowledge_base_id: uuid.UUID):
+        return self.client.get_or_create_collection(
+            f"{self.collection_prefix}{knowledge_base_id.hex}", metadata={"hnsw:space": "cosine"}
+        )
+
+    def upsert(self, knowledge_base_id, document_id, chunk_indexes, vectors) -> None:
+        # Keyed by position rather than chunk row id, so a retried batch overwrites itself.
+        self._collection(knowledge_base_id).upsert(
+            ids=[f"{document_id}:{index}" for index in chunk_indexes],
+            embeddings=[list(map(float, vector)) for vector in vectors],
+            metadatas=[{"document_id": str(document_id), "chunk_index": index} for index in chunk_indexes],
+        )
+
+    def delete_documents(self, knowledge_base_id, document_ids) -> None:
+        if document_ids:
+            self._collection(knowledge_base_id).delete(
+                where={"document_id": {"$in": [str(document_id) for document_id in document_ids]}}
+            )
+
+    def delete_knowledge_base(self, knowledge_base_id) -> None:
+        try:
+            self.client.delete_collection(f"{self.collection_prefix}{knowledge_base_id.hex}")
+        except ValueError:
+            pass
+
+    def search(self, db, knowledge_base_id, vector, top_k, generation=None) -> list[SearchHit]:
+        collection = self._collection(knowledge_base_id)
+        result = collection.query(
+            query_embeddings=[list(map(float, vector))],
+            n_results=top_k,
+            include=["metadatas", "distances"],
+        )
+        return [
+            # Cosine distance is 1 - similarity.
+            SearchHit(uuid.UUID(metadata["document_id"]), int(metadata["chunk_index"]), 1.0 - distance)
+            for metadata, distance in zip(result["metadatas"][0], result["distances"][0])
+        ]
+
+
+_store: VectorStore | None = None
+_store_lock = threading.Lock()
+
+
+def _create_store() -> VectorStore:
+    if settings.VECTOR_BACKEND == "chroma":
+        return ChromaVectorStore(settings.CHROMA_HOST, settings.CHROMA_PORT, settings.CHROMA_COLLECTION_PREFIX)
+    if settings.VECTOR_BACKEND == "embedded":
+        return EmbeddedVectorStore(settings.VECTOR_INDEX_MAX_KNOWLEDGE_BASES)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {settings.VECTOR_BACKEND}")
+
+
+def get_vector_store() -> VectorStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _create_store()
+    return _store
@@ -0,0 +1,113 @@
+"""Streaming text extraction for knowledge-base documents.
+
+``iter_pages`` yields ``(page number or None, text)`` pieces in document order
+without ever holding the whole document: PDFs page by page, DOCX paragraph by
+paragraph from its XML, and plain text / Markdown in fixed-size blocks. The
+output for a given file is deterministic, which ingestion relies on to resume
+a half-processed document.
+
+PDF support needs pypdf; DOCX and text formats need nothing beyond the
+standard library.
+"""
+
+import codecs
+import zipfile
+from pathlib import Path
+from typing import Iterator
+from xml.etree.ElementTree import iterparse
+
+TEXT_BLOCK_CHARS = 64 * 1024
+SUPPORTED_TYPES = {"pdf", "txt", "md", "docx"}
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class DocumentReadError(Exception):
+    """The file cannot be read as the declared type; retrying will not help."""
+
+
+def file_type_for(filename: str) -> str | None:
+    ext = Path(filename).suffix.lower().lstrip(".")
+    if ext == "markdown":
+        ext = "md"
+    return ext if ext in SUPPORTED_TYPES else None
+
+
+def _detect_encoding(path: Path) -> str:
+    with open(path, "rb") as f:
+        head = f.read(TEXT_BLOCK_CHARS)
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # Incremental so a multi-byte character cut off by the block end is not an error.
+        codecs.getincrementaldecoder("utf-8")().decode(head)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "gb18030"
+
+
+def _iter_text(path: Path) -> Iterator[tuple[int | None, str]]:
+    with open(path, encoding=_detect_encoding(path), errors="replace", newline="") as f:
+        while block := f.read(TEXT_BLOCK_CHARS):
+            yield None, block
+
+
+def _iter_docx(path: Path) -> Iterator[tuple[int | None, str]]:
+    try:
+        archive = zipfile.ZipFile(path)
+        source = archive.open("word/document.xml")
+    except (zipfile.BadZipFile, KeyError) as exc:
+        raise DocumentReadError(f"not a DOCX file: {exc}") from exc
+    with archive, source:
+        parts: list[str] = []
+        body = None
+        for event, elem in iterparse(source, events=("start", "end")):
+            if event == "start":
+                if elem.tag == f"{_W}body":
+                    body = elem
+                continue
+            if elem.tag == f"{_W}t" and elem.text:
+                parts.append(elem.text)
+            elif elem.tag == f"{_W}tab":
+                parts.append("\t")
+            elif elem.tag in (f"{_W}br", f"{_W}cr"):
+                parts.append("\n")
+            elif elem.tag == f"{_W}p":
+                parts.append("\n")
+                yield None, "".join(parts)
+                parts = []
+                # Drop what has been parsed so memory does not grow with the document.
+                elem.clear()
+                if body is not None:
+                    body.clear()
+        if parts:
+            yield None, "".join(parts)
+
+
+def _iter_pdf(path: Path) -> Iterator[tuple[int | None, str]]:
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PdfReadError
+    except ImportError as exc:
+        raise DocumentReadError("PDF support requires pypdf") from exc
+
+    try:
+        reader = PdfReader(path)
+        page_count = len(reader.pages)
+    except PdfReadError as exc:
+        raise DocumentReadError(f"not a PDF file: {exc}") from exc
+    for number in range(page_count):
+        # Pages are parsed on access, so only the current one is decoded at a time.
+        yield number + 1, (reader.pages[number].extract_text() or "") + "\n"
+
+
+def iter_pages(path: Path, file_type: str) -> Iterator[tuple[int | None, str]]:
+    if file_type == "pdf":
+        return _iter_pdf(path)
+    if file_type == "docx":
+        return _iter_docx(path)
+    if file_type in ("txt", "md"):
+        return _iter_text(path)
+    raise DocumentReadError(f"unsupported file type {file_type!r}")
@@ -0,0 +1,165 @@
+"""Keyset (cursor) pagination helpers.
+
+A page is addressed by the sort tuple of the last row on the previous page,
+e.g. ``(like_count + chat_count, created_at, id)``, so fetching page N costs
+the same as fetching page 1. Cursors are opaque base64 strings that carry a
+``scope`` naming the sort they were issued for; a cursor from one sort mode is
+rejected by another.
+
+Pages are ordered descending on every key, and the last key must be unique
+(normally the primary key) so the order is total.
+
+On SQLite, timestamps are stored as text and ``CURRENT_TIMESTAMP`` defaults
+have no fractional part, while SQLAlchemy binds datetimes with microseconds;
+``sql_value`` renders cursor datetimes in the stored format so equality and
+ordering comparisons line up.
+"""
+
+import base64
+import json
+import math
+import uuid
+from datetime import datetime
+from typing import Any, Callable
+
+from fastapi import HTTPException
+from sqlalchemy import Select, and_, func, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query
+
+from app.config import settings
+from app.services.cache_service import LRUCache
+
+SortKey = tuple[Any, Callable[[Any], Any]]
+
+count_cache = LRUCache(maxsize=2048, ttl=settings.PAGINATION_COUNT_CACHE_TTL_SECONDS)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"d": value.isoformat()}
+    if isinstance(value, uuid.UUID):
+        return {"u": value.hex}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "d" in value:
+            return datetime.fromisoformat(value["d"])
+        if "u" in value:
+            return uuid.UUID(value["u"])
+    return value
+
+
+def encode_cursor(scope: str, values: list) -> str:
+    raw = json.dumps({"s": scope, "v": [_encode_value(v) for v in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, scope: str, size: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_decode_value(v) for v in payload["v"]]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    if payload.get("s") != scope or len(values) != size:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    return values
+
+
+def sql_value(value, dialect_name: str):
+    if dialect_name == "sqlite" and isinstance(value, datetime):
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if value.microsecond else "%Y-%m-%d %H:%M:%S"
+        return literal(value.replace(tzinfo=None).strftime(fmt))
+    return value
+
+
+def keyset_after(keys: list[SortKey], values: list, dialect_name: str = "", descending: bool = True):
+    """Rows strictly after ``values`` in ``keys`` order (descending by default)."""
+    values = [sql_value(v, dialect_name) for v in values]
+    clauses = []
+    for i, (expr, _) in enumerate(keys):
+        equal_prefix = [keys[j][0] == values[j] for j in range(i)]
+        beyond = expr < values[i] if descending else expr > values[i]
+        clauses.append(and_(*equal_prefix, beyond))
+    return or_(*clauses)
+
+
+def dialect_of(query: Query) -> str:
+    return query.session.get_bind().dialect.name
+
+
+def _page_statement(query, keys, scope, page_size, cursor, page, dialect_name):
+    # Works on both ``Query`` and 2.0-style ``Select`` (which also has ``filter``).
+    if cursor:
+        values = decode_cursor(cursor, scope, len(keys))
+        query = query.filter(keyset_after(keys, values, dialect_name))
+    query = query.order_by(*[expr.desc() for expr, _ in keys])
+    if not cursor and page > 1:
+        query = query.offset((page - 1) * page_size)
+    return query.limit(page_size + 1)
+
+
+def _split_page(rows: list, keys: list[SortKey], scope: str, page_size: int) -> tuple[list, str | None]:
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(scope, [getter(last) for _, getter in keys])
+
+
+def paginate(
+    query: Query,
+    keys: list[SortKey],
+    scope: str,
+    page_size: int,
+    cursor: str | None = None,
+    page: int = 1,
+) -> tuple[list, str | None]:
+    """Return one page of ``query`` and the cursor for the next page.
+
+    With ``cursor`` the page is located by keyset; without one, ``page`` falls
+    back to OFFSET so existing page-number clients keep working.
+    """
+    rows = _page_statement(query, keys, scope, page_size, cursor, page, dialect_of(query)).all()
+    return _split_page(rows, keys, scope, page_size)
+
+
+async def apaginate(
+    db: AsyncSession,
+    stmt: Select,
+    keys: list[SortKey],
+    scope: str,
+    page_size: int,
+    cursor: str | None = None,
+    page: int = 1,
+) -> tuple[list, str | None]:
+    """``paginate`` for a ``select()`` of one entity on an ``AsyncSession``."""
+    stmt = _page_statement(stmt, keys, scope, page_size, cursor, page, db.bind.dialect.name)
+    rows = list((await db.scalars(stmt)).all())
+    return _split_page(rows, keys, scope, page_size)
+
+
+def cached_count(key: str, query: Query) -> int:
+    """``query.count()`` served from a short-lived cache; totals may lag by the TTL."""
+    total = count_cache.get(key)
+    if total is None:
+        total = query.order_by(None).count()
+        count_cache.set(key, total)
+    return total
+
+
+async def acached_count(db: AsyncSession, key: str, stmt: Select) -> int:
+    total = count_cache.get(key)
+    if total is None:
+        total = await db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery()))
+        count_cache.set(key, total)
+    return total
+
+
+def page_count(total: int | None, page_size: int) -> int | None:
+    if total is None:
+        return None
+    return math.ceil(total / page_size) if total > 0 else 1
@@ -0,0 +1,49 @@
+"""Token counting for prompt budgeting.
+
+Uses ``tiktoken`` when it is installed. Otherwise falls back to an estimate
+that treats each CJK character as one token and other text as ~4 characters
+per token, which is close enough for budgeting Chinese-heavy chats.
+"""
+
+import math
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+# Fixed per-message cost of the chat format (role, separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+if tiktoken is not None:
+    try:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception:  # pragma: no cover - encoding files unavailable offline
+        _encoding = None
+
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        0x4E00 <= code <= 0x9FFF
+        or 0x3400 <= code <= 0x4DBF
+        or 0x3040 <= code <= 0x30FF
+        or 0xAC00 <= code <= 0xD7AF
+        or 0xF900 <= code <= 0xFAFF
+        or 0x3000 <= code <= 0x303F
+        or 0xFF00 <= code <= 0xFFEF
+    )
+
+
+def count_tokens(text: str | None) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def count_message_tokens(content: str | None) -> int:
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
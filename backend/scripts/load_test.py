@@ -0,0 +1,170 @@
+"""Load test: latency of the async and sync request paths under many connections.
+
+The explore and chat routers run on ``AsyncSession``; the other routers are
+sync ``def`` routes that hold a threadpool slot for their whole DB round
+trip. This serves the real app plus a sync copy of the explore list route
+(the pre-port implementation, on ``Session``) and drives both with the same
+number of concurrent keep-alive connections::
+
+    DATABASE_URL=sqlite:////tmp/load_test.db alembic upgrade head
+    DATABASE_URL=sqlite:////tmp/load_test.db python -m scripts.load_test --connections 500
+
+and reports, per path, p50/p99/max latency, throughput and errors. The
+server is started with uvicorn in a subprocess; pass ``--url`` to drive one
+already running elsewhere (``uvicorn --factory scripts.load_test:create_app``),
+which gives cleaner numbers than sharing a machine with the client.
+Missing published characters, up to ``--characters``, are seeded first.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+import numpy as np
+from fastapi import Depends, FastAPI, Query
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.api.explore import POPULAR_KEYS, PUBLISHED_CRITERIA, _list_response
+from app.database import SessionLocal, get_read_db
+from app.models.character import Character
+from app.models.user import User
+from app.utils.pagination import cached_count, paginate
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PATHS = {
+    "async": "/api/explore?page_size=12",
+    "sync": "/api/explore/_sync?page_size=12",
+}
+
+
+def explore_sync(page_size: int = Query(12, ge=1, le=50), db: Session = Depends(get_read_db)):
+    query = db.query(Character).filter(*PUBLISHED_CRITERIA)
+    items, next_cursor = paginate(query, POPULAR_KEYS, "explore:popular", page_size)
+    total = cached_count("explore", query)
+    return _list_response(items, total, 1, page_size, next_cursor)
+
+
+def create_app() -> FastAPI:
+    """The app with the sync comparison route added (a uvicorn factory)."""
+    from app.main import app
+
+    app.add_api_route("/api/explore/_sync", explore_sync, methods=["GET"])
+    return app
+
+
+def seed(count: int) -> None:
+    with SessionLocal() as db:
+        existing = db.scalar(select(func.count()).select_from(Character).where(*PUBLISHED_CRITERIA))
+        if existing >= count:
+            return
+        creator_id = uuid.uuid4()
+        db.execute(insert(User.__table__), {
+            "id": creator_id, "username": f"load_{creator_id.hex[:8]}",
+            "email": f"load_{creator_id.hex[:8]}@example.com", "password_hash": "!",
+        })
+        db.execute(insert(Character.__table__), [
+            {
+                "name": f"角色{n}", "description": "压测角色", "creator_id": creator_id,
+                "status": "published", "is_public": True, "popularity_score": float(n % 97),
+            }
+            for n in range(count - existing)
+        ])
+        db.commit()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "--factory", "scripts.load_test:create_app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--backlog", "4096",
+        ],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health").status_code == 200:
+                return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("server did not start")
+
+
+async def drive(url: str, connections: int, total: int) -> tuple[list[float], int, float]:
+    """``total`` GETs of ``url`` over ``connections`` concurrent connections."""
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                errors += not ok
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(connections)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000, help="requests per path")
+    parser.add_argument("--paths", default="async,sync", help="comma-separated: " + ",".join(PATHS))
+    parser.add_argument("--characters", type=int, default=1000, help="published characters to seed")
+    parser.add_argument("--url", help="base URL of a running server; otherwise one is started")
+    args = parser.parse_args(argv)
+
+    server = None
+    base = args.url
+    if base is None:
+        seed(args.characters)
+        port = _free_port()
+        server = start_server(port)
+        base = f"http://127.0.0.1:{port}"
+    try:
+        print(f"{args.connections} connections, {args.requests} requests per path")
+        for name in args.paths.split(","):
+            url = base + PATHS[name]
+            asyncio.run(drive(url, min(args.connections, 50), 200))
+            latencies, errors, elapsed = asyncio.run(drive(url, args.connections, args.requests))
+            p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+            print(
+                f"  {name:<6} p50 {p50:8.1f} ms  p99 {p99:8.1f} ms  max {max(latencies) * 1000:8.1f} ms"
+                f"  {len(latencies) / elapsed:7.1f} req/s  errors {errors}"
+            )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
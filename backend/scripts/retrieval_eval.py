@@ -0,0 +1,124 @@
+"""Offline evaluation of knowledge-base retrieval.
+
+Runs a set of questions against an ingested knowledge base in every
+retrieval mode and reports recall@k and per-stage latency, so a change to
+the retrievers, the fusion or the reranker can be judged before it ships::
+
+    python -m scripts.retrieval_eval KNOWLEDGE_BASE_ID questions.jsonl --k 4
+
+Each line of the questions file is a JSON object with a ``query`` and what a
+good answer must retrieve, either or both of:
+
+- ``answers``: strings; each counts as found when a retrieved chunk contains
+  it (case-insensitive), which needs no chunk ids and survives re-chunking;
+- ``chunks``: ``[document_id, chunk_index]`` pairs that should be retrieved.
+
+recall@k is the share of a question's answers and chunks found in its top k,
+averaged over questions. Latencies are p50/p99 per stage across questions,
+after one unmeasured pass that loads the indexes; the retrieval cache is
+bypassed. ``rerank skipped`` counts reranks abandoned (model unavailable or
+over budget).
+"""
+
+import argparse
+import json
+import sys
+import time
+import uuid
+from dataclasses import replace
+
+import numpy as np
+
+from app.database import SessionLocal
+from app.models.knowledge_base import KnowledgeBase
+from app.services.rerank_service import get_reranker
+from app.services.retrieval_service import RetrievalConfig, retrieval_config, retrieve
+
+STAGES = ("embed", "embed_wait", "lexical", "vector", "fusion", "load", "rerank", "total")
+
+
+def load_questions(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def recall(question: dict, results) -> float:
+    expected = 0
+    found = 0
+    for answer in question.get("answers", []):
+        expected += 1
+        found += any(answer.casefold() in chunk.content.casefold() for chunk in results)
+    retrieved = {(str(chunk.document_id), chunk.chunk_index) for chunk in results}
+    for document_id, chunk_index in question.get("chunks", []):
+        expected += 1
+        found += (str(uuid.UUID(document_id)), chunk_index) in retrieved
+    return found / expected if expected else 0.0
+
+
+def evaluate(db, knowledge_base_id: uuid.UUID, questions: list[dict], config: RetrievalConfig, k: int) -> dict:
+    for question in questions:
+        retrieve(db, knowledge_base_id, question["query"], k, config=config, use_cache=False)
+        db.rollback()
+
+    recalls: list[float] = []
+    stages: dict[str, list[float]] = {stage: [] for stage in STAGES}
+    skipped = 0
+    for question in questions:
+        timings: dict = {}
+        started = time.perf_counter()
+        results = retrieve(db, knowledge_base_id, question["query"], k, config=config, use_cache=False, timings=timings)
+        timings["total"] = time.perf_counter() - started
+        db.rollback()
+        recalls.append(recall(question, results))
+        skipped += timings.pop("rerank_skipped", 0)
+        for stage, seconds in timings.items():
+            stages[stage].append(seconds * 1000)
+    return {
+        "recall": float(np.mean(recalls)) if recalls else 0.0,
+        "stages": {stage: np.percentile(values, [50, 99]) for stage, values in stages.items() if values},
+        "rerank_skipped": skipped,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("knowledge_base_id", type=uuid.UUID)
+    parser.add_argument("questions", help="JSONL file of questions")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--modes", default="vector,lexical,hybrid,hybrid+rerank", help="comma-separated modes")
+    parser.add_argument("--rerank-wait", type=float, default=120, help="seconds to wait for the rerank model to load")
+    args = parser.parse_args(argv)
+
+    questions = load_questions(args.questions)
+    modes = args.modes.split(",")
+    db = SessionLocal()
+    try:
+        knowledge_base = db.get(KnowledgeBase, args.knowledge_base_id)
+        if knowledge_base is None:
+            sys.exit(f"knowledge base {args.knowledge_base_id} not found")
+        base = retrieval_config(knowledge_base.metadata_json)
+        db.rollback()
+
+        if any(mode.endswith("+rerank") for mode in modes):
+            deadline = time.monotonic() + args.rerank_wait
+            while get_reranker() is None and time.monotonic() < deadline:
+                time.sleep(0.5)
+            if get_reranker() is None:
+                print("rerank model unavailable; +rerank modes report the fused order")
+
+        print(f"{len(questions)} questions, k={args.k}")
+        for mode in modes:
+            name, _, stage = mode.partition("+")
+            config = replace(base, mode=name, rerank=stage == "rerank")
+            report = evaluate(db, args.knowledge_base_id, questions, config, args.k)
+            print(f"\n{mode}: recall@{args.k} {report['recall']:.3f}")
+            for stage_name, (p50, p99) in report["stages"].items():
+                print(f"  {stage_name:<11} p50 {p50:8.2f} ms  p99 {p99:8.2f} ms")
+            if config.rerank:
+                print(f"  rerank skipped {report['rerank_skipped']}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Benchmark character search over a synthetic catalogue.
+
+Builds a SQLite database of published characters with Chinese names and
+descriptions (migrated to head, so the FTS5 index and its triggers are the
+real ones) and reports::
+
+    python -m scripts.search_bench --size 1000000 --backends fts,like
+
+- build time and database size;
+- p50/p99 latency of a first search page (``search_service.search_characters``,
+  ranking and popularity blend included) per backend, and the average
+  number of ranked candidates;
+- p50/p99 of ``index_character`` for an edited character, i.e. the cost
+  the index adds to every character write.
+
+The catalogue is kept at ``--database`` and reused when it already holds
+``--size`` characters, so backends and settings can be compared without
+rebuilding. ``like`` scans every row; give it fewer ``--queries`` at 1M.
+"""
+
+import argparse
+import os
+import random
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.models.character import Character, CharacterSearchDocument
+from app.models.user import User
+from app.services.search_service import index_character, index_terms, search_characters
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+BATCH_SIZE = 10_000
+PAGE_SIZE = 12
+
+# Common characters, so terms have the skewed frequencies of real text.
+HANZI = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所"
+    "民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那"
+    "社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并"
+    "提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放"
+    "决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清美再采"
+    "转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需"
+    "段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何"
+    "除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听"
+    "该铁价严龙飞"
+)
+LATIN = ["ai", "anime", "cat", "knight", "magic", "idol", "detective", "vampire", "sci", "fi"]
+TAGS = ["温柔", "可爱", "傲娇", "冒险", "校园", "奇幻", "科幻", "治愈", "悬疑", "古风"]
+
+
+def _phrase(rng: random.Random, low: int, high: int) -> str:
+    return "".join(rng.choices(HANZI, k=rng.randint(low, high)))
+
+
+def _character(rng: random.Random, creator_id: uuid.UUID) -> dict:
+    description = "，".join(_phrase(rng, 4, 12) for _ in range(rng.randint(2, 6)))
+    if rng.random() < 0.2:
+        description += " " + " ".join(rng.sample(LATIN, 2))
+    return {
+        "id": uuid.uuid4(),
+        "name": _phrase(rng, 2, 4),
+        "description": description,
+        "tags": rng.sample(TAGS, rng.randint(0, 3)),
+        "status": "published",
+        "is_public": True,
+        "popularity_score": rng.expovariate(1 / 50),
+        "creator_id": creator_id,
+    }
+
+
+def build(url: str, size: int, seed: int) -> None:
+    # env.py reads the URL from settings.
+    settings.DATABASE_URL = url
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    command.upgrade(config, "head")
+    engine = create_engine(url)
+    rng = random.Random(seed)
+    with engine.begin() as conn:
+        creator_id = uuid.uuid4()
+        conn.execute(insert(User.__table__), {
+            "id": creator_id, "username": "search_bench", "email": "search_bench@example.com", "password_hash": "!",
+        })
+    for start in range(0, size, BATCH_SIZE):
+        rows = [_character(rng, creator_id) for _ in range(min(BATCH_SIZE, size - start))]
+        documents = [
+            {
+                "character_id": row["id"],
+                "name_terms": index_terms(row["name"]),
+                "body_terms": index_terms(" ".join([row["description"], *row["tags"]])),
+            }
+            for row in rows
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(Character.__table__), rows)
+            conn.execute(insert(CharacterSearchDocument.__table__), documents)
+    engine.dispose()
+
+
+def _queries(db, count: int, seed: int) -> list[str]:
+    """Two-character words and whole names taken from the catalogue, plus some Latin words."""
+    rng = random.Random(seed + 1)
+    total = db.scalar(select(func.count()).select_from(Character))
+    queries = []
+    while len(queries) < count:
+        offset = rng.randrange(total)
+        name, description = db.execute(
+            select(Character.name, Character.description).order_by(Character.id).offset(offset).limit(1)
+        ).one()
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(name)
+        elif kind < 0.9:
+            start = rng.randrange(max(len(description) - 1, 1))
+            word = description[start:start + 2]
+            if "，" not in word and " " not in word:
+                queries.append(word)
+        else:
+            queries.append(rng.choice(LATIN))
+    return queries
+
+
+def _percentiles(latencies: list[float]) -> str:
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    return f"p50 {p50:9.2f} ms  p99 {p99:9.2f} ms"
+
+
+def run(url: str, backends: list[str], query_count: int, edits: int, seed: int) -> None:
+    engine = create_engine(url)
+    Session = sessionmaker(bind=engine)
+    criteria = [Character.status == "published", Character.is_public.is_(True)]
+    with Session() as db:
+        queries = _queries(db, query_count, seed)
+        for backend in backends:
+            settings.SEARCH_BACKEND = backend
+            search_characters(db, queries[0], criteria, "bench", PAGE_SIZE)
+            latencies, totals = [], []
+            for q in queries:
+                started = time.perf_counter()
+                page = search_characters(db, q, criteria, f"bench:{q}", PAGE_SIZE)
+                latencies.append(time.perf_counter() - started)
+                totals.append(page.total)
+                db.rollback()
+            print(f"  {backend:<5} {_percentiles(latencies)}   candidates {np.mean(totals):7.1f}")
+
+        rng = random.Random(seed + 2)
+        latencies = []
+        total = db.scalar(select(func.count()).select_from(Character))
+        for _ in range(edits):
+            character = db.scalars(select(Character).order_by(Character.id).offset(rng.randrange(total)).limit(1)).one()
+            character.description = "，".join(_phrase(rng, 4, 12) for _ in range(4))
+            started = time.perf_counter()
+            index_character(db, character)
+            db.flush()
+            latencies.append(time.perf_counter() - started)
+            db.rollback()
+        print(f"  index {_percentiles(latencies)}   ({edits} edits)")
+    engine.dispose()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000, help="characters in the catalogue")
+    parser.add_argument("--database", default="/tmp/search_bench.sqlite3")
+    parser.add_argument("--backends", default="fts,like", help="comma-separated SEARCH_BACKEND values")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--edits", type=int, default=200, help="character edits to re-index")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    url = f"sqlite:///{os.path.abspath(args.database)}"
+    existing = 0
+    if os.path.exists(args.database):
+        engine = create_engine(url)
+        try:
+            with engine.connect() as conn:
+                existing = conn.scalar(select(func.count()).select_from(Character))
+        except OperationalError:
+            pass
+        engine.dispose()
+    if existing != args.size:
+        if os.path.exists(args.database):
+            os.remove(args.database)
+        started = time.perf_counter()
+        build(url, args.size, args.seed)
+        print(f"built {args.size:,} characters in {time.perf_counter() - started:.1f} s")
+    size_mb = os.path.getsize(args.database) / 2**20
+    print(f"\n{args.size:,} characters ({size_mb:,.0f} MB), {args.queries} queries")
+    run(url, args.backends.split(","), args.queries, args.edits, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark the embedded vector index: exact scan vs HNSW.
+
+Builds indexes over synthetic clustered, L2-normalized vectors (real
+embeddings are clustered by topic, which is what makes approximate search
+hard) and reports, per size::
+
+    python -m scripts.vector_bench --sizes 10000,100000,1000000 --dim 256 --ef 32,64,128
+
+- build time and resident memory of each index;
+- p50/p99 query latency of the exact NumPy scan and of HNSW at each
+  ``--ef`` (``VECTOR_HNSW_EF_SEARCH``);
+- HNSW recall@k against the exact results.
+
+Use it to choose ``VECTOR_HNSW_THRESHOLD`` and ``VECTOR_HNSW_EF_SEARCH`` for
+a deployment. Vectors take ``size * dim * 4`` bytes (5M x 256 is about 5 GB)
+plus roughly ``size * M * 8`` for the HNSW graph.
+"""
+
+import argparse
+import resource
+import sys
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.vector_store import VectorIndex
+
+CLUSTERS = 256
+# Per-dimension noise around a cluster center.
+NOISE = 0.5
+
+
+def synthetic_vectors(count: int, centers: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    dimension = centers.shape[1]
+    vectors = np.empty((count, dimension), dtype=np.float32)
+    # Generated in blocks so the temporaries stay small at millions of rows.
+    for start in range(0, count, 100_000):
+        stop = min(start + 100_000, count)
+        block = centers[rng.integers(0, CLUSTERS, stop - start)]
+        block += NOISE * rng.standard_normal(block.shape, dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        vectors[start:stop] = block
+    return vectors
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _percentiles(latencies: list[float]) -> str:
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    return f"p50 {p50:8.3f} ms  p99 {p99:8.3f} ms"
+
+
+def _timed_search(index: VectorIndex, queries: np.ndarray, k: int) -> tuple[list[list[int]], list[float]]:
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = index.search(query, k)
+        latencies.append(time.perf_counter() - started)
+        results.append([label for label, _ in hits])
+    return results, latencies
+
+
+def run(size: int, dimension: int, query_count: int, k: int, ef_values: list[int], seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    # Queries come from the same topics as the corpus, as chat questions do.
+    centers = rng.standard_normal((CLUSTERS, dimension), dtype=np.float32)
+    vectors = synthetic_vectors(size, centers, rng)
+    queries = synthetic_vectors(query_count, centers, rng)
+    print(f"\n{size:,} vectors x {dimension} dims ({vectors.nbytes / 2**20:,.0f} MB)")
+
+    started = time.perf_counter()
+    exact = VectorIndex(dimension, hnsw_threshold=size + 1)
+    exact.add(vectors)
+    print(f"  exact  build {time.perf_counter() - started:8.2f} s   rss {_max_rss_mb():8.0f} MB")
+    truth, latencies = _timed_search(exact, queries, k)
+    print(f"  exact  {_percentiles(latencies)}")
+    del exact
+
+    started = time.perf_counter()
+    approximate = VectorIndex(dimension, hnsw_threshold=0)
+    approximate.add(vectors)
+    if approximate.hnsw is None:
+        print("  hnsw   skipped: hnswlib is not installed")
+        return
+    print(f"  hnsw   build {time.perf_counter() - started:8.2f} s   rss {_max_rss_mb():8.0f} MB")
+    for ef in ef_values:
+        settings.VECTOR_HNSW_EF_SEARCH = ef
+        found, latencies = _timed_search(approximate, queries, k)
+        recall = np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, truth)])
+        print(f"  ef {ef:<4d}{_percentiles(latencies)}   recall@{k} {recall:.3f}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated vector counts")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef", default=str(settings.VECTOR_HNSW_EF_SEARCH), help="comma-separated HNSW ef values")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    ef_values = [int(ef) for ef in args.ef.split(",")]
+    for size in (int(s) for s in args.sizes.split(",")):
+        run(size, args.dim, args.queries, args.k, ef_values, args.seed)
+
+
+if __name__ == "__main__":
+    main()
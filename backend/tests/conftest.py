@@ -0,0 +1,62 @@
+"""Test configuration: a scratch SQLite database migrated to head.
+
+Settings are read when ``app.config`` is first imported, so the environment
+is set here, before any test module imports the application.
+"""
+
+import os
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+_tmp = Path(tempfile.mkdtemp(prefix="backend-tests-"))
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_tmp / 'test.db'}",
+    "REDIS_URL": "memory://",
+    "STORAGE_BACKEND": "local",
+    "STORAGE_LOCAL_ROOT": str(_tmp / "storage"),
+    "PASSWORD_HASH_WORKERS": "0",
+    # No background loops: the query-count tests count statements on every engine.
+    "TRENDING_REFRESH_INTERVAL_SECONDS": "0",
+    "COUNTER_FLUSH_INTERVAL_SECONDS": "0",
+})
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    command.upgrade(config, "head")
+    yield
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def register(client):
+    """Register a fresh user; returns their ``Authorization`` headers."""
+
+    def _register(password: str = "secret1") -> dict:
+        name = f"user_{uuid.uuid4().hex[:12]}"
+        response = client.post(
+            "/api/auth/register", json={"username": name, "email": f"{name}@example.com", "password": password}
+        )
+        assert response.status_code == 201, response.text
+        return {"Authorization": f"Bearer {response.json()['tokens']['access_token']}"}
+
+    return _register
@@ -0,0 +1,18 @@
+def test_list_follows_cursor_and_reports_total(client, register):
+    headers = register()
+    character = client.post("/api/characters", json={"name": "分页", "description": "用来测试会话列表分页的角色"}, headers=headers)
+    assert character.status_code == 201, character.text
+    created = [
+        client.post("/api/conversations", json={"character_id": character.json()["id"]}, headers=headers).json()["id"]
+        for _ in range(3)
+    ]
+
+    first = client.get("/api/conversations", params={"limit": 2, "include_total": True}, headers=headers)
+    assert first.headers["X-Total-Count"] == "3"
+    second = client.get(
+        "/api/conversations", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]}, headers=headers
+    )
+    assert "X-Next-Cursor" not in second.headers
+    assert "X-Total-Count" not in second.headers
+    listed = [c["id"] for c in first.json() + second.json()]
+    assert sorted(listed) == sorted(created)
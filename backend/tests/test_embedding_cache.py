@@ -0,0 +1,40 @@
+import threading
+import time
+
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_service import EmbeddingError
+
+
+def test_short_backend_result_fails_owner_and_waiters():
+    cache = EmbeddingCache(maxsize=100)
+    computing = threading.Event()
+    errors = []
+
+    def short_compute(texts):
+        computing.set()
+        # Let the second caller join the in-flight "b" before failing.
+        deadline = time.monotonic() + 5
+        while cache.joined == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return [[0.5, 0.5]] * (len(texts) - 1)
+
+    def waiter():
+        computing.wait(5)
+        try:
+            cache.embed("test", "model", ["b"], short_compute)
+        except EmbeddingError as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    with pytest.raises(EmbeddingError):
+        cache.embed("test", "model", ["a", "b"], short_compute)
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert cache.joined == 1
+    assert len(errors) == 1
+    assert cache._inflight == {}
+    assert cache.embed("test", "model", ["a"], lambda texts: [[1.0, 2.0]] * len(texts)) == [[1.0, 2.0]]
@@ -0,0 +1,53 @@
+from sqlalchemy import select
+
+from app.database import SessionLocal
+from app.models.user import User
+from app.schemas.auth import Principal
+from app.security import decode_token
+from app.services.cache_service import TieredCache
+
+
+def _worker_cache() -> TieredCache:
+    # Configured like security.principal_cache, with the shared tier on.
+    return TieredCache(
+        namespace="principal",
+        maxsize=100,
+        ttl=300,
+        local_ttl=30,
+        shared=True,
+        broadcast=True,
+        dumps=lambda principal: principal.model_dump_json(),
+        loads=Principal.model_validate_json,
+    )
+
+
+def test_delete_evicts_other_workers_local_copies():
+    first, second = _worker_cache(), _worker_cache()
+    principal = Principal(id="00000000-0000-0000-0000-000000000001", username="worker", is_active=True)
+    first.set(str(principal.id), principal)
+    assert second.get(str(principal.id)) == principal
+    assert len(second.local) == 1
+
+    first.delete(str(principal.id))
+    assert len(second.local) == 0
+    assert second.get(str(principal.id)) is None
+
+
+def test_subscriber_error_clears_local_tier(monkeypatch):
+    monkeypatch.setattr("app.services.cache_service.time.sleep", lambda seconds: None)
+    cache = _worker_cache()
+    cache.local.set("user", object())
+    cache._on_subscriber_error(ConnectionError("lost"), None, None)
+    assert len(cache.local) == 0
+
+
+def test_deactivation_applies_after_commit(client, register):
+    headers = register()
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+
+    user_id = decode_token(headers["Authorization"].removeprefix("Bearer "))
+    with SessionLocal() as db:
+        user = db.scalar(select(User).where(User.id == user_id))
+        user.is_active = False
+        db.commit()
+    assert client.get("/api/auth/me", headers=headers).status_code == 403
@@ -0,0 +1,145 @@
+"""Query-count check: SQL statements and ORM objects loaded per request.
+
+Relationships default to ``lazy="raise_on_sql"`` and endpoints load what
+they need explicitly, so an authenticated request costs the same for a user
+with one conversation as for one with thousands. This check guards that:
+it seeds a heavy user and fails when a request runs more statements or
+loads more ORM objects than its budget. Caches in front of the database
+(principals, page totals) are bypassed so the uncached path is what gets
+counted.
+"""
+
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal, async_engine, async_read_engine, engine, read_engine
+from app.models.character import Character
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.models.user import User
+from app.security import create_access_token
+from app.utils.pagination import count_cache
+
+USERNAME = "query_count"
+CONVERSATIONS = 200
+MESSAGES = 20_000
+BATCH_SIZE = 10_000
+
+
+@dataclass
+class Check:
+    name: str
+    path: str
+    statements: int
+    objects: int
+
+
+# Object budgets are a full default page plus the look-ahead row and
+# whatever single rows the endpoint loads around it. ``{conversation}`` is
+# the heavy user's largest conversation.
+CHECKS = [
+    Check("auth: me", "/api/auth/me", 1, 1),
+    Check("characters: my list", "/api/characters", 3, 11),
+    Check("conversations: list", "/api/conversations", 2, 52),
+    Check("conversations: detail", "/api/conversations/{conversation}", 2, 2),
+    Check("messages: history page", "/api/conversations/{conversation}/messages", 3, 23),
+    Check("explore: popular", "/api/explore", 2, 13),
+    Check("knowledge: list", "/api/knowledge", 2, 0),
+]
+
+
+class QueryCounter:
+    """Counts statements on every engine and ORM objects loaded by any session."""
+
+    def __init__(self):
+        self.statements = 0
+        self.objects = 0
+        self.engines = {id(e): e for e in (engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine)}
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+
+    def _on_load(self, session, instance):
+        self.objects += 1
+
+    def __enter__(self):
+        for bind in self.engines.values():
+            event.listen(bind, "before_cursor_execute", self._on_execute)
+        event.listen(Session, "loaded_as_persistent", self._on_load)
+        return self
+
+    def __exit__(self, *exc):
+        for bind in self.engines.values():
+            event.remove(bind, "before_cursor_execute", self._on_execute)
+        event.remove(Session, "loaded_as_persistent", self._on_load)
+
+
+def seed(conversation_count: int, message_count: int) -> tuple[uuid.UUID, uuid.UUID]:
+    """The heavy user and their largest conversation, seeded once per database."""
+    with SessionLocal() as db:
+        user_id = db.scalar(select(User.id).where(User.username == USERNAME))
+        if user_id is None:
+            user_id = uuid.uuid4()
+            character_id = uuid.uuid4()
+            db.execute(insert(User.__table__), {
+                "id": user_id, "username": USERNAME, "email": f"{USERNAME}@example.com", "password_hash": "!",
+            })
+            db.execute(insert(Character.__table__), {
+                "id": character_id, "name": "查询计数", "creator_id": user_id,
+                "status": "published", "is_public": True,
+            })
+            conversation_ids = [uuid.uuid4() for _ in range(conversation_count)]
+            per_conversation = message_count // conversation_count
+            db.execute(insert(Conversation.__table__), [
+                {"id": cid, "user_id": user_id, "character_id": character_id, "message_count": per_conversation}
+                for cid in conversation_ids
+            ])
+            started = datetime.now(timezone.utc) - timedelta(days=30)
+            batch = []
+            for n in range(message_count):
+                batch.append({
+                    "conversation_id": conversation_ids[n % conversation_count],
+                    "role": "user" if n % 2 == 0 else "assistant",
+                    "content": f"消息 {n}",
+                    "created_at": started + timedelta(seconds=n),
+                })
+                if len(batch) >= BATCH_SIZE:
+                    db.execute(insert(Message.__table__), batch)
+                    batch = []
+            if batch:
+                db.execute(insert(Message.__table__), batch)
+            db.commit()
+        conversation_id = db.scalar(
+            select(Conversation.id).where(Conversation.user_id == user_id)
+            .order_by(Conversation.message_count.desc(), Conversation.id).limit(1)
+        )
+    return user_id, conversation_id
+
+
+@pytest.fixture(scope="module")
+def heavy_user(database):
+    enabled = settings.PRINCIPAL_CACHE_ENABLED
+    settings.PRINCIPAL_CACHE_ENABLED = False
+    user_id, conversation_id = seed(CONVERSATIONS, MESSAGES)
+    yield {"Authorization": f"Bearer {create_access_token(str(user_id))}"}, conversation_id
+    settings.PRINCIPAL_CACHE_ENABLED = enabled
+
+
+@pytest.mark.parametrize("check", CHECKS, ids=lambda check: check.name)
+def test_request_within_budget(client, heavy_user, check):
+    headers, conversation_id = heavy_user
+    path = check.path.format(conversation=conversation_id)
+    # Warm up imports and lazily built state outside the count.
+    client.get(path, headers=headers)
+    count_cache.clear()
+    with QueryCounter() as counter:
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.text
+    assert counter.statements <= check.statements
+    assert counter.objects <= check.objects
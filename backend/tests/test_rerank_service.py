@@ -0,0 +1,53 @@
+import pytest
+
+from app.services import rerank_service
+from app.services.rerank_service import BATCH_SIZE, Reranker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SlowModel:
+    """Scores each batch after advancing the clock by ``seconds``."""
+
+    def __init__(self, clock: FakeClock, seconds: float):
+        self.clock = clock
+        self.seconds = seconds
+        self.batches = 0
+
+    def predict(self, pairs, show_progress_bar=False):
+        self.batches += 1
+        self.clock.now += self.seconds
+        return [1.0] * len(pairs)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rerank_service.time, "monotonic", clock)
+    return clock
+
+
+def test_scores_everything_within_budget(clock):
+    model = SlowModel(clock, 10)
+    assert Reranker(model).score("q", ["t"] * (3 * BATCH_SIZE), deadline=100) == [1.0] * (3 * BATCH_SIZE)
+    assert model.batches == 3
+
+
+def test_does_not_start_a_batch_that_cannot_finish(clock):
+    model = SlowModel(clock, 10)
+    assert Reranker(model).score("q", ["t"] * (3 * BATCH_SIZE), deadline=25) is None
+    # The third batch would have ended at 30: it is never started.
+    assert model.batches == 2
+    assert clock.now == 20
+
+
+def test_stops_after_a_batch_that_overran(clock):
+    model = SlowModel(clock, 30)
+    assert Reranker(model).score("q", ["t"] * (2 * BATCH_SIZE), deadline=25) is None
+    assert model.batches == 1
@@ -0,0 +1,213 @@
+"""Schema lint: check that the database serves the hot queries from indexes.
+
+Run against the test database migrated to head (``DATABASE_URL``):
+
+- every index declared on the models exists in the database, so a model
+  change without a migration (or the reverse) is caught;
+- each query in ``HOT_QUERIES`` is run through ``EXPLAIN`` and fails if the
+  plan scans a whole table, or sorts the whole result because no index
+  matches the ORDER BY. On PostgreSQL sequential scans are disabled for the
+  check so that the plan reflects index availability, not table size.
+"""
+
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+import pytest
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import Select
+
+from app.database import Base, engine
+from app.models.character import Character, CharacterTag, Favorite, Tag
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.services.context_service import MESSAGE_KEYS
+from app.services.popularity_service import trending_events
+from app.services.vector_store import document_states
+from app.utils.pagination import keyset_after
+
+SAMPLE_ID = uuid.UUID(int=1)
+SAMPLE_TIME = datetime(2026, 1, 1, tzinfo=timezone.utc)
+PUBLISHED = (Character.status == "published", Character.is_public.is_(True))
+
+
+@dataclass
+class HotQuery:
+    name: str
+    build: Callable[[str], Select]
+
+
+def _message_history(dialect: str) -> Select:
+    before = keyset_after(MESSAGE_KEYS, [SAMPLE_TIME, SAMPLE_ID], dialect)
+    return (
+        select(Message)
+        .where(Message.conversation_id == SAMPLE_ID, before)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(21)
+    )
+
+
+def _context_messages(dialect: str) -> Select:
+    after = keyset_after(MESSAGE_KEYS, [SAMPLE_TIME, SAMPLE_ID], dialect, descending=False)
+    return (
+        select(Message)
+        .where(Message.conversation_id == SAMPLE_ID, after)
+        .order_by(Message.created_at.asc(), Message.id.asc())
+    )
+
+
+def _conversation_list(dialect: str) -> Select:
+    return (
+        select(Conversation)
+        .where(Conversation.user_id == SAMPLE_ID)
+        .order_by(Conversation.updated_at.desc(), Conversation.id.desc())
+        .limit(51)
+    )
+
+
+def _favorite_lookup(dialect: str) -> Select:
+    return select(Favorite).where(Favorite.user_id == SAMPLE_ID, Favorite.character_id == SAMPLE_ID)
+
+
+def _my_characters(dialect: str) -> Select:
+    return (
+        select(Character)
+        .where(Character.creator_id == SAMPLE_ID)
+        .order_by(Character.updated_at.desc(), Character.id.desc())
+        .limit(11)
+    )
+
+
+def _explore_newest(dialect: str) -> Select:
+    return select(Character).where(*PUBLISHED).order_by(Character.created_at.desc(), Character.id.desc()).limit(21)
+
+
+def _explore_popular(dialect: str) -> Select:
+    return (
+        select(Character)
+        .where(*PUBLISHED)
+        .order_by(Character.popularity_score.desc(), Character.created_at.desc(), Character.id.desc())
+        .limit(21)
+    )
+
+
+def _explore_trending(dialect: str) -> Select:
+    return select(Character).where(*PUBLISHED).order_by(Character.trending_score.desc()).limit(10)
+
+
+def _explore_tag(dialect: str) -> Select:
+    return (
+        select(Character)
+        .join(CharacterTag, CharacterTag.character_id == Character.id)
+        .where(CharacterTag.tag_id == SAMPLE_ID, *PUBLISHED)
+        .order_by(Character.created_at.desc(), Character.id.desc())
+        .limit(21)
+    )
+
+
+def _tag_cloud(dialect: str) -> Select:
+    return select(Tag).where(Tag.character_count > 0).order_by(Tag.character_count.desc()).limit(20)
+
+
+def _trending_refresh(dialect: str) -> Select:
+    return trending_events(SAMPLE_TIME, SAMPLE_TIME, dialect)
+
+
+def _vector_index_sync(dialect: str) -> Select:
+    return document_states(SAMPLE_ID)
+
+
+HOT_QUERIES = [
+    HotQuery("messages: history page", _message_history),
+    HotQuery("messages: context after summary", _context_messages),
+    HotQuery("conversations: list", _conversation_list),
+    HotQuery("favorites: like lookup", _favorite_lookup),
+    HotQuery("characters: my list", _my_characters),
+    HotQuery("explore: newest", _explore_newest),
+    HotQuery("explore: popular", _explore_popular),
+    HotQuery("explore: trending", _explore_trending),
+    HotQuery("explore: tag", _explore_tag),
+    HotQuery("explore: tag cloud", _tag_cloud),
+    HotQuery("popularity: trending refresh", _trending_refresh),
+    HotQuery("knowledge: vector index sync", _vector_index_sync),
+]
+
+_SQLITE_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+# Subqueries SQLite runs as co-routines or materializes; scanning one is not a table scan.
+_SQLITE_SUBQUERY = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\w+)$")
+_POSTGRES_FULL_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def missing_indexes(bind: Engine | Connection) -> list[str]:
+    inspector = inspect(bind)
+    problems = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            problems.append(f"table {table.name} is missing")
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        existing |= {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                problems.append(f"index {index.name} on {table.name} is missing")
+    return problems
+
+
+def explain(connection: Connection, statement: Select) -> list[str]:
+    dialect = connection.dialect.name
+    prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+
+    def _prefix(conn, cursor, sql, parameters, context, executemany):
+        return prefix + sql, parameters
+
+    event.listen(connection, "before_cursor_execute", _prefix, retval=True)
+    try:
+        # Read the raw cursor: the statement's result types describe its rows, not the plan's.
+        rows = connection.execute(statement).cursor.fetchall()
+    finally:
+        event.remove(connection, "before_cursor_execute", _prefix)
+    # SQLite: (id, parent, notused, detail); PostgreSQL: one text column per plan line.
+    return [row[-1] for row in rows]
+
+
+def plan_problems(plan: list[str], dialect: str) -> list[str]:
+    problems = []
+    subqueries = {match.group(1) for line in plan if (match := _SQLITE_SUBQUERY.match(line.strip()))}
+    for line in plan:
+        line = line.strip()
+        if dialect == "sqlite":
+            match = _SQLITE_FULL_SCAN.match(line)
+            if match and match.group(1) not in subqueries:
+                problems.append(f"full scan of {match.group(1)}")
+            elif line == "USE TEMP B-TREE FOR ORDER BY":
+                problems.append("sort not served by an index")
+        else:
+            match = _POSTGRES_FULL_SCAN.search(line)
+            if match:
+                problems.append(f"full scan of {match.group(1)}")
+    return problems
+
+
+def test_model_indexes_exist():
+    assert missing_indexes(engine) == []
+
+
+@pytest.mark.parametrize("query", HOT_QUERIES, ids=lambda query: query.name)
+def test_hot_query_uses_indexes(query):
+    with engine.connect() as connection:
+        dialect = connection.dialect.name
+        if dialect == "postgresql":
+            connection.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = explain(connection, query.build(dialect))
+        connection.rollback()
+    assert plan_problems(plan, dialect) == []
+
+
+def test_plan_problems_flags_scans_and_sorts():
+    plan = ["CO-ROUTINE anon_1", "SCAN anon_1", "SCAN characters", "USE TEMP B-TREE FOR ORDER BY"]
+    assert plan_problems(plan, "sqlite") == ["full scan of characters", "sort not served by an index"]
+    assert plan_problems(["Seq Scan on messages  (cost=0.00..1.00 rows=1)"], "postgresql") == ["full scan of messages"]
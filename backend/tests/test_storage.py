@@ -0,0 +1,20 @@
+from pathlib import Path
+
+from app.config import settings
+
+
+def test_presigned_upload_is_private_to_its_owner(client, register):
+    owner, other = register(), register()
+    upload = client.post("/api/storage/uploads", json={"filename": "notes.txt", "size": 5}, headers=owner).json()
+    key = upload["key"]
+    assert client.put(upload["upload_url"], content=b"hello").status_code == 201
+
+    # Kept outside the static mount: not readable by URL.
+    assert not (Path(settings.STORAGE_LOCAL_ROOT) / key).exists()
+    assert client.get(f"/uploads/{key}").status_code == 404
+
+    download = client.get("/api/storage/downloads", params={"key": key}, headers=owner)
+    assert download.status_code == 200
+    assert client.get(download.json()["url"]).content == b"hello"
+    assert client.get(download.json()["url"].replace("signature=", "signature=0")).status_code == 403
+    assert client.get("/api/storage/downloads", params={"key": key}, headers=other).status_code == 404
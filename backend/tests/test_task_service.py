@@ -0,0 +1,21 @@
+from app.services import task_service
+
+
+def test_shared_status_follows_updates_from_another_process(monkeypatch):
+    # Two caches on one Redis stand in for the API process and a worker.
+    api_states = task_service._state_cache(shared=True)
+    worker_states = task_service._state_cache(shared=True)
+    monkeypatch.setattr(task_service, "task_states", api_states)
+
+    api_states.set("t1", {"id": "t1", "status": "pending"})
+    assert task_service.get_status("t1")["status"] == "pending"
+
+    worker_states.set("t1", {"id": "t1", "status": "succeeded"})
+    assert task_service.get_status("t1")["status"] == "succeeded"
+
+
+def test_local_status_is_cached_in_process():
+    states = task_service._state_cache(shared=False)
+    states.set("t2", {"id": "t2", "status": "running"})
+    assert len(states.local) == 1
+    assert states.get("t2")["status"] == "running"
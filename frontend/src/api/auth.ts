@@ -6,6 +6,7 @@ export interface User {
   email: string;
   nickname: string | null;
   avatar_url: string | null;
+  avatar_thumbnail_url: string | null;
   bio: string | null;
   is_active: boolean;
   created_at: string;
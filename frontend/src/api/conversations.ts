@@ -33,11 +33,43 @@ export interface PaginatedMessages {
   items: Message[];
   total: number;
   has_more: boolean;
+  has_newer: boolean;
+  before_cursor: string | null;
+  after_cursor: string | null;
+}
+
+export interface ConversationPage {
+  items: Conversation[];
+  next_cursor: string | null;
+  total: number | null;
+}
+
+export interface ConversationPageParams {
+  limit?: number;
+  cursor?: string;
+  include_total?: boolean;
+}
+
+// Newest first; the next page's cursor comes back in the X-Next-Cursor header.
+export async function getConversationPage(params: ConversationPageParams = {}): Promise<ConversationPage> {
+  const res = await apiClient.get<Conversation[]>('/conversations', { params });
+  const total = res.headers['x-total-count'];
+  return {
+    items: res.data,
+    next_cursor: res.headers['x-next-cursor'] ?? null,
+    total: total != null ? Number(total) : null,
+  };
 }
 
 export async function getConversations(): Promise<Conversation[]> {
-  const res = await apiClient.get<Conversation[]>('/conversations');
-  return res.data;
+  const conversations: Conversation[] = [];
+  let cursor: string | undefined;
+  do {
+    const page = await getConversationPage({ limit: 100, cursor });
+    conversations.push(...page.items);
+    cursor = page.next_cursor ?? undefined;
+  } while (cursor);
+  return conversations;
 }
 
 export async function getConversation(id: string): Promise<Conversation> {
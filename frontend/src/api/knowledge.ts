@@ -1,11 +1,28 @@
 import apiClient from './client';
 
+// Unset fields use the server defaults.
+export interface RetrievalOptions {
+  mode?: 'hybrid' | 'vector' | 'lexical' | null;
+  top_k?: number | null;
+  candidates?: number | null;
+  rrf_k?: number | null;
+  vector_weight?: number | null;
+  lexical_weight?: number | null;
+  rerank?: boolean | null;
+  rerank_candidates?: number | null;
+  rerank_budget_ms?: number | null;
+}
+
 export interface KnowledgeBase {
   id: string;
-  character_id: string;
   name: string;
-  description: string;
+  description: string | null;
+  creator_id: string;
   document_count: number;
+  embedding_model: string;
+  chunk_size: number;
+  chunk_overlap: number;
+  retrieval: RetrievalOptions | null;
   created_at: string;
   updated_at: string;
 }
@@ -13,17 +30,24 @@ export interface KnowledgeBase {
 export interface Document {
   id: string;
   knowledge_base_id: string;
-  title: string;
-  content: string;
+  filename: string;
   file_type: string;
+  file_size: number;
   chunk_count: number;
+  // pending | processing | ready | failed
+  status: string;
+  error: string | null;
   created_at: string;
+  task_id: string | null;
 }
 
 export interface CreateKnowledgeBaseRequest {
-  character_id: string;
+  character_id?: string;
   name: string;
-  description: string;
+  description?: string;
+  chunk_size?: number;
+  chunk_overlap?: number;
+  retrieval?: RetrievalOptions;
 }
 
 export async function getKnowledgeBases(characterId: string): Promise<KnowledgeBase[]> {
@@ -2,7 +2,7 @@ import { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { useAuthStore } from '../stores/authStore';
 import { getCharacters, type Character } from '../api/characters';
-import { getConversations, type Conversation } from '../api/conversations';
+import { getConversationPage, type Conversation } from '../api/conversations';
 import { formatRelativeTime } from '../utils';
 
 const RELATIONSHIP_LABELS: Record<string, string> = {
@@ -108,8 +108,8 @@ export default function Home() {
       .catch(() => {})
       .finally(() => setIsLoadingChars(false));
 
-    getConversations()
-      .then((convs) => setConversations(convs.slice(0, 5)))
+    getConversationPage({ limit: 5 })
+      .then((page) => setConversations(page.items))
       .catch(() => {})
       .finally(() => setIsLoadingConvs(false));
   }, []);
@@ -3,7 +3,7 @@ import { Link } from 'react-router-dom';
 import { useAuthStore } from '../stores/authStore';
 import { updateProfile } from '../api/auth';
 import { getCharacters, type Character } from '../api/characters';
-import { getConversations } from '../api/conversations';
+import { getConversationPage } from '../api/conversations';
 import { showSuccess, showError } from '../components/UI/Toast';
 
 function StatCard({ label, value, icon }: { label: string; value: number; icon: string }) {
@@ -38,13 +38,13 @@ export default function Profile() {
 
     Promise.all([
       getCharacters(1, 50).catch(() => ({ items: [] as Character[], total: 0 })),
-      getConversations().catch(() => []),
-    ]).then(([charRes, convs]) => {
+      getConversationPage({ limit: 1, include_total: true }).catch(() => null),
+    ]).then(([charRes, convPage]) => {
       if (cancelled) return;
       const charData = 'items' in charRes ? charRes : { items: [], total: 0 };
       setCharacters(charData.items);
       setCharacterCount(charData.total);
-      setConversationCount(Array.isArray(convs) ? convs.length : 0);
+      setConversationCount(convPage?.total ?? 0);
       setLoading(false);
     });
 